@@ -0,0 +1 @@
+# Benchmarks for the Nova compiler; run modules with `python -m benchmarks.<name>`.
@@ -0,0 +1,87 @@
+"""Time from source to object file: the external assembler versus the in-process encoder.
+
+Each program is compiled ``--runs`` times both ways and the medians are
+reported:
+
+- asm + cc -c: ``compile_source`` to assembly, written out and assembled by ``--cc -c``
+- obj: ``compile_source`` with ``emit="obj"``, which encodes the object itself
+
+Both objects are then linked and run once, and must print the same output.
+
+Usage: python -m benchmarks.bench_assemble [--runs 5] [-O 1] [--functions 50] [files ...]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from scripts.check_corpus import build_executable
+from src.driver import CompileOptions, compile_source
+
+from .synth import SynthConfig, generate_program
+
+PROGRAMS_DIR = Path(__file__).resolve().parent / "programs"
+
+
+def median_time(run: Callable[[], object], runs: int) -> float:
+    times: List[float] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def measure(source: str, level: int, workdir: Path, args: argparse.Namespace) -> Tuple[float, float, int]:
+    """Median seconds both ways, and the object's size; raises SystemExit if the two programs disagree."""
+    asm_path, obj_path = workdir / "prog.s", workdir / "prog.o"
+
+    def external() -> None:
+        asm_path.write_text(compile_source(source, CompileOptions(opt_level=level)), encoding="utf-8")
+        subprocess.run([args.cc, "-c", str(asm_path), "-o", str(obj_path)], check=True)
+
+    def in_process() -> None:
+        obj_path.write_bytes(compile_source(source, CompileOptions(opt_level=level, emit="obj")))
+
+    external_secs = median_time(external, args.runs)
+    in_process_secs = median_time(in_process, args.runs)
+    outputs = []
+    for emit in ("asm", "obj"):
+        exe = build_executable(compile_source(source, CompileOptions(opt_level=level, emit=emit)), workdir, emit)
+        outputs.append(subprocess.run([str(exe)], capture_output=True, check=True).stdout)
+    if outputs[0] != outputs[1]:
+        raise SystemExit("the encoded object prints something else than the assembled one")
+    return external_secs, in_process_secs, obj_path.stat().st_size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "files", nargs="*", type=Path, help="Programs to compile (default: benchmarks/programs and a synthetic one)"
+    )
+    parser.add_argument("--runs", type=int, default=5, help="Compiles per way; the median is reported")
+    parser.add_argument("-O", dest="opt_level", type=int, default=1, help="Optimization level")
+    parser.add_argument("--functions", type=int, default=50, help="Functions in the synthetic program")
+    parser.add_argument("--cc", default="gcc", help="C compiler used to assemble and link")
+    args = parser.parse_args()
+
+    sources = [(path.stem, path.read_text(encoding="utf-8")) for path in args.files]
+    if not sources:
+        sources = [(path.stem, path.read_text(encoding="utf-8")) for path in sorted(PROGRAMS_DIR.glob("*.nv"))]
+        config = SynthConfig(functions=args.functions)
+        sources.append((config.label(), generate_program(config)))
+    print(f"{'program':<16} {'asm + cc -c':>12} {'obj':>10} {'speedup':>8} {'object':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, source in sources:
+            external, in_process, size = measure(source, args.opt_level, Path(tmp), args)
+            speedup = external / in_process
+            print(f"{name:<16} {external * 1e3:>10.2f}ms {in_process * 1e3:>8.2f}ms {speedup:>7.2f}x {size:>8}")
+
+
+if __name__ == "__main__":
+    main()
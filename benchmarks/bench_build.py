@@ -0,0 +1,70 @@
+"""Multi-file build throughput of ``src.driver.build`` at several worker counts.
+
+Usage: python -m benchmarks.bench_build [--files 2000] [--jobs 1 2 4 8]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from src.driver import BuildConfig, BuildJob, build
+
+MODULE_TEMPLATE = """\
+// generated module {i}
+fn scale_{i}(a: int, b: int) -> int {{
+    let total: int = a * {i} + b;
+    while (total > 1000 && b != 0) {{
+        total = total / 2 - (b + {i});
+    }}
+    return total;
+}}
+
+fn main() -> int {{
+    let n = 0;
+    while (n < {bound}) {{
+        if (!(n <= 3) || n >= 9) {{
+            print(scale_{i}(n, n + 1));
+        }}
+        n = n + 1;
+    }}
+    return 0;
+}}
+"""
+
+
+def make_corpus(root: Path, count: int) -> List[BuildJob]:
+    jobs: List[BuildJob] = []
+    for i in range(count):
+        src = root / "src" / f"mod_{i}.nv"
+        src.parent.mkdir(parents=True, exist_ok=True)
+        src.write_text(MODULE_TEMPLATE.format(i=i, bound=i % 17), encoding="utf-8")
+        jobs.append(BuildJob(src, root / "out" / f"mod_{i}.s"))
+    return jobs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=2000, help="Number of source files")
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4, 8], help="Worker counts to time")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPU(s), {args.files} files, cache disabled")
+    print(f"{'jobs':>6} {'seconds':>10} {'files/s':>10} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = make_corpus(Path(tmp), args.files)
+        baseline = None
+        for workers in args.jobs:
+            start = time.perf_counter()
+            results, _ = build(jobs, BuildConfig(), workers)
+            secs = time.perf_counter() - start
+            assert all(r.ok for r in results), "benchmark corpus failed to compile"
+            baseline = baseline or secs
+            print(f"{workers:>6} {secs:>10.2f} {len(jobs) / secs:>10,.0f} {baseline / secs:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Cost of calls to small leaf functions, with and without their lighter frames.
+
+The program calls a handful of tiny functions that call nothing themselves
+from a hot loop, so their prologues and epilogues are a large part of the
+work. It is compiled with ``--no-leaf-functions`` (every function gets an
+rbp frame and only the usual registers, as before leaf functions were
+special-cased) and without; the outputs must match. Reports the
+instructions emitted for the leaf functions and the median wall time.
+
+Usage: python -m benchmarks.bench_calls [-O 1] [--iterations 20000000] [--runs 5]
+"""
+from __future__ import annotations
+
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+from benchmarks.bench_runtime import time_runs
+from scripts.check_corpus import build_executable
+from src.driver import CompileOptions, compile_source
+
+LEAVES = ("clamp", "mix", "step", "weigh")
+
+SOURCE = """\
+fn clamp(x: int, lo: int, hi: int) -> int {{
+    if (x < lo) {{
+        return lo;
+    }}
+    if (x > hi) {{
+        return hi;
+    }}
+    return x;
+}}
+
+fn mix(a: int, b: int) -> int {{
+    let h = a * 31 + b;
+    return h - h / 1000003 * 1000003;
+}}
+
+fn step(n: int) -> int {{
+    let half = n / 2;
+    if (half * 2 == n) {{
+        return half;
+    }}
+    return 3 * n + 1;
+}}
+
+fn weigh(a: int, b: int, c: int, d: int, e: int, f: int, g: int, h: int) -> int {{
+    return a * 8 + b * 7 + c * 6 + d * 5 + e * 4 + f * 3 + g * 2 + h;
+}}
+
+fn main() -> int {{
+    let acc = 1;
+    let i = 0;
+    while (i < {iterations}) {{
+        acc = mix(acc, clamp(step(i), 10, 5000));
+        acc = acc + weigh(i, acc, 1, 2, 3, 4, 5, 6) / 4096;
+        i = i + 1;
+    }}
+    print(acc);
+    return 0;
+}}
+"""
+
+
+def function_sizes(asm: str) -> Dict[str, int]:
+    """Instructions emitted for each function in ``asm``, keyed by name."""
+    sizes: Dict[str, int] = {}
+    current = None
+    for line in asm.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("."):
+            continue
+        if not line.startswith(" ") and stripped.endswith(":"):
+            current = stripped[:-1]
+            sizes[current] = 0
+        elif current is not None:
+            sizes[current] += 1
+    return sizes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-O", dest="opt_level", type=int, default=1, help="Optimization level (leaf frames need -O1)")
+    parser.add_argument("--iterations", type=int, default=20_000_000)
+    parser.add_argument("--runs", type=int, default=5, help="Runs per binary; the median is reported")
+    parser.add_argument("--cc", default="gcc", help="C compiler used to assemble and link")
+    args = parser.parse_args()
+
+    source = SOURCE.format(iterations=args.iterations)
+    print(f"{'build':<16} " + " ".join(f"{name:>6}" for name in LEAVES) + f" {'time':>9}")
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, leaf_functions in (("rbp frames", False), ("leaf frames", True)):
+            asm = compile_source(source, CompileOptions(opt_level=args.opt_level, leaf_functions=leaf_functions))
+            exe = build_executable(asm, Path(tmp), f"calls_{int(leaf_functions)}", args.cc)
+            output, secs = time_runs(exe, args.runs)
+            results.append((output, secs))
+            sizes = function_sizes(asm)
+            print(f"{label:<16} " + " ".join(f"{sizes.get(name, 0):>6}" for name in LEAVES) + f" {secs:>8.3f}s")
+    if results[0][0] != results[1][0]:
+        raise SystemExit("leaf function frames change the output")
+    print(f"speedup {results[0][1] / results[1][1]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
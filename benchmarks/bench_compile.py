@@ -0,0 +1,175 @@
+"""Compiler throughput per phase on synthetic programs, checked against a stored baseline.
+
+Each program from ``benchmarks.synth`` is run through ``tokenize``,
+``parse_tokens``, ``TypeChecker.check`` and ``X86Codegen`` code generation
+(what ``X86Codegen.compile`` does after its type check) separately, and
+through the whole driver pipeline at each ``--levels`` level. The median
+of ``--repeat`` runs is reported with throughput in source lines and AST
+nodes per second, and the peak memory of one run under tracemalloc.
+
+Each peak is measured in a new interpreter with the garbage collector
+off. Within a long-lived process it is not repeatable: interned strings
+that earlier runs freed leave the interpreter's table of them to be
+rebuilt, 400 KB at a time, during whichever run next fills it up.
+
+With a baseline file (default benchmarks/baselines/compile.json), a phase
+allocating more than ``--memory-threshold`` above it is a regression, and
+the exit status is 1. Peaks depend only on the code and the Python
+version. Times depend on the machine and vary by tens of percent between
+runs, so they are compared only with ``--check-time``, against a
+baseline recorded on the same machine with ``--save-baseline`` first.
+
+Usage: python -m benchmarks.bench_compile [--functions 10 40] [--depth 3] [--expr-length 6]
+       [--strings 50] [--repeat 3] [--levels 2] [--baseline PATH] [--save-baseline] [--check-time]
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import multiprocessing
+import statistics
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from src.callgraph import function_size
+from src.codegen import X86Codegen
+from src.driver import CompileOptions, compile_source
+from src.lexer import tokenize
+from src.parser import parse_tokens
+from src.typesys import TypeChecker
+
+from .bench_tokens import peak_memory, timed
+from .synth import SynthConfig, generate_program
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "compile.json"
+
+# Phase name -> a function running it once, set up from the program's source.
+Stage = Callable[[], object]
+
+
+def stages(source: str, levels: List[int]) -> Dict[str, Stage]:
+    """The phases to time for ``source``; each input is prepared once, outside the timed call."""
+    tokens = tokenize(source)
+    prog = parse_tokens(tokens)
+    TypeChecker(prog).check()
+
+    def codegen() -> str:
+        generator = X86Codegen(prog)
+        return generator.link([generator.compile_function(fn) for fn in prog.functions])
+
+    result: Dict[str, Stage] = {
+        "tokenize": lambda: tokenize(source),
+        "parse": lambda: parse_tokens(tokens),
+        "typecheck": lambda: TypeChecker(prog).check(),
+        "codegen": codegen,
+    }
+    for level in levels:
+        options = CompileOptions(opt_level=level)
+        result[f"pipeline -O{level}"] = lambda options=options: compile_source(source, options)
+    return result
+
+
+def fresh_peak(source: str, levels: List[int], name: str) -> int:
+    """Peak bytes of one run of phase ``name`` after a warm-up run, with the garbage collector off."""
+    stage = stages(source, levels)[name]
+    stage()
+    gc.disable()
+    try:
+        return peak_memory(stage)[1]
+    finally:
+        gc.enable()
+
+
+def measure(source: str, levels: List[int], name: str, stage: Stage, repeat: int) -> Tuple[float, int]:
+    """Median seconds over ``repeat`` runs after a warm-up run, and the peak bytes from :func:`fresh_peak`.
+
+    The peak is taken in a new interpreter, so earlier phases and runs leave
+    nothing behind that it depends on.
+    """
+    stage()
+    seconds = statistics.median(timed(stage)[1] for _ in range(repeat))
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        peak = pool.submit(fresh_peak, source, levels, name).result()
+    return seconds, peak
+
+
+def compare(
+    label: str, results: Dict[str, object], baseline: Dict[str, object], args: argparse.Namespace
+) -> List[str]:
+    """Descriptions of the phases in ``results`` that regressed against ``baseline``."""
+    regressions = []
+    old_stages = baseline.get("configs", {}).get(label, {}).get("stages", {})
+    for name, new in results["stages"].items():
+        old = old_stages.get(name)
+        if old is None:
+            continue
+        if args.check_time and new["seconds"] > old["seconds"] * (1 + args.time_threshold):
+            regressions.append(f"{label} {name}: {new['seconds'] * 1e3:.1f}ms vs {old['seconds'] * 1e3:.1f}ms")
+        if new["peak_bytes"] > old["peak_bytes"] * (1 + args.memory_threshold):
+            regressions.append(f"{label} {name}: peak {new['peak_bytes']:,}B vs {old['peak_bytes']:,}B")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--functions", type=int, nargs="+", default=[10, 40], help="Functions per program; one program per value"
+    )
+    parser.add_argument("--depth", type=int, default=SynthConfig.depth, help="Nesting depth of if/while blocks")
+    parser.add_argument("--expr-length", type=int, default=SynthConfig.expr_length, help="Operators per expression")
+    parser.add_argument("--strings", type=int, default=SynthConfig.strings, help="String literals per program")
+    parser.add_argument("--seed", type=int, default=SynthConfig.seed)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per phase; the median is reported")
+    parser.add_argument(
+        "--levels", type=int, nargs="*", default=[2], help="Also time the whole pipeline at these -O levels"
+    )
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline JSON to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="Record this run as the baseline instead")
+    parser.add_argument(
+        "--check-time", action="store_true", help="Also fail on slow phases (record the baseline on this machine first)"
+    )
+    parser.add_argument(
+        "--time-threshold", type=float, default=0.25, help="Allowed slowdown with --check-time, as a fraction"
+    )
+    parser.add_argument(
+        "--memory-threshold", type=float, default=0.10, help="Allowed peak memory growth, as a fraction"
+    )
+    args = parser.parse_args()
+
+    baseline: Dict[str, object] = {"configs": {}}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    regressions: List[str] = []
+    print(f"{'program':<22} {'phase':<14} {'median':>10} {'lines/s':>12} {'nodes/s':>12} {'peak':>10}")
+    for functions in args.functions:
+        config = SynthConfig(functions, args.depth, args.expr_length, args.strings, args.seed)
+        source = generate_program(config)
+        lines = source.count("\n")
+        nodes = sum(1 + function_size(fn) for fn in parse_tokens(tokenize(source)).functions)
+        results: Dict[str, object] = {"lines": lines, "nodes": nodes, "stages": {}}
+        for name, stage in stages(source, args.levels).items():
+            seconds, peak = measure(source, args.levels, name, stage, args.repeat)
+            results["stages"][name] = {"seconds": seconds, "peak_bytes": peak}
+            row = f"{config.label():<22} {name:<14} {seconds * 1e3:>8.1f}ms"
+            print(row + f" {lines / seconds:>12,.0f} {nodes / seconds:>12,.0f} {peak / 2**20:>8.2f}MB")
+        if args.save_baseline:
+            baseline["configs"][config.label()] = results
+        else:
+            regressions += compare(config.label(), results, baseline, args)
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"Wrote {args.baseline}")
+    elif regressions:
+        print("regressions:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
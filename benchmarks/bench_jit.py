@@ -0,0 +1,97 @@
+"""Edit-run latency: building a binary with the toolchain versus running the program from memory.
+
+Each program in benchmarks/programs is compiled and run ``--runs`` times
+both ways, and the medians of the compile and run parts are reported:
+
+- toolchain: ``compile_source`` to assembly, then ``--cc`` to assemble and link, then the binary
+- jit: :func:`src.jit.run_source`, which loads the code into executable memory and calls ``main``
+
+Both must print the program's golden ``.out``. The JIT's output goes
+straight to file descriptor 1, so it is captured by pointing that at a
+temporary file while it runs.
+
+Usage: python -m benchmarks.bench_jit [--runs 5] [-O 1] [names ...]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from scripts.check_corpus import build_executable
+from src.driver import CompileOptions, compile_source
+from src.jit import run_source
+
+PROGRAMS_DIR = Path(__file__).resolve().parent / "programs"
+
+
+def toolchain(source: str, options: CompileOptions, workdir: Path, cc: str) -> Tuple[float, float, bytes]:
+    start = time.perf_counter()
+    exe = build_executable(compile_source(source, options), workdir, "prog", cc)
+    built = time.perf_counter()
+    output = subprocess.run([str(exe)], capture_output=True, check=True).stdout
+    return built - start, time.perf_counter() - built, output
+
+
+def jit(source: str, options: CompileOptions, workdir: Path) -> Tuple[float, float, bytes]:
+    capture = workdir / "stdout"
+    sys.stdout.flush()
+    saved = os.dup(1)
+    try:
+        with open(capture, "wb") as out:
+            os.dup2(out.fileno(), 1)
+            result = run_source(source, options)
+    finally:
+        os.dup2(saved, 1)
+        os.close(saved)
+    if result.status != 0:
+        raise SystemExit(f"main returned {result.status}")
+    return result.compile_seconds, result.run_seconds, capture.read_bytes()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("names", nargs="*", help="Programs to run (default: all)")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per way; the medians are reported")
+    parser.add_argument("-O", dest="opt_level", type=int, default=1, help="Optimization level")
+    parser.add_argument("--cc", default="gcc", help="C compiler used to assemble and link")
+    args = parser.parse_args()
+
+    paths = sorted(PROGRAMS_DIR.glob("*.nv"))
+    if args.names:
+        paths = [PROGRAMS_DIR / (name if name.endswith(".nv") else f"{name}.nv") for name in args.names]
+    options = CompileOptions(opt_level=args.opt_level)
+    print(f"{'program':<16} {'way':<10} {'compile':>10} {'run':>10} {'total':>10}")
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        for path in paths:
+            source = path.read_text(encoding="utf-8")
+            expected = path.with_suffix(".out").read_bytes()
+            ways = {
+                "toolchain": lambda: toolchain(source, options, workdir, args.cc),
+                "jit": lambda: jit(source, options, workdir),
+            }
+            for way, run in ways.items():
+                samples = [run() for _ in range(args.runs)]
+                if any(output != expected for _, _, output in samples):
+                    failures.append(f"{path.name} ({way}): output differs from {path.stem}.out")
+                compile_secs = statistics.median(sample[0] for sample in samples)
+                run_secs = statistics.median(sample[1] for sample in samples)
+                total = compile_secs + run_secs
+                times = f"{compile_secs * 1e3:>8.2f}ms {run_secs * 1e3:>8.2f}ms {total * 1e3:>8.2f}ms"
+                print(f"{path.stem:<16} {way:<10} {times}")
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Lexer throughput: tokens/second of ``src.lexer.tokenize`` versus the legacy lexer.
+
+Usage: python -m benchmarks.bench_lexer [--sizes 1 10 100] [--skip-legacy-above 10]
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Callable, List
+
+from src.lexer import tokenize
+
+from . import legacy_lexer
+
+FUNCTION_TEMPLATE = """\
+// generated helper {i}
+fn helper_{i}(a: int, b: int) -> int {{
+    let total: int = a * {i} + b;
+    let label = "helper {i} says \\"hi\\"\\n";
+    while (total > 1000 && b != 0) {{
+        total = total / 2 - (b + {i});
+    }}
+    if (!(total <= a) || a >= b) {{
+        print(label);
+    }} else {{
+        print(total);
+    }}
+    return total;
+}}
+"""
+
+
+def make_source(size_bytes: int) -> str:
+    """Build a deterministic Nova module of roughly ``size_bytes`` characters."""
+    parts: List[str] = []
+    total = 0
+    i = 0
+    while total < size_bytes:
+        chunk = FUNCTION_TEMPLATE.format(i=i)
+        parts.append(chunk)
+        total += len(chunk)
+        i += 1
+    return "".join(parts)
+
+
+def measure(lex: Callable[[str], list], source: str) -> tuple:
+    start = time.perf_counter()
+    count = len(lex(source))
+    return count, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 10, 100], help="Input sizes in MB")
+    parser.add_argument(
+        "--skip-legacy-above",
+        type=float,
+        default=None,
+        help="Skip the legacy lexer for inputs larger than this many MB",
+    )
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'tokens':>12} {'new tok/s':>14} {'legacy tok/s':>14} {'speedup':>8}")
+    for size_mb in args.sizes:
+        source = make_source(int(size_mb * 1024 * 1024))
+        count, new_secs = measure(tokenize, source)
+        if args.skip_legacy_above is not None and size_mb > args.skip_legacy_above:
+            legacy = "skipped"
+            speedup = "-"
+        else:
+            legacy_count, legacy_secs = measure(legacy_lexer.tokenize, source)
+            assert legacy_count == count, "lexers disagree on token count"
+            legacy = f"{count / legacy_secs:,.0f}"
+            speedup = f"{legacy_secs / new_secs:.1f}x"
+        print(f"{size_mb:>6g}MB {count:>12,} {count / new_secs:>14,.0f} {legacy:>14} {speedup:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Loop-invariant code motion and unrolling on small numeric kernels.
+
+Each kernel is compiled at -O2 four ways: with neither optimization
+(``--no-licm --unroll 1``), with invariant code motion only, with both
+at the default unroll factor, and with both at a larger factor. Sizes
+and trip counts come from a function the optimizer can't see through, so
+loop bounds and invariants are only known at run time. Outputs must match;
+reports the median wall time of each build and the speedup of the
+default build over the first.
+
+Usage: python -m benchmarks.bench_loops [--unroll 8] [--runs 5] [names ...]
+"""
+from __future__ import annotations
+
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from benchmarks.bench_runtime import time_runs
+from scripts.check_corpus import build_executable
+from src.driver import CompileOptions, compile_source
+from src.loopopt import DEFAULT_UNROLL
+
+# Returns its argument, but recursively, so it is never inlined.
+OPAQUE = """\
+fn opaque(x: int) -> int {
+    if (x == 123456789) {
+        return opaque(x - 1);
+    }
+    return x;
+}
+"""
+
+KERNELS: Dict[str, str] = {
+    "sum_squares": """\
+fn kernel(n: int, k: int) -> int {
+    let s = 0;
+    let i = 0;
+    while (i < n * 4) {
+        s = s + i * i + k * k;
+        i = i + 1;
+    }
+    return s;
+}
+
+fn main() -> int {
+    let total = 0;
+    let round = 0;
+    while (round < 40) {
+        total = total + kernel(opaque(500000), opaque(round));
+        round = round + 1;
+    }
+    print(total);
+    return 0;
+}
+""",
+    "polynomial": """\
+fn kernel(n: int, a: int, b: int, c: int) -> int {
+    let s = 0;
+    let x = 0;
+    while (x < n) {
+        s = s + (a * b + c) * x * x + (b * c - a) * x + (a - c) * (b + c);
+        x = x + 1;
+    }
+    return s;
+}
+
+fn main() -> int {
+    let total = 0;
+    let round = 0;
+    while (round < 40) {
+        total = total + kernel(opaque(1000000), opaque(3), opaque(round), opaque(7));
+        round = round + 1;
+    }
+    print(total);
+    return 0;
+}
+""",
+    "checksum": """\
+fn kernel(n: int, seed: int) -> int {
+    let h = seed;
+    let i = 0;
+    while (i < n) {
+        h = h * 31 + i;
+        h = h - h / 1000003 * 1000003;
+        i = i + 1;
+    }
+    return h;
+}
+
+fn main() -> int {
+    let total = 0;
+    let round = 0;
+    while (round < 20) {
+        total = total + kernel(opaque(1000000), opaque(round));
+        round = round + 1;
+    }
+    print(total);
+    return 0;
+}
+""",
+    "triangle": """\
+fn kernel(n: int, scale: int) -> int {
+    let s = 0;
+    let i = 0;
+    while (i < n) {
+        let j = 0;
+        while (j < i) {
+            s = s + j * scale + i;
+            j = j + 1;
+        }
+        i = i + 1;
+    }
+    return s;
+}
+
+fn main() -> int {
+    print(kernel(opaque(9000), opaque(3)));
+    return 0;
+}
+""",
+}
+
+
+def builds(unroll: int) -> List[Tuple[str, CompileOptions]]:
+    return [
+        ("plain", CompileOptions(opt_level=2, hoist_invariants=False, unroll=1)),
+        ("licm", CompileOptions(opt_level=2, unroll=1)),
+        (f"unroll {DEFAULT_UNROLL}", CompileOptions(opt_level=2)),
+        (f"unroll {unroll}", CompileOptions(opt_level=2, unroll=unroll)),
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("names", nargs="*", help="Kernels to run (default: all)")
+    parser.add_argument("--unroll", type=int, default=8, help="Unroll factor of the last build")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per binary; the median is reported")
+    parser.add_argument("--cc", default="gcc", help="C compiler used to assemble and link")
+    args = parser.parse_args()
+
+    configs = builds(args.unroll)
+    print(f"{'kernel':<14}" + "".join(f" {label:>10}" for label, _ in configs) + f" {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.names or list(KERNELS):
+            source = OPAQUE + "\n" + KERNELS[name]
+            outputs, times = [], []
+            for idx, (_, options) in enumerate(configs):
+                exe = build_executable(compile_source(source, options), Path(tmp), f"{name}_{idx}", args.cc)
+                output, secs = time_runs(exe, args.runs)
+                outputs.append(output)
+                times.append(secs)
+            if any(output != outputs[0] for output in outputs):
+                raise SystemExit(f"{name}: output differs between builds")
+            row = f"{name:<14}" + "".join(f" {secs:>9.3f}s" for secs in times)
+            print(row + f" {times[0] / times[2]:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
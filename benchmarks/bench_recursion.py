@@ -0,0 +1,117 @@
+"""Stack use and speed of deep tail recursion, with and without tail calls.
+
+Each program recurses to a given depth: a self-recursive accumulator
+(which becomes a loop) and a pair of functions calling each other (which
+become jumps). Each binary is run under doubling stack limits to find the
+smallest it completes under: with tail calls that stays flat as the depth
+grows, without it grows with the depth.
+
+Usage: python -m benchmarks.bench_recursion [--depths 1000 100000 10000000] [-O 1] [--max-stack KIB]
+"""
+from __future__ import annotations
+
+import argparse
+import resource
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from scripts.check_corpus import build_executable
+from src.driver import CompileOptions, compile_source
+
+# Stack limits tried, in KiB, double from here.
+MIN_STACK_KIB = 16
+
+PROGRAMS: Dict[str, str] = {
+    "accumulate": """\
+fn sum_to(n: int, acc: int) -> int {{
+    if (n == 0) {{
+        return acc;
+    }}
+    return sum_to(n - 1, acc + n);
+}}
+
+fn main() -> int {{
+    print(sum_to({depth}, 0));
+    return 0;
+}}
+""",
+    "ping_pong": """\
+fn ping(n: int, acc: int) -> int {{
+    if (n == 0) {{
+        return acc;
+    }}
+    return pong(n - 1, acc + 1);
+}}
+
+fn pong(n: int, acc: int) -> int {{
+    if (n == 0) {{
+        return acc;
+    }}
+    return ping(n - 1, acc * 3 - 2);
+}}
+
+fn main() -> int {{
+    print(ping({depth}, 0));
+    return 0;
+}}
+""",
+}
+
+
+def run_with_stack(exe: Path, stack_kib: int) -> Tuple[Optional[str], float]:
+    """Run ``exe`` with its stack limited to ``stack_kib``; return its output (None if it failed) and the wall time."""
+
+    def limit_stack() -> None:
+        resource.setrlimit(resource.RLIMIT_STACK, (stack_kib * 1024, resource.RLIM_INFINITY))
+
+    start = time.perf_counter()
+    proc = subprocess.run([str(exe)], capture_output=True, text=True, preexec_fn=limit_stack)
+    secs = time.perf_counter() - start
+    return (proc.stdout.strip() if proc.returncode == 0 else None), secs
+
+
+def stack_needed(exe: Path, max_kib: int) -> Tuple[Optional[int], Optional[str], float]:
+    """Smallest power-of-two stack limit, in KiB, that ``exe`` runs under (None if not even ``max_kib``).
+
+    Also returns its output and the wall time of that run.
+    """
+    kib = MIN_STACK_KIB
+    while kib <= max_kib:
+        output, secs = run_with_stack(exe, kib)
+        if output is not None:
+            return kib, output, secs
+        kib *= 2
+    return None, None, 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depths", type=int, nargs="+", default=[1000, 10000, 100000, 1000000, 10000000])
+    parser.add_argument("-O", dest="opt_level", type=int, default=1, help="Optimization level (tail calls need -O1)")
+    parser.add_argument("--max-stack", type=int, default=1 << 20, metavar="KIB", help="Largest stack limit to try")
+    parser.add_argument("--cc", default="gcc", help="C compiler used to assemble and link")
+    args = parser.parse_args()
+
+    print(f"{'program':<12} {'depth':>10} {'calls: stack, time':>24} {'tail calls: stack, time':>26}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, template in PROGRAMS.items():
+            for depth in args.depths:
+                source = template.format(depth=depth)
+                cells, outputs = [], []
+                for tail_calls in (False, True):
+                    options = CompileOptions(opt_level=args.opt_level, tail_calls=tail_calls)
+                    asm = compile_source(source, options)
+                    exe = build_executable(asm, Path(tmp), f"{name}_{int(tail_calls)}", args.cc)
+                    kib, output, secs = stack_needed(exe, args.max_stack)
+                    outputs.append(output)
+                    cells.append(f"{kib} KiB {secs:.3f}s" if kib is not None else f"> {args.max_stack} KiB")
+                if None not in outputs and outputs[0] != outputs[1]:
+                    raise SystemExit(f"{name} at depth {depth}: tail calls change the output")
+                print(f"{name:<12} {depth:>10} {cells[0]:>24} {cells[1]:>26}")
+
+
+if __name__ == "__main__":
+    main()
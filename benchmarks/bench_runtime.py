@@ -0,0 +1,100 @@
+"""Runtime of generated code: each program in benchmarks/programs at several -O levels.
+
+Each program is compiled at every level, assembled and linked with the C
+compiler and run ``--runs`` times; its output must match the golden file
+``<name>.out`` next to it (``--update`` rewrites those from the first
+level). Reports the median wall time, the instructions in the generated
+assembly, the binary's size and the speedup over the first level, as a
+table and, with ``--json``, as a file for tracking trends.
+
+Usage: python -m benchmarks.bench_runtime [--levels 0 1 2] [--runs 5] [--json PATH] [--update] [names ...]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from scripts.check_corpus import build_executable
+from src.driver import CompileOptions, compile_source
+from src.optimize import MAX_OPT_LEVEL
+
+PROGRAMS_DIR = Path(__file__).resolve().parent / "programs"
+
+
+def time_runs(exe: Path, runs: int) -> Tuple[str, float]:
+    """Run ``exe`` ``runs`` times; return its output and the median wall time."""
+    times: List[float] = []
+    output = ""
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run([str(exe)], capture_output=True, text=True, check=True)
+        times.append(time.perf_counter() - start)
+        output = proc.stdout
+    return output, statistics.median(times)
+
+
+def instruction_count(asm: str) -> int:
+    """Instructions in ``asm``: indented lines other than directives."""
+    return sum(1 for line in asm.splitlines() if line.startswith(" ") and not line.strip().startswith("."))
+
+
+def measure(path: Path, level: int, workdir: Path, args: argparse.Namespace) -> Tuple[str, Dict[str, object]]:
+    """Build and time ``path`` at ``level``; return its output and its row of results."""
+    asm = compile_source(path.read_text(encoding="utf-8"), CompileOptions(opt_level=level))
+    exe = build_executable(asm, workdir, f"{path.stem}_O{level}", args.cc)
+    output, secs = time_runs(exe, args.runs)
+    return output, {"seconds": secs, "instructions": instruction_count(asm), "binary_bytes": exe.stat().st_size}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("names", nargs="*", help="Programs to run (default: all)")
+    parser.add_argument("--levels", type=int, nargs="+", default=list(range(MAX_OPT_LEVEL + 1)))
+    parser.add_argument("--runs", type=int, default=5, help="Runs per binary; the median is reported")
+    parser.add_argument("--cc", default="gcc", help="C compiler used to assemble and link")
+    parser.add_argument("--json", type=Path, metavar="PATH", help="Also write the results to PATH as JSON")
+    parser.add_argument("--update", action="store_true", help="Rewrite each golden .out from the first level's output")
+    args = parser.parse_args()
+
+    paths = sorted(PROGRAMS_DIR.glob("*.nv"))
+    if args.names:
+        paths = [PROGRAMS_DIR / (name if name.endswith(".nv") else f"{name}.nv") for name in args.names]
+    print(f"{'program':<16} {'level':>5} {'median':>9} {'instrs':>7} {'binary':>8} {'speedup':>8}")
+    results: Dict[str, Dict[str, Dict[str, object]]] = {}
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in paths:
+            golden = path.with_suffix(".out")
+            expected = None if args.update else golden.read_text(encoding="utf-8")
+            rows: Dict[str, Dict[str, object]] = {}
+            for level in args.levels:
+                output, row = measure(path, level, Path(tmp), args)
+                if expected is None:
+                    golden.write_text(output, encoding="utf-8")
+                    expected = output
+                elif output != expected:
+                    failures.append(f"{path.name} -O{level}: output differs from {golden.name}")
+                rows[str(level)] = row
+                speedup = rows[str(args.levels[0])]["seconds"] / row["seconds"]
+                line = f"{path.stem:<16} {'-O' + str(level):>5} {row['seconds']:>8.3f}s"
+                print(line + f" {row['instructions']:>7} {row['binary_bytes']:>8} {speedup:>7.2f}x")
+            results[path.stem] = rows
+
+    if args.json is not None:
+        report = {"cc": args.cc, "runs": args.runs, "programs": results}
+        args.json.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
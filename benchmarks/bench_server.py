@@ -0,0 +1,115 @@
+"""Latency of one compile through the compile server versus a fresh ``compiler.py``.
+
+A server is started on a temporary socket. Each program is compiled
+``--runs`` times in four ways, and the median and slowest wall time of
+each are reported:
+
+- cli: ``python compiler.py FILE -O LEVEL --no-cache``, a new process per compile
+- client: ``python -m src.client FILE -O LEVEL``, a new thin client per compile
+- round trip: one request on an open connection, as an editor integration would send
+- server: the time the server itself spent on that request
+
+Usage: python -m benchmarks.bench_server [--runs 10] [-O 1] [--functions 10] [files ...]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from src.client import Client
+
+from .synth import SynthConfig, generate_program
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_FILES = [ROOT / "examples" / "hello.nv", ROOT / "examples" / "corpus" / "calls.nv"]
+
+
+def timings(run: Callable[[], object], runs: int) -> List[float]:
+    times: List[float] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def spawn(command: List[str]) -> None:
+    subprocess.run(command, cwd=ROOT, check=True, capture_output=True)
+
+
+def start_server(socket_path: Path) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, str(ROOT / "compiler.py"), "serve", "--socket", str(socket_path)],
+        cwd=ROOT,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while not socket_path.exists():
+        if proc.poll() is not None or time.monotonic() > deadline:
+            proc.kill()
+            raise SystemExit("the compile server did not start")
+        time.sleep(0.05)
+    return proc
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "files", nargs="*", type=Path, help="Programs to compile (default: two examples and a synthetic one)"
+    )
+    parser.add_argument("--runs", type=int, default=10, help="Compiles per way; the median and slowest are reported")
+    parser.add_argument("-O", dest="opt_level", type=int, default=1, help="Optimization level")
+    parser.add_argument("--functions", type=int, default=10, help="Functions in the synthetic program")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        files = [path.resolve() for path in args.files]
+        if not files:
+            synthetic = workdir / "synthetic.nv"
+            synthetic.write_text(generate_program(SynthConfig(functions=args.functions)), encoding="utf-8")
+            files = DEFAULT_FILES + [synthetic]
+        socket_path = workdir / "server.sock"
+        server = start_server(socket_path)
+        level = ["-O", str(args.opt_level)]
+        print(f"{'program':<16} {'way':<11} {'median':>10} {'max':>10}")
+        try:
+            with Client(socket_path) as client:
+                for path in files:
+                    output = workdir / f"{path.stem}.s"
+                    cli = [sys.executable, str(ROOT / "compiler.py"), str(path), "-o", str(output), "--no-cache"]
+                    thin = [sys.executable, "-m", "src.client", "--socket", str(socket_path), str(path)]
+                    thin += ["-o", str(output)]
+                    server_times: List[float] = []
+
+                    def round_trip() -> None:
+                        response = client.compile(path=path, options={"opt_level": args.opt_level})
+                        if not response["ok"]:
+                            raise SystemExit(f"{path.name}: {response['error']}")
+                        server_times.append(response["seconds"])
+
+                    results: Dict[str, List[float]] = {
+                        "cli": timings(lambda: spawn(cli + level), args.runs),
+                        "client": timings(lambda: spawn(thin + level), args.runs),
+                        "round trip": timings(round_trip, args.runs),
+                    }
+                    results["server"] = server_times
+                    for way, times in results.items():
+                        median, slowest = statistics.median(times), max(times)
+                        print(f"{path.stem:<16} {way:<11} {median * 1e3:>8.2f}ms {slowest * 1e3:>8.2f}ms")
+                client.request({"op": "shutdown"})
+        finally:
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+
+if __name__ == "__main__":
+    main()
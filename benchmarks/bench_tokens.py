@@ -0,0 +1,70 @@
+"""Token stream memory and parse time: TokenBuffer versus the legacy Token list.
+
+Usage: python -m benchmarks.bench_tokens [--sizes 1 4 16]
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import Callable, Tuple
+
+from src.lexer import tokenize
+from src.parser import parse_tokens
+
+from . import legacy_lexer, legacy_parser
+from .bench_lexer import make_source
+
+
+def peak_memory(fn: Callable[[], object]) -> Tuple[object, int]:
+    """Run ``fn`` under tracemalloc and return its result and peak allocation in bytes."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def timed(fn: Callable[[], object]) -> Tuple[object, float]:
+    gc.collect()
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16], help="Input sizes in MB")
+    args = parser.parse_args()
+
+    header = f"{'size':>8} {'tokens':>10} {'legacy mem':>12} {'buffer mem':>12} {'ratio':>6}"
+    header += f" {'legacy parse':>13} {'buffer parse':>13} {'speedup':>8}"
+    print(header)
+    for size_mb in args.sizes:
+        source = make_source(int(size_mb * 1024 * 1024))
+
+        # Each pipeline runs with only its own objects alive, so neither pays
+        # for the other's garbage-collector traversals.
+        buffer, buffer_mem = peak_memory(lambda: tokenize(source))
+        prog, buffer_secs = timed(lambda buffer=buffer: parse_tokens(buffer))
+        token_count, function_count = len(buffer), len(prog.functions)
+        del buffer, prog
+
+        legacy_tokens, legacy_mem = peak_memory(lambda: legacy_lexer.tokenize(source))
+        legacy_prog, legacy_secs = timed(lambda tokens=legacy_tokens: legacy_parser.parse_tokens(tokens))
+        assert len(legacy_tokens) == token_count, "token streams differ in length"
+        assert len(legacy_prog.functions) == function_count
+        del legacy_tokens, legacy_prog
+
+        row = f"{size_mb:>6g}MB {token_count:>10,} {legacy_mem / 2**20:>10.1f}MB {buffer_mem / 2**20:>10.1f}MB"
+        row += f" {legacy_mem / buffer_mem:>5.1f}x {legacy_secs:>12.2f}s {buffer_secs:>12.2f}s"
+        row += f" {legacy_secs / buffer_secs:>7.1f}x"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Deterministic synthetic Nova programs for compile-time benchmarks.
+
+Programs are valid and type-check. They are scaled by function count,
+nesting depth of ``if``/``while`` blocks, operators per expression and
+string literals. The same config always yields the same text.
+
+Usage: python -m benchmarks.synth [--functions 100] [--depth 3] [--expr-length 6] [--strings 50] [--seed 0]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass(frozen=True)
+class SynthConfig:
+    functions: int = 100
+    # How deeply if/while blocks nest inside each function body.
+    depth: int = 3
+    # Binary operators in each generated expression.
+    expr_length: int = 6
+    # String literals in the whole program, spread over the functions.
+    strings: int = 50
+    seed: int = 0
+
+    def label(self) -> str:
+        label = f"f{self.functions}-d{self.depth}-e{self.expr_length}-s{self.strings}"
+        return label + f"-seed{self.seed}" if self.seed else label
+
+
+class _Writer:
+    """Generates one function at a time; ``rng`` carries over, so output depends only on the config."""
+
+    def __init__(self, config: SynthConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.lines: List[str] = []
+        self.names = 0
+
+    def fresh(self, prefix: str) -> str:
+        self.names += 1
+        return f"{prefix}{self.names}"
+
+    def term(self, names: List[str]) -> str:
+        if self.rng.random() < 0.6:
+            return self.rng.choice(names)
+        return str(self.rng.randint(1, 999))
+
+    def expr(self, names: List[str]) -> str:
+        text = self.term(names)
+        for _ in range(self.config.expr_length):
+            op = self.rng.choice("+-*+-*/")
+            # Divisors are non-zero literals, so the program never traps.
+            right = str(self.rng.randint(2, 97)) if op == "/" else self.term(names)
+            text = f"({text} {op} {right})" if self.rng.random() < 0.3 else f"{text} {op} {right}"
+        return text
+
+    def cond(self, names: List[str]) -> str:
+        op = self.rng.choice(["<", "<=", ">", ">=", "==", "!="])
+        test = f"{self.rng.choice(names)} {op} {self.rng.randint(0, 999)}"
+        if self.rng.random() < 0.3:
+            test += f" && {self.rng.choice(names)} != {self.rng.randint(0, 999)}"
+        return test
+
+    def block(self, names: List[str], strings: List[str], depth: int, indent: str) -> None:
+        names = list(names)
+        for _ in range(2):
+            name = self.fresh("v")
+            self.lines.append(f"{indent}let {name} = {self.expr(names)};")
+            names.append(name)
+        # Loop counters are only advanced by their loop, so every loop ends.
+        target = self.rng.choice([name for name in names if not name.startswith("i")])
+        self.lines.append(f"{indent}{target} = {self.expr(names)};")
+        if strings:
+            self.lines.append(f'{indent}print("{strings.pop()}");')
+        if depth >= self.config.depth:
+            self.lines.append(f"{indent}print({self.expr(names)});")
+            return
+        self.lines.append(f"{indent}if ({self.cond(names)}) {{")
+        self.block(names, strings, depth + 1, indent + "    ")
+        self.lines.append(f"{indent}}} else {{")
+        self.lines.append(f"{indent}    {target} = {self.expr(names)};")
+        self.lines.append(f"{indent}}}")
+        counter = self.fresh("i")
+        self.lines.append(f"{indent}let {counter} = 0;")
+        self.lines.append(f"{indent}while ({counter} < {self.rng.randint(2, 20)}) {{")
+        self.block(names + [counter], strings, depth + 1, indent + "    ")
+        self.lines.append(f"{indent}    {counter} = {counter} + 1;")
+        self.lines.append(f"{indent}}}")
+
+
+def generate_program(config: SynthConfig) -> str:
+    """Nova source for ``config``: functions ``work_<i>``, each calling the one before it, and ``main``.
+
+    Each function calls its predecessor once, so ``main`` reaches every
+    function through one call chain and the program runs in linear time.
+    """
+    writer = _Writer(config)
+    texts = [f"synthetic string {idx}" for idx in range(config.strings)]
+    names = [f"work_{idx}" for idx in range(config.functions)]
+    for idx, name in enumerate(names):
+        # Every function gets the strings whose index it is congruent to.
+        strings = texts[idx :: config.functions][::-1]
+        writer.lines.append(f"fn {name}(a: int, b: int) -> int {{")
+        writer.block(["a", "b"], strings, 0, "    ")
+        for text in strings:
+            writer.lines.append(f'    print("{text}");')
+        call = f" + {names[idx - 1]}(b, a)" if idx else ""
+        writer.lines.append(f"    return {writer.expr(['a', 'b'])}{call};")
+        writer.lines.append("}")
+        writer.lines.append("")
+    writer.lines.append("fn main() -> int {")
+    writer.lines.append(f"    print({names[-1]}(1, 2));")
+    writer.lines.append("    return 0;")
+    writer.lines.append("}")
+    return "\n".join(writer.lines) + "\n"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--functions", type=int, default=SynthConfig.functions)
+    parser.add_argument("--depth", type=int, default=SynthConfig.depth)
+    parser.add_argument("--expr-length", type=int, default=SynthConfig.expr_length)
+    parser.add_argument("--strings", type=int, default=SynthConfig.strings)
+    parser.add_argument("--seed", type=int, default=SynthConfig.seed)
+    args = parser.parse_args()
+    config = SynthConfig(args.functions, args.depth, args.expr_length, args.strings, args.seed)
+    print(generate_program(config), end="")
+
+
+if __name__ == "__main__":
+    main()
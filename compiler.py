@@ -1,29 +1,290 @@
 import argparse
+import cProfile
+import dataclasses
+import json
+import os
+import sys
 from pathlib import Path
 
-from src.lexer import tokenize
-from src.parser import parse_tokens
-from src.codegen import generate_x86_64
+from src import jit, server
+from src.cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from src.ctfe import DEFAULT_CTFE_STEPS
+from src.driver import EMIT_KINDS, BuildConfig, BuildJob, CompileOptions, build, expand_inputs
+from src.errors import CompileError
+from src.instrument import CompileStats
+from src.inline import DEFAULT_INLINE_GROWTH, DEFAULT_INLINE_THRESHOLD
+from src.optimize import MAX_OPT_LEVEL
+from src.iropt import VALUE_NUMBERING_MODES
+from src.loopopt import DEFAULT_UNROLL
+from src.peephole import PeepholeStats
+from src.valnum import ValueNumberingStats
+
+# Output file suffix for each kind of --emit.
+SUFFIXES = {"asm": ".s", "ir": ".ir", "obj": ".o"}
+
+
+def plan_jobs(inputs, output, out_dir, suffix=".s"):
+    if len(inputs) == 1 and out_dir is None:
+        return [BuildJob(inputs[0], output or Path("out" + suffix))]
+    if output is not None:
+        raise CompileError("-o names a single output; use --out-dir with several inputs")
+    jobs = []
+    claimed = {}
+    for path in inputs:
+        if out_dir is None:
+            target = path.with_suffix(suffix)
+        else:
+            rel = Path(os.path.relpath(path)).with_suffix(suffix)
+            target = out_dir / (rel if not rel.parts or rel.parts[0] != ".." else rel.name)
+        if target in claimed:
+            raise CompileError(f"{path} and {claimed[target]} would both write {target}")
+        claimed[target] = path
+        jobs.append(BuildJob(path, target))
+    return jobs
+
+
+def run_in_process(inputs, options):
+    """Compile one program and run it from memory; exits with its main's status like the built binary."""
+    if len(inputs) != 1:
+        raise SystemExit("error: --run takes a single input")
+    try:
+        source = Path(inputs[0]).read_text(encoding="utf-8")
+        result = jit.run_source(source, options)
+    except (CompileError, OSError) as exc:
+        raise SystemExit(f"{inputs[0]}: error: {exc}")
+    print(f"compile {result.compile_seconds * 1e3:.2f} ms, run {result.run_seconds * 1e3:.2f} ms", file=sys.stderr)
+    if result.status & 0xFF:
+        raise SystemExit(result.status & 0xFF)
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Nova language compiler")
-    parser.add_argument("input", type=Path, help="Source file (.nv)")
-    parser.add_argument("-o", "--output", type=Path, default=Path("out.s"), help="Assembly output path")
+    if sys.argv[1:2] == ["serve"]:
+        server.main(sys.argv[2:])
+        return
+    parser = argparse.ArgumentParser(
+        description="Nova language compiler",
+        epilog="'compiler.py serve' runs a compile server instead; see 'compiler.py serve --help'.",
+    )
+    parser.add_argument("inputs", nargs="+", metavar="input", help="Source files (.nv), directories or glob patterns")
+    parser.add_argument(
+        "-o", "--output", type=Path, default=None, help="Output path (single input; default out.s, out.ir or out.o)"
+    )
+    parser.add_argument(
+        "--out-dir",
+        type=Path,
+        default=None,
+        help="Write one output per input under this directory (default: next to each input when building several)",
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Compile up to N files in parallel (0 = one per CPU)")
     parser.add_argument("--target", choices=["x86_64", "arm64"], default="x86_64", help="Target ISA")
+    parser.add_argument(
+        "-O",
+        dest="opt_level",
+        type=int,
+        choices=range(MAX_OPT_LEVEL + 1),
+        default=0,
+        metavar="LEVEL",
+        help="Optimization level: -O0 none; -O1 folding, register allocation, local value numbering, "
+        "strength reduction, peephole rules, tail calls and leaf functions; -O2 also constant propagation, "
+        "dead stores, compile-time evaluation, inlining, SSA passes, loop-invariant code motion and unrolling "
+        "(see README.md)",
+    )
+    parser.add_argument(
+        "--inline-threshold",
+        type=int,
+        default=None,
+        metavar="N",
+        help=f"Inline calls to non-recursive functions of at most N statements and expression nodes "
+        f"(default {DEFAULT_INLINE_THRESHOLD} at -O2, off below; 0 disables)",
+    )
+    parser.add_argument(
+        "--inline-growth",
+        type=int,
+        default=DEFAULT_INLINE_GROWTH,
+        metavar="N",
+        help=f"Stop inlining into a function once it would exceed N nodes (default {DEFAULT_INLINE_GROWTH})",
+    )
+    parser.add_argument(
+        "--ctfe-steps",
+        type=int,
+        default=None,
+        metavar="N",
+        help=f"Evaluate calls to pure functions with constant arguments at compile time, giving up after N steps "
+        f"(default {DEFAULT_CTFE_STEPS} at -O2, off below; 0 disables; it also enables evaluation at -O1)",
+    )
+    parser.add_argument(
+        "--no-tail-calls",
+        action="store_true",
+        help="Keep every call a call; by default from -O1, self tail calls become loops and other tail calls jumps",
+    )
+    parser.add_argument(
+        "--unroll",
+        type=int,
+        metavar="N",
+        help=f"Run N copies of a small counted loop's body per test (default {DEFAULT_UNROLL} at -O2, off below; "
+        "1 disables; it also enables unrolling at -O0/-O1)",
+    )
+    parser.add_argument(
+        "--no-licm",
+        action="store_true",
+        help="Leave loop-invariant computations in their loops; by default -O2 moves them to the preheader",
+    )
+    parser.add_argument(
+        "--value-numbering",
+        choices=VALUE_NUMBERING_MODES,
+        default="local",
+        help="From -O1, reuse the result of an expression computed earlier in the same block (local, the default) "
+        "or, at -O2, also in a dominating block (global)",
+    )
+    parser.add_argument(
+        "--no-leaf-functions",
+        action="store_true",
+        help="Give every function an rbp frame; by default from -O1, functions that call nothing keep "
+        "values in unused argument registers and the red zone instead",
+    )
+    parser.add_argument(
+        "--keep",
+        action="append",
+        default=[],
+        metavar="NAME",
+        help="Emit and export function NAME even if main never calls it (repeatable); "
+        "by default only main and the functions it can reach are emitted",
+    )
+    parser.add_argument(
+        "--emit",
+        choices=EMIT_KINDS,
+        default="asm",
+        help="Write assembly (.s, the default), the optimized IR (.ir; bypasses the cache) or a relocatable "
+        "ELF object (.o) encoded without an external assembler",
+    )
+    parser.add_argument("--emit-ir", dest="emit", action="store_const", const="ir", help="Same as --emit ir")
+    parser.add_argument(
+        "--run",
+        action="store_true",
+        help="Compile the single input and run it in this process from memory, without writing files or using "
+        "the assembler and linker; reports compile and run time on stderr",
+    )
+    parser.add_argument("--verify-ir", action="store_true", help="Check IR invariants after lowering and every IR pass")
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Report the tokens, AST nodes, functions, instructions, frame bytes and string pool compiled, "
+        "how often each peephole rule fired and how many instructions it removed, "
+        "and how many expressions value numbering reused",
+    )
+    parser.add_argument(
+        "--stats-json",
+        type=Path,
+        metavar="PATH",
+        help="Write the --stats counters, phase times and cache counts to PATH as JSON",
+    )
+    parser.add_argument(
+        "--time-passes",
+        action="store_true",
+        help="Report the wall and CPU time spent in each compiler phase, summed over all files",
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        nargs="?",
+        const=Path("compile.pstats"),
+        metavar="PATH",
+        help="Run the build under cProfile, in this process (as with -j 1), and save the profile to PATH "
+        "(default compile.pstats) for pstats or snakeviz",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Per-function incremental compilation cache (default: {DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Compile everything from scratch; don't touch the cache")
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+        help="Evict least recently used cache entries beyond this many MB",
+    )
     args = parser.parse_args()
 
-    source = args.input.read_text(encoding="utf-8")
-    tokens = tokenize(source)
-    prog = parse_tokens(tokens)
+    if args.target != "x86_64":
+        raise SystemExit("ARM64 backend not implemented yet")
 
-    if args.target == "x86_64":
-        asm = generate_x86_64(prog)
+    options = CompileOptions(
+        target=args.target,
+        opt_level=args.opt_level,
+        emit=args.emit,
+        verify_ir=args.verify_ir,
+        inline_threshold=args.inline_threshold,
+        inline_growth=args.inline_growth,
+        tail_calls=not args.no_tail_calls,
+        unroll=args.unroll,
+        hoist_invariants=not args.no_licm,
+        value_numbering=args.value_numbering,
+        leaf_functions=not args.no_leaf_functions,
+        ctfe_steps=args.ctfe_steps,
+        keep=tuple(args.keep),
+    )
+    if args.run:
+        run_in_process(args.inputs, options)
+        return
+    try:
+        jobs = plan_jobs(expand_inputs(args.inputs), args.output, args.out_dir, SUFFIXES[args.emit])
+    except CompileError as exc:
+        raise SystemExit(f"error: {exc}")
+    config = BuildConfig(
+        options,
+        None if args.no_cache or args.emit == "ir" else args.cache_dir,
+        args.cache_size * 1024 * 1024,
+        instrument=args.stats or args.stats_json is not None or args.time_passes,
+    )
+    workers = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    if args.profile is not None:
+        profiler = cProfile.Profile()
+        results, stats = profiler.runcall(build, jobs, config, 1)
+        profiler.dump_stats(args.profile)
     else:
-        raise SystemExit("ARM64 backend not implemented yet")
+        results, stats = build(jobs, config, workers)
 
-    args.output.write_text(asm, encoding="utf-8")
-    print(f"Wrote {args.output}")
+    failed = 0
+    for result in results:
+        if result.ok:
+            print(f"Wrote {result.job.output}")
+        else:
+            failed += 1
+            print(f"{result.job.input}: error: {result.error}", file=sys.stderr)
+    if config.cache_dir is not None:
+        print(stats.summary())
+    compilation = CompileStats()
+    peephole = PeepholeStats()
+    value_numbering = ValueNumberingStats()
+    for result in results:
+        compilation.add(result.compile_stats)
+        peephole.add(result.peephole_stats)
+        value_numbering.add(result.value_numbering_stats)
+    if args.stats:
+        print(compilation.report())
+        print(peephole.report())
+        print(value_numbering.report())
+    if args.time_passes:
+        print(compilation.time_report())
+    if args.stats_json is not None:
+        report = {
+            "files": len(results),
+            "failed": failed,
+            "compile": compilation.as_dict(),
+            "peephole": peephole.as_dict(),
+            "value_numbering": value_numbering.as_dict(),
+            "cache": dataclasses.asdict(stats),
+        }
+        args.stats_json.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"Wrote {args.stats_json}")
+    if args.profile is not None:
+        print(f"Wrote {args.profile}")
+    if len(results) > 1:
+        print(f"Compiled {len(results) - failed} of {len(results)} file(s)")
+    if failed:
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
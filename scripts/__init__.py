@@ -0,0 +1 @@
+# Developer scripts for the Nova compiler; run modules with `python -m scripts.<name>`.
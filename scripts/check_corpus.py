@@ -0,0 +1,114 @@
+"""Run the example corpus at every optimization level and compare with expected output.
+
+Each ``examples/corpus/<name>.nv`` is compiled, linked with the system C
+compiler and run; its stdout must match ``<name>.out`` and it must exit 0.
+With ``--emit obj`` the compiler writes the object itself and the C
+compiler only links it.
+
+Usage: python -m scripts.check_corpus [--levels 0 1 2] [--emit asm|obj] [--update] [names ...]
+"""
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Union
+
+from src.driver import CompileOptions, compile_source
+from src.errors import CompileError
+from src.optimize import MAX_OPT_LEVEL
+
+CORPUS_DIR = Path(__file__).resolve().parent.parent / "examples" / "corpus"
+
+
+def build_executable(asm: Union[str, bytes], workdir: Path, name: str, cc: str = "gcc") -> Path:
+    """Assemble (or, given an object's bytes, just link) ``asm`` into ``workdir/name``.
+
+    Raises RuntimeError on toolchain errors.
+    """
+    exe_path = workdir / name
+    if isinstance(asm, bytes):
+        input_path = workdir / f"{name}.o"
+        input_path.write_bytes(asm)
+    else:
+        input_path = workdir / f"{name}.s"
+        input_path.write_text(asm, encoding="utf-8")
+    proc = subprocess.run([cc, str(input_path), "-o", str(exe_path)], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{cc} failed:\n{proc.stderr.strip()}")
+    return exe_path
+
+
+def run_program(
+    source: str, level: int, workdir: Path, cc: str = "gcc", timeout: float = 10.0, emit: str = "asm"
+) -> str:
+    """Compile ``source`` at ``level`` and return what the binary prints; raises on any failure."""
+    asm = compile_source(source, CompileOptions(opt_level=level, emit=emit))
+    exe = build_executable(asm, workdir, f"prog_O{level}", cc)
+    proc = subprocess.run([str(exe)], capture_output=True, text=True, timeout=timeout)
+    if proc.returncode != 0:
+        raise RuntimeError(f"exited with status {proc.returncode}")
+    return proc.stdout
+
+
+def check(path: Path, levels: List[int], workdir: Path, cc: str, update: bool, emit: str = "asm") -> List[str]:
+    """Return one failure message per level whose output differs from the expected file."""
+    source = path.read_text(encoding="utf-8")
+    expected_path = path.with_suffix(".out")
+    expected: Optional[str] = None if update else expected_path.read_text(encoding="utf-8")
+    failures: List[str] = []
+    for level in levels:
+        try:
+            output = run_program(source, level, workdir, cc, emit=emit)
+        except (CompileError, RuntimeError, subprocess.TimeoutExpired) as exc:
+            failures.append(f"{path.name} -O{level}: {exc}")
+            continue
+        if expected is None:
+            expected_path.write_text(output, encoding="utf-8")
+            expected = output
+        elif output != expected:
+            failures.append(f"{path.name} -O{level}: output differs from {expected_path.name}")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("names", nargs="*", help="Corpus programs to run (default: all)")
+    parser.add_argument("--levels", type=int, nargs="+", default=list(range(MAX_OPT_LEVEL + 1)))
+    parser.add_argument("--cc", default="gcc", help="C compiler used to assemble and link")
+    parser.add_argument(
+        "--emit",
+        choices=["asm", "obj"],
+        default="asm",
+        help="Have the compiler write assembly for the C compiler (the default) or the object itself",
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Rewrite each .out from the first level's output, then check the other levels against it",
+    )
+    args = parser.parse_args()
+
+    paths = sorted(CORPUS_DIR.glob("*.nv"))
+    if args.names:
+        paths = [CORPUS_DIR / (name if name.endswith(".nv") else f"{name}.nv") for name in args.names]
+    failures: List[str] = []
+    passed = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in paths:
+            result = check(path, args.levels, Path(tmp), args.cc, args.update, args.emit)
+            print(f"{'FAIL' if result else 'ok':>4}  {path.name}")
+            failures.extend(result)
+            passed += not result
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    levels = ", ".join(f"-O{level}" for level in args.levels)
+    print(f"{passed} of {len(paths)} program(s) passed at {levels}")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
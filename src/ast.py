@@ -1,112 +1,120 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import List, Optional
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
 
+# Nodes are slotted dataclasses: no per-instance __dict__, so large programs
+# stay compact and attribute access is a direct slot read.
 
-@dataclass
+@dataclass(slots=True)
 class Program:
     functions: List["FunctionDef"]
 
 
-@dataclass
+@dataclass(slots=True)
 class FunctionDef:
     name: str
     params: List["Param"]
     return_type: Optional[str]
     body: "Block"
+    # Source offsets [start, end) of the whole definition, when parsed from text.
+    span: Optional[Tuple[int, int]] = field(default=None, repr=False, compare=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class Param:
     name: str
     type_name: Optional[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class Block:
     statements: List["Stmt"]
 
 
+@dataclass(slots=True)
 class Stmt:
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class LetStmt(Stmt):
     name: str
     type_name: Optional[str]
     expr: "Expr"
 
 
-@dataclass
+@dataclass(slots=True)
 class AssignStmt(Stmt):
     name: str
     expr: "Expr"
 
 
-@dataclass
+@dataclass(slots=True)
 class IfStmt(Stmt):
     cond: "Expr"
     then_block: Block
     else_block: Optional[Block]
 
 
-@dataclass
+@dataclass(slots=True)
 class WhileStmt(Stmt):
     cond: "Expr"
     body: Block
 
 
-@dataclass
+@dataclass(slots=True)
 class ReturnStmt(Stmt):
     expr: Optional["Expr"]
 
 
-@dataclass
+@dataclass(slots=True)
 class ExprStmt(Stmt):
     expr: "Expr"
 
 
+@dataclass(slots=True)
 class Expr:
-    pass
+    # Filled in by the type checker; keyword-only so subclasses keep their
+    # positional constructors.
+    inferred_type: Optional[str] = field(default=None, kw_only=True, repr=False, compare=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class IntLiteral(Expr):
     value: int
 
 
-@dataclass
+@dataclass(slots=True)
 class BoolLiteral(Expr):
     value: bool
 
 
-@dataclass
+@dataclass(slots=True)
 class StringLiteral(Expr):
     value: str
     label: Optional[str] = None  # assigned during codegen
 
 
-@dataclass
+@dataclass(slots=True)
 class VarRef(Expr):
     name: str
 
 
-@dataclass
+@dataclass(slots=True)
 class UnaryOp(Expr):
     op: str
     expr: Expr
 
 
-@dataclass
+@dataclass(slots=True)
 class BinaryOp(Expr):
     left: Expr
     op: str
     right: Expr
 
 
-@dataclass
+@dataclass(slots=True)
 class Call(Expr):
     callee: str
     args: List[Expr]
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from . import ast
+from .codegen import FunctionAsm
+from .typesys import FunctionSig
+from .walk import called_functions
+
+# Bump when the on-disk entry layout changes. Changes to the compiler itself
+# are picked up through the source fingerprint instead.
+CACHE_FORMAT = 4
+DEFAULT_CACHE_DIR = Path(".novacache")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Eviction trims down to this fraction of the bound, so it doesn't run on every build.
+_LOW_WATER = 0.8
+_SUFFIX = ".json"
+# Entries before format 4 were pickled; eviction still counts and removes them.
+_OLD_SUFFIX = ".pkl"
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    def add(self, other: "CacheStats") -> None:
+        self.hits += other.hits
+        self.misses += other.misses
+        self.stores += other.stores
+        self.evictions += other.evictions
+
+    def summary(self) -> str:
+        return f"cache: {self.hits} hit(s), {self.misses} miss(es), {self.evictions} evicted"
+
+
+@dataclass
+class CacheEntry:
+    unit: FunctionAsm
+    # The type-checked function; None if it was too deep to pickle, or the
+    # entry was read from disk, which only keeps the assembly.
+    typed_fn: Optional[ast.FunctionDef]
+
+
+def compiler_fingerprint() -> bytes:
+    """Digest of the compiler's own sources, so a compiler change invalidates entries."""
+    digest = hashlib.sha256(f"nova-cache-{CACHE_FORMAT}".encode())
+    src_dir = Path(__file__).resolve().parent
+    for path in sorted(src_dir.glob("*.py")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.digest()
+
+
+class FunctionCache:
+    """Content-addressed on-disk store of per-function compilation results.
+
+    An entry is keyed by the function's own source text plus the signatures
+    of every function it calls, which is everything its type check and code
+    generation depend on. Each entry is one JSON file holding the function's
+    assembly, so reading a cache someone else wrote runs none of their code;
+    the type-checked AST is not kept, and a caller that needs it checks the
+    function again. Access time is tracked through mtime and the least
+    recently used entries are evicted once the directory grows past
+    ``max_bytes``.
+    """
+
+    def __init__(self, root: Path = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._fingerprint = compiler_fingerprint()
+
+    def key(
+        self,
+        fn: ast.FunctionDef,
+        source: str,
+        sigs: Dict[str, FunctionSig],
+        options: str = "",
+        deps: Sequence[ast.FunctionDef] = (),
+    ) -> Optional[str]:
+        """Cache key for ``fn``, or None if it (or one of ``deps``) has no source span to hash.
+
+        ``deps`` are functions whose bodies ``fn``'s code depends on, such as
+        those inlined into it.
+        """
+        if fn.span is None or any(dep.span is None for dep in deps):
+            return None
+        digest = hashlib.sha256(self._fingerprint)
+        digest.update(options.encode())
+        digest.update(b"\0")
+        digest.update(source[fn.span[0] : fn.span[1]].encode())
+        for name in sorted(called_functions(fn)):
+            digest.update(f"\0{name}:{sigs.get(name)!r}".encode())
+        for dep in deps:
+            digest.update(b"\0")
+            digest.update(source[dep.span[0] : dep.span[1]].encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}{_SUFFIX}"
+
+    def load(self, key: str) -> Optional[CacheEntry]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                entry = CacheEntry(FunctionAsm(**json.load(fh)), None)
+            os.utime(path)
+        except FileNotFoundError:
+            self.stats.misses += 1
+            return None
+        except (OSError, ValueError, TypeError):
+            # Corrupt or written by an incompatible version: drop it.
+            path.unlink(missing_ok=True)
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return entry
+
+    def store(self, key: str, entry: CacheEntry) -> None:
+        data = json.dumps(dataclasses.asdict(entry.unit)).encode()
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write-then-rename keeps concurrent compilers from seeing partial entries.
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self.stats.stores += 1
+
+    def evict(self) -> None:
+        """Enforce the size bound by deleting least recently used entries."""
+        entries: List[Tuple[float, int, Path]] = []
+        total = 0
+        if not self.root.is_dir():
+            return
+        for bucket in os.scandir(self.root):
+            if not bucket.is_dir():
+                continue
+            for item in os.scandir(bucket.path):
+                if not item.name.endswith((_SUFFIX, _OLD_SUFFIX)):
+                    continue
+                try:
+                    st = item.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, Path(item.path)))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        target = self.max_bytes * _LOW_WATER
+        for _, size, path in entries:
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            self.stats.evictions += 1
+
+
+class MemoryCache(FunctionCache):
+    """A :class:`FunctionCache` kept in this process's memory instead of on disk.
+
+    Entries are keyed the same way and stored pickled, so every load gets
+    its own copy and compilations running in different threads never share
+    AST nodes. Least recently used entries are evicted as soon as the
+    entries together exceed ``max_bytes``. All methods are thread-safe.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._fingerprint = compiler_fingerprint()
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def load(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+        return pickle.loads(data)
+
+    def store(self, key: str, entry: CacheEntry) -> None:
+        try:
+            data = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            data = pickle.dumps(CacheEntry(entry.unit, None), protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = data
+            self._bytes += len(data)
+            self.stats.stores += 1
+            self._evict_locked()
+
+    def evict(self) -> None:
+        with self._lock:
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            _, data = self._entries.popitem(last=False)
+            self._bytes -= len(data)
+            self.stats.evictions += 1
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Set
+
+from . import ast
+from .walk import iter_block_exprs, iter_stmts
+
+
+@dataclass
+class CallGraph:
+    """Calls between the user functions of a program (builtins are left out)."""
+
+    # caller -> callee -> number of call sites, callees in order of first call
+    calls: Dict[str, Counter] = field(default_factory=dict)
+
+    def callees(self, name: str) -> List[str]:
+        return list(self.calls.get(name, ()))
+
+    def callers(self, name: str) -> List[str]:
+        return [caller for caller, callees in self.calls.items() if name in callees]
+
+    def sccs(self) -> List[List[str]]:
+        """Strongly connected components, callees before their callers.
+
+        Tarjan's algorithm, driven by an explicit stack so long call chains
+        don't recurse.
+        """
+        index: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        on_stack: Set[str] = set()
+        stack: List[str] = []
+        result: List[List[str]] = []
+        for root in self.calls:
+            if root in index:
+                continue
+            work = [(root, iter(self.callees(root)))]
+            index[root] = low[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                name, callees = work[-1]
+                callee = next(callees, None)
+                if callee is not None:
+                    if callee not in index:
+                        index[callee] = low[callee] = len(index)
+                        stack.append(callee)
+                        on_stack.add(callee)
+                        work.append((callee, iter(self.callees(callee))))
+                    elif callee in on_stack:
+                        low[name] = min(low[name], index[callee])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[name])
+                if low[name] == index[name]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == name:
+                            break
+                    result.append(component)
+        return result
+
+    def recursive(self) -> Set[str]:
+        """Functions that can call themselves, directly or through others."""
+        names: Set[str] = set()
+        for component in self.sccs():
+            if len(component) > 1 or component[0] in self.calls.get(component[0], ()):
+                names.update(component)
+        return names
+
+    def reachable(self, roots: List[str]) -> Set[str]:
+        seen = {root for root in roots if root in self.calls}
+        stack = list(seen)
+        while stack:
+            for callee in self.callees(stack.pop()):
+                if callee not in seen:
+                    seen.add(callee)
+                    stack.append(callee)
+        return seen
+
+
+def entry_points(prog: ast.Program, keep: Iterable[str] = ()) -> List[str]:
+    """Functions emitted and exported whether or not anything calls them: ``main`` and those in ``keep``.
+
+    Names in ``keep`` that the program doesn't define are ignored. A
+    program with neither is a library, and all of its functions are kept.
+    """
+    names = [fn.name for fn in prog.functions]
+    wanted = {"main", *keep}
+    roots = [name for name in names if name in wanted]
+    return roots or names
+
+
+def reachable_from(roots: Iterable[str], callees: Callable[[str], Iterable[str]]) -> List[str]:
+    """``roots`` and every function reachable from them, in the order found.
+
+    ``callees(name)`` lists what ``name`` calls; it is called once per
+    function reached, so it may build the function on demand.
+    """
+    seen: List[str] = []
+    found: Set[str] = set()
+    stack = list(roots)[::-1]
+    while stack:
+        name = stack.pop()
+        if name in found:
+            continue
+        found.add(name)
+        seen.append(name)
+        stack.extend(callee for callee in reversed(list(callees(name))) if callee not in found)
+    return seen
+
+
+def build_call_graph(prog: ast.Program) -> CallGraph:
+    names = {fn.name for fn in prog.functions}
+    graph = CallGraph()
+    for fn in prog.functions:
+        graph.calls[fn.name] = Counter(
+            expr.callee for expr in iter_block_exprs(fn.body) if isinstance(expr, ast.Call) and expr.callee in names
+        )
+    return graph
+
+
+def function_size(fn: ast.FunctionDef) -> int:
+    """Size estimate of a function: its statements plus expression nodes."""
+    return sum(1 for _ in iter_stmts(fn.body)) + sum(1 for _ in iter_block_exprs(fn.body))
@@ -0,0 +1,102 @@
+"""Thin client for the compile server (``compiler.py serve --socket``).
+
+Imports only the standard library, so a compile through a running server
+costs an interpreter start and one round trip rather than loading the
+compiler. Paths are sent absolute; the server reads and writes the files.
+
+Usage: python -m src.client [--socket PATH] [-O LEVEL] [-o OUTPUT] input [input ...]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+DEFAULT_SOCKET = Path(".nova.sock")
+
+
+class Client:
+    """One connection to a compile server; requests on it are answered in order."""
+
+    def __init__(self, path: Path = DEFAULT_SOCKET):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(str(path))
+        self.reader = self.sock.makefile("rb")
+        self.next_id = 0
+
+    def request(self, message: Dict[str, object]) -> Dict[str, object]:
+        """Send one request and wait for its response."""
+        self.next_id += 1
+        message = dict(message, id=self.next_id)
+        self.sock.sendall(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("the compile server closed the connection")
+        return json.loads(line)
+
+    def compile(
+        self,
+        source: Optional[str] = None,
+        path: Optional[Path] = None,
+        options: Optional[Dict[str, object]] = None,
+        output: Optional[Path] = None,
+    ) -> Dict[str, object]:
+        """Compile ``source`` (or the file at ``path``); the response has ``asm``, or ``output`` if given one."""
+        message: Dict[str, object] = {"op": "compile", "options": options or {}}
+        if source is not None:
+            message["source"] = source
+        if path is not None:
+            message["path"] = os.path.abspath(path)
+        if output is not None:
+            message["output"] = os.path.abspath(output)
+        return self.request(message)
+
+    def close(self) -> None:
+        self.reader.close()
+        self.sock.close()
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", type=Path, metavar="input", help="Source files (.nv)")
+    parser.add_argument("-o", "--output", type=Path, help="Output path (single input; default: next to the input)")
+    parser.add_argument("-O", dest="opt_level", type=int, default=0, metavar="LEVEL", help="Optimization level")
+    parser.add_argument("--keep", action="append", default=[], metavar="NAME", help="Also emit and export NAME")
+    parser.add_argument("--socket", type=Path, default=DEFAULT_SOCKET, help=f"Server socket (default {DEFAULT_SOCKET})")
+    parser.add_argument("--stats", action="store_true", help="Print the server's cache counters afterwards")
+    args = parser.parse_args(argv)
+    if args.output is not None and len(args.inputs) > 1:
+        raise SystemExit("error: -o names a single output")
+
+    options = {"opt_level": args.opt_level, "keep": args.keep}
+    failed: List[Path] = []
+    try:
+        with Client(args.socket) as client:
+            for path in args.inputs:
+                output = args.output or path.with_suffix(".s")
+                response = client.compile(path=path, options=options, output=output)
+                if response["ok"]:
+                    print(f"Wrote {output}")
+                else:
+                    failed.append(path)
+                    print(f"{path}: error: {response['error']}", file=sys.stderr)
+            if args.stats:
+                print(json.dumps(client.request({"op": "stats"})["stats"], indent=2))
+    except OSError as exc:
+        raise SystemExit(f"error: cannot reach the compile server at {args.socket}: {exc}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,71 +1,193 @@
 from __future__ import annotations
 
-from typing import Dict, List, Set
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
 
-from . import ast
+from . import ast, ir
+from .callgraph import entry_points, reachable_from
+from .elf import write_object
+from .encoder import MachineCode, assemble
+from .lower import lower_function
+from .regalloc import allocate
+from .strength import LEA_MULTIPLIERS
 from .typesys import TypeChecker
 
+_STRING_REF = re.compile(r"\.Lstr(\d+)\b")
+_SET_INSTR = {"eq": "sete", "ne": "setne", "lt": "setl", "le": "setle", "gt": "setg", "ge": "setge"}
+_JUMP_INSTR = {"eq": "je", "ne": "jne", "lt": "jl", "le": "jle", "gt": "jg", "ge": "jge"}
+_NEGATED = {"eq": "ne", "ne": "eq", "lt": "ge", "ge": "lt", "le": "gt", "gt": "le"}
+# The comparison that holds with its operands swapped.
+_MIRRORED = {"eq": "eq", "ne": "ne", "lt": "gt", "gt": "lt", "le": "ge", "ge": "le"}
+_ARITH_INSTR = {"add": "add", "sub": "sub", "mul": "imul", "shl": "shl", "sar": "sar", "shr": "shr"}
+_COMMUTATIVE = frozenset({"add", "mul"})
+_REGISTERS = frozenset(
+    "rax rbx rcx rdx rsi rdi rbp rsp r8 r9 r10 r11 r12 r13 r14 r15".split()
+)
+
+
+def _is_register(operand: str) -> bool:
+    return operand in _REGISTERS
+
+
+def _is_memory(operand: str) -> bool:
+    return operand.startswith("qword ptr [")
+
+
+# Bytes below rsp that a function may use without moving rsp (SysV ABI);
+# signal handlers and the kernel leave them alone.
+RED_ZONE = 128
+# Used while evaluating expressions and dividing; never allocated.
+SCRATCH_REGS = frozenset({"rax", "rcx", "rdx"})
+
+
+@dataclass
+class Frame:
+    """Stack layout of one function, decided once before its body is emitted."""
+
+    # Callee-saved registers pushed in the prologue, in push order.
+    saved: List[str]
+    # Bytes reserved with ``sub rsp`` below the saved registers.
+    size: int
+    # Whether rbp is set up as a frame pointer; leaf functions whose spill
+    # slots fit in the red zone address them off rsp instead.
+    pointer: bool = True
+
+
+@dataclass
+class FunctionAsm:
+    """Assembly for one function, independent of every other function.
+
+    String literals are referenced as ``.Lstr<k>`` where ``k`` indexes
+    ``strings``; :meth:`X86Codegen.link` maps them onto the program-wide pool.
+    Control-flow labels carry the function name, so units never collide.
+    """
+
+    name: str
+    lines: List[str]
+    strings: List[str]
+    # Functions the code calls or jumps to, which must be linked with it.
+    calls: List[str] = field(default_factory=list)
+    # Stack reserved below the return address: rbp, saved registers and spill slots.
+    frame_bytes: int = 0
+
 
 class X86Codegen:
+    """Selects x86-64 instructions for IR functions.
+
+    Every vreg has one location for the whole function, a register or a
+    stack slot, chosen by :func:`regalloc.allocate`. Slots are rbp-relative,
+    or rsp-relative in the red zone for leaf functions without a frame
+    pointer. rax, rcx and rdx are scratch; the argument registers are only
+    written right before a call, where no vreg lives in them.
+    """
+
     param_regs = ["rdi", "rsi", "rdx", "rcx", "r8", "r9"]
 
-    def __init__(self, prog: ast.Program):
+    def __init__(self, prog: ast.Program, allocate_registers: bool = False, leaf_functions: bool = False):
         self.prog = prog
+        # Without allocation every vreg gets a stack slot (slots are still
+        # shared between vregs whose lifetimes don't overlap).
+        self.allocate_registers = allocate_registers
+        # Whether functions that call nothing get the lighter frame of _layout_frame.
+        self.leaf_functions = leaf_functions
+        self.frame = Frame([], 0)
         self.lines: List[str] = []
         self.string_labels: Dict[str, str] = {}
-        self.label_counter = 0
+        self.locations: Dict[int, str] = {}
+        self.fn_name = ""
+        # Arguments this function was passed on the stack; a tail call may
+        # reuse their slots for its own.
+        self.stack_params = 0
+        # Comparisons emitted as part of the branch that uses them, by result vreg id.
+        self.fused: Dict[int, ir.Binary] = {}
 
-    def compile(self) -> str:
+    def compile(self, keep: Sequence[str] = ()) -> str:
+        """Type-check the program and generate the functions reachable from ``main`` and ``keep``."""
         TypeChecker(self.prog).check()
-        self._collect_strings()
-        self._emit_preamble()
-        for fn in self.prog.functions:
-            self._emit_function(fn)
-        return "\n".join(self.lines)
-
-    def _collect_strings(self) -> None:
-        for fn in self.prog.functions:
-            self._collect_strings_block(fn.body)
-
-    def _collect_strings_block(self, block: ast.Block) -> None:
-        for stmt in block.statements:
-            if isinstance(stmt, ast.LetStmt):
-                self._collect_strings_expr(stmt.expr)
-            elif isinstance(stmt, ast.AssignStmt):
-                self._collect_strings_expr(stmt.expr)
-            elif isinstance(stmt, ast.ExprStmt):
-                self._collect_strings_expr(stmt.expr)
-            elif isinstance(stmt, ast.ReturnStmt):
-                if stmt.expr:
-                    self._collect_strings_expr(stmt.expr)
-            elif isinstance(stmt, ast.IfStmt):
-                self._collect_strings_expr(stmt.cond)
-                self._collect_strings_block(stmt.then_block)
-                if stmt.else_block:
-                    self._collect_strings_block(stmt.else_block)
-            elif isinstance(stmt, ast.WhileStmt):
-                self._collect_strings_expr(stmt.cond)
-                self._collect_strings_block(stmt.body)
-
-    def _collect_strings_expr(self, expr: ast.Expr) -> None:
-        if isinstance(expr, ast.StringLiteral):
-            if expr.value not in self.string_labels:
-                label = f".Lstr{len(self.string_labels)}"
-                self.string_labels[expr.value] = label
-            expr.label = self.string_labels[expr.value]
-        elif isinstance(expr, ast.BinaryOp):
-            self._collect_strings_expr(expr.left)
-            self._collect_strings_expr(expr.right)
-        elif isinstance(expr, ast.UnaryOp):
-            self._collect_strings_expr(expr.expr)
-        elif isinstance(expr, ast.Call):
-            for a in expr.args:
-                self._collect_strings_expr(a)
+        functions = {fn.name: fn for fn in self.prog.functions}
+        units: Dict[str, FunctionAsm] = {}
+
+        def calls(name: str) -> List[str]:
+            units[name] = self.compile_function(functions[name])
+            return units[name].calls
+
+        roots = entry_points(self.prog, keep)
+        reachable_from(roots, calls)
+        return self.link([units[fn.name] for fn in self.prog.functions if fn.name in units], roots)
+
+    def compile_function(self, fn: ast.FunctionDef) -> FunctionAsm:
+        """Generate code for a type-checked function in isolation."""
+        return self.compile_ir(lower_function(fn))
+
+    def compile_ir(self, fn: ir.Function) -> FunctionAsm:
+        """Generate code for an IR function that is not in SSA form."""
+        self.lines = []
+        self.string_labels = {}
+        self.fn_name = fn.name
+        self._collect_strings(fn)
+        self._emit_function(fn)
+        frame = self.frame
+        frame_bytes = 8 * len(frame.saved) + frame.size + (8 if frame.pointer else 0)
+        return FunctionAsm(fn.name, self.lines, list(self.string_labels), ir.callees(fn), frame_bytes)
+
+    def link(self, units: Sequence[FunctionAsm], exported: Sequence[str] = ("main",)) -> str:
+        """Join function units under one preamble with a shared string pool.
+
+        Only the strings ``units`` use are pooled; ``exported`` are the
+        symbols made visible to the linker.
+        """
+        self.lines = []
+        self._pool_strings(units)
+        self._emit_preamble(exported)
+        self.lines.extend(self._function_lines(units))
+        return "\n".join(self.lines) + "\n"
+
+    def link_object(self, units: Sequence[FunctionAsm], exported: Sequence[str] = ("main",)) -> bytes:
+        """Like :meth:`link`, but encode the code here and return a relocatable ELF object."""
+        return write_object(self.machine_code(units), exported)
+
+    def machine_code(self, units: Sequence[FunctionAsm]) -> MachineCode:
+        """Encode ``units`` and the string pool they share, ready to be written out or loaded."""
+        self._pool_strings(units)
+        text = assemble(self._function_lines(units))
+        rodata = bytearray(b"%ld\n\0")
+        labels = {".LC_fmt_int": 0}
+        for value, label in self.string_labels.items():
+            labels[label] = len(rodata)
+            rodata += value.encode() + b"\0"
+        return MachineCode(text, bytes(rodata), labels, [unit.name for unit in units])
+
+    def _pool_strings(self, units: Sequence[FunctionAsm]) -> None:
+        self.string_labels = {}
+        for unit in units:
+            for value in unit.strings:
+                if value not in self.string_labels:
+                    self.string_labels[value] = f".Lstr{len(self.string_labels)}"
+
+    def _function_lines(self, units: Sequence[FunctionAsm]) -> List[str]:
+        """The units' code, with string references renumbered into the pool."""
+        lines: List[str] = []
+        for unit in units:
+            labels = [self.string_labels[value] for value in unit.strings]
+            if all(label == f".Lstr{k}" for k, label in enumerate(labels)):
+                lines.extend(unit.lines)
+            else:
+                lines.extend(_relabel_strings(unit.lines, labels))
+        return lines
+
+    def _collect_strings(self, fn: ir.Function) -> None:
+        for block in fn.blocks:
+            for instr in block.instrs:
+                for value in instr.uses():
+                    if isinstance(value, ir.Str) and value.value not in self.string_labels:
+                        self.string_labels[value.value] = f".Lstr{len(self.string_labels)}"
 
     def _emit(self, line: str) -> None:
         self.lines.append(line)
 
-    def _emit_preamble(self) -> None:
+    def _emit_preamble(self, exported: Sequence[str]) -> None:
         self._emit(".intel_syntax noprefix")
         self._emit(".section .rodata")
         self._emit(".LC_fmt_int:")
@@ -74,225 +196,345 @@ class X86Codegen:
             escaped = val.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\t", "\\t")
             self._emit(f"{label}:")
             self._emit(f'    .asciz "{escaped}"')
+        self._emit('.section .note.GNU-stack,"",@progbits')
         self._emit(".text")
-        self._emit(".globl main")
-        self._emit("extern printf")
-        self._emit("extern puts")
+        for name in exported:
+            self._emit(f".globl {name}")
 
-    def _emit_function(self, fn: ast.FunctionDef) -> None:
+    def _emit_function(self, fn: ir.Function) -> None:
         self._emit(f"{fn.name}:")
-        self._emit("    push rbp")
-        self._emit("    mov rbp, rsp")
-        env, frame_size = self._layout_frame(fn)
-        if frame_size:
-            self._emit(f"    sub rsp, {frame_size}")
-        # store params
+        self.frame = self._layout_frame(fn)
+        self.stack_params = max(0, len(fn.params) - len(self.param_regs))
+        if self.frame.pointer:
+            self._emit("    push rbp")
+            self._emit("    mov rbp, rsp")
+        for reg in self.frame.saved:
+            self._emit(f"    push {reg}")
+        if self.frame.size:
+            self._emit(f"    sub rsp, {self.frame.size}")
+        # store params; the seventh onwards were passed on the stack
         for idx, param in enumerate(fn.params):
+            loc = self.locations[param.id]
             if idx < len(self.param_regs):
-                reg = self.param_regs[idx]
-                off = env[param.name]
-                self._emit(f"    mov [rbp-{off}], {reg}")
-        for stmt in fn.body.statements:
-            self._emit_stmt(stmt, env)
-        # implicit return 0
-        self._emit("    mov rax, 0")
-        self._emit("    leave")
-        self._emit("    ret")
-
-    def _layout_frame(self, fn: ast.FunctionDef) -> (Dict[str, int], int):
-        names: List[str] = []
-        for p in fn.params:
-            names.append(p.name)
-        names.extend(self._collect_locals(fn.body))
-        env: Dict[str, int] = {}
-        offset = 0
-        for name in names:
-            if name in env:
-                continue
-            offset += 8
-            env[name] = offset
-        frame_size = ((offset + 15) // 16) * 16
-        return env, frame_size
-
-    def _collect_locals(self, block: ast.Block) -> List[str]:
-        names: List[str] = []
-        for stmt in block.statements:
-            if isinstance(stmt, ast.LetStmt):
-                names.append(stmt.name)
-            elif isinstance(stmt, ast.IfStmt):
-                names.extend(self._collect_locals(stmt.then_block))
-                if stmt.else_block:
-                    names.extend(self._collect_locals(stmt.else_block))
-            elif isinstance(stmt, ast.WhileStmt):
-                names.extend(self._collect_locals(stmt.body))
-        return names
-
-    def _emit_stmt(self, stmt: ast.Stmt, env: Dict[str, int]) -> None:
-        if isinstance(stmt, ast.LetStmt):
-            self._emit_expr(stmt.expr, env)
-            off = env[stmt.name]
-            self._emit(f"    mov [rbp-{off}], rax")
+                self._emit(f"    mov {loc}, {self.param_regs[idx]}")
+            elif _is_register(loc):
+                self._emit(f"    mov {loc}, {self._stack_arg(idx - len(self.param_regs))}")
+            else:
+                self._emit(f"    mov rax, {self._stack_arg(idx - len(self.param_regs))}")
+                self._emit(f"    mov {loc}, rax")
+        self.fused = _fusable_compares(fn)
+        targets = {label for block in fn.blocks for label in block.successors()}
+        for idx, block in enumerate(fn.blocks):
+            if block.label in targets:
+                self._emit(f"{self._label(block.label)}:")
+            following = fn.blocks[idx + 1].label if idx + 1 < len(fn.blocks) else None
+            for instr in block.instrs:
+                self._select(instr, following)
+
+    def _emit_epilogue(self, tail_target: Optional[str] = None) -> None:
+        """Tear down the frame, then return or, given ``tail_target``, jump there instead."""
+        saved = self.frame.saved
+        if not self.frame.pointer:
+            for reg in reversed(saved):
+                self._emit(f"    pop {reg}")
+        elif saved:
+            self._emit(f"    lea rsp, [rbp-{8 * len(saved)}]")
+            for reg in reversed(saved):
+                self._emit(f"    pop {reg}")
+            self._emit("    pop rbp")
+        else:
+            self._emit("    leave")
+        self._emit(f"    jmp {tail_target}" if tail_target else "    ret")
+
+    def _stack_arg(self, idx: int) -> str:
+        """Address of the ``idx``-th argument passed on the stack, valid outside calls."""
+        if self.frame.pointer:
+            return f"qword ptr [rbp+{16 + 8 * idx}]"
+        return f"qword ptr [rsp+{8 + 8 * len(self.frame.saved) + 8 * idx}]"
+
+    def _layout_frame(self, fn: ir.Function) -> Frame:
+        """Fill in every vreg's location and decide the function's frame.
+
+        Spill slots sit below the saved registers. With a frame pointer,
+        the two together are padded to keep rsp 16-byte aligned at calls. A
+        leaf function (one that calls nothing) may also allocate the
+        argument registers its parameters don't arrive in, and if its slots
+        fit in the red zone it has no frame pointer and never moves rsp past
+        its pushes, so the slots are addressed below rsp.
+        """
+        leaf = self.leaf_functions and is_leaf(fn)
+        spare = [reg for reg in self.param_regs[len(fn.params) :] if reg not in SCRATCH_REGS] if leaf else []
+        allocation = allocate(fn, use_registers=self.allocate_registers, spare=spare)
+        saved = allocation.callee_saved
+        if leaf and 8 * allocation.spill_slots <= RED_ZONE:
+            self.locations = {
+                vreg_id: interval.register or f"qword ptr [rsp-{8 * (interval.slot + 1)}]"
+                for vreg_id, interval in allocation.intervals.items()
+            }
+            return Frame(saved, 0, pointer=False)
+        base = 8 * len(saved)
+        self.locations = {
+            vreg_id: interval.register or f"qword ptr [rbp-{base + 8 * (interval.slot + 1)}]"
+            for vreg_id, interval in allocation.intervals.items()
+        }
+        used = base + 8 * allocation.spill_slots
+        return Frame(saved, ((used + 15) // 16) * 16 - base)
+
+    def _label(self, block_label: str) -> str:
+        return f".L{block_label}_{self.fn_name}"
+
+    def _operand(self, value: ir.Operand) -> Optional[str]:
+        """``value`` as an instruction operand, or None if it must be loaded into a register first."""
+        if isinstance(value, ir.VReg):
+            return self.locations[value.id]
+        if isinstance(value, ir.Imm) and -(1 << 31) <= value.value < (1 << 31):
+            return str(value.value)
+        return None
+
+    def _load(self, reg: str, value: ir.Operand) -> None:
+        if isinstance(value, ir.Str):
+            self._emit(f"    lea {reg}, [rip + {self.string_labels[value.value]}]")
+        elif isinstance(value, ir.Imm):
+            self._emit(f"    mov {reg}, {value.value}")
+        elif self.locations[value.id] != reg:
+            self._emit(f"    mov {reg}, {self.locations[value.id]}")
+
+    def _source(self, value: ir.Operand, scratch: str, memory_ok: bool = True) -> str:
+        """``value`` as a source operand, loading it into ``scratch`` when it can't be used as is."""
+        operand = self._operand(value)
+        if operand is None or (not memory_ok and _is_memory(operand)):
+            self._load(scratch, value)
+            return scratch
+        return operand
+
+    def _place(self, value: ir.Operand, scratch: str) -> str:
+        """``value`` in a register or slot, loading it into ``scratch`` if it is a constant."""
+        operand = self._operand(value)
+        if operand is None or not (_is_register(operand) or _is_memory(operand)):
+            self._load(scratch, value)
+            return scratch
+        return operand
+
+    def _store(self, dst: ir.VReg, reg: str) -> None:
+        loc = self.locations[dst.id]
+        if loc != reg:
+            self._emit(f"    mov {loc}, {reg}")
+
+    def _select(self, instr: ir.Instr, following: Optional[str]) -> None:
+        if isinstance(instr, ir.Copy):
+            self._select_copy(instr)
+        elif isinstance(instr, ir.Unary):
+            self._select_unary(instr)
+        elif isinstance(instr, ir.Binary):
+            self._select_binary(instr)
+        elif isinstance(instr, ir.Call):
+            self._select_call(instr)
+        elif isinstance(instr, ir.Print):
+            self._select_print(instr)
+        elif isinstance(instr, ir.Jump):
+            if instr.label != following:
+                self._emit(f"    jmp {self._label(instr.label)}")
+        elif isinstance(instr, ir.Branch):
+            self._select_branch(instr, following)
+        elif isinstance(instr, ir.TailCall):
+            self._select_tail_call(instr)
+        elif isinstance(instr, ir.Return):
+            self._load("rax", instr.value)
+            self._emit_epilogue()
+        else:
+            raise ValueError(f"Cannot select {instr}")
+
+    def _select_copy(self, instr: ir.Copy) -> None:
+        loc = self.locations[instr.target.id]
+        if _is_register(loc):
+            self._load(loc, instr.src)
             return
-        if isinstance(stmt, ast.AssignStmt):
-            self._emit_expr(stmt.expr, env)
-            off = env[stmt.name]
-            self._emit(f"    mov [rbp-{off}], rax")
+        src = self._operand(instr.src)
+        if src is None or _is_memory(src):
+            if src == loc:
+                return
+            self._load("rax", instr.src)
+            src = "rax"
+        self._emit(f"    mov {loc}, {src}")
+
+    def _select_unary(self, instr: ir.Unary) -> None:
+        loc = self.locations[instr.target.id]
+        work = loc if _is_register(loc) else "rax"
+        if instr.op == "neg":
+            self._load(work, instr.src)
+            self._emit(f"    neg {work}")
+        elif instr.op == "not":
+            self._emit(f"    cmp {self._place(instr.src, 'rax')}, 0")
+            self._emit("    sete al")
+            self._emit(f"    movzx {work}, al")
+        else:
+            raise ValueError(f"Unknown unary op {instr.op}")
+        self._store(instr.target, work)
+
+    def _select_binary(self, instr: ir.Binary) -> None:
+        op, lhs, rhs = instr.op, instr.lhs, instr.rhs
+        loc = self.locations[instr.target.id]
+        if op == "mulhs":
+            # One-operand imul leaves the high half of rax * operand in rdx.
+            self._load("rax", rhs)
+            self._emit(f"    imul {self._place(lhs, 'rcx')}")
+            self._store(instr.target, "rdx")
             return
-        if isinstance(stmt, ast.ExprStmt):
-            self._emit_expr(stmt.expr, env)
+        if op == "div":
+            self._load("rax", lhs)
+            divisor = self._place(rhs, "rcx")
+            self._emit("    cqo")
+            self._emit(f"    idiv {divisor}")
+            self._store(instr.target, "rax")
             return
-        if isinstance(stmt, ast.ReturnStmt):
-            if stmt.expr:
-                self._emit_expr(stmt.expr, env)
-            else:
-                self._emit("    mov rax, 0")
-            self._emit("    leave")
-            self._emit("    ret")
+        if op in _SET_INSTR:
+            if self.fused.get(instr.target.id) is instr:
+                return
+            op = self._emit_compare(op, lhs, rhs)
+            self._emit(f"    {_SET_INSTR[op]} al")
+            work = loc if _is_register(loc) else "rax"
+            self._emit(f"    movzx {work}, al")
+            self._store(instr.target, work)
             return
-        if isinstance(stmt, ast.IfStmt):
-            else_label = self._new_label("else")
-            end_label = self._new_label("endif")
-            self._emit_expr(stmt.cond, env)
-            self._emit("    cmp rax, 0")
-            self._emit(f"    je {else_label}")
-            self._emit_block(stmt.then_block, env)
-            self._emit(f"    jmp {end_label}")
-            self._emit(f"{else_label}:")
-            if stmt.else_block:
-                self._emit_block(stmt.else_block, env)
-            self._emit(f"{end_label}:")
+        mnemonic = _ARITH_INSTR[op]
+        if op in _COMMUTATIVE and (self._operand(rhs) == loc or isinstance(lhs, ir.Imm)):
+            lhs, rhs = rhs, lhs
+        if op == "mul" and isinstance(rhs, ir.Imm) and rhs.value in LEA_MULTIPLIERS:
+            work = loc if _is_register(loc) else "rax"
+            src = self._source(lhs, work, memory_ok=False)
+            self._emit(f"    lea {work}, [{src}+{src}*{rhs.value - 1}]")
+            self._store(instr.target, work)
             return
-        if isinstance(stmt, ast.WhileStmt):
-            start_label = self._new_label("while")
-            end_label = self._new_label("endwhile")
-            self._emit(f"{start_label}:")
-            self._emit_expr(stmt.cond, env)
-            self._emit("    cmp rax, 0")
-            self._emit(f"    je {end_label}")
-            self._emit_block(stmt.body, env)
-            self._emit(f"    jmp {start_label}")
-            self._emit(f"{end_label}:")
+        if _is_memory(loc) and self._operand(lhs) == loc and op != "mul":
+            # Update a slot in place: x = x + 1 becomes add x, 1.
+            self._emit(f"    {mnemonic} {loc}, {self._source(rhs, 'rcx', memory_ok=False)}")
             return
+        work = loc if _is_register(loc) and self._operand(rhs) != loc else "rax"
+        self._load(work, lhs)
+        right = self._source(rhs, "rcx")
+        if op == "mul" and not (_is_register(right) or _is_memory(right)):
+            self._emit(f"    imul {work}, {work}, {right}")
+        else:
+            self._emit(f"    {mnemonic} {work}, {right}")
+        self._store(instr.target, work)
 
-    def _emit_block(self, block: ast.Block, env: Dict[str, int]) -> None:
-        for stmt in block.statements:
-            self._emit_stmt(stmt, env)
-
-    def _emit_expr(self, expr: ast.Expr, env: Dict[str, int]) -> None:
-        if isinstance(expr, ast.IntLiteral):
-            self._emit(f"    mov rax, {expr.value}")
-        elif isinstance(expr, ast.BoolLiteral):
-            self._emit(f"    mov rax, {1 if expr.value else 0}")
-        elif isinstance(expr, ast.StringLiteral):
-            label = expr.label or self.string_labels.get(expr.value, "")
-            self._emit(f"    lea rax, [rel {label}]")
-        elif isinstance(expr, ast.VarRef):
-            off = env[expr.name]
-            self._emit(f"    mov rax, [rbp-{off}]")
-        elif isinstance(expr, ast.UnaryOp):
-            self._emit_expr(expr.expr, env)
-            if expr.op == "-":
-                self._emit("    neg rax")
-            elif expr.op == "!":
-                self._emit("    cmp rax, 0")
-                self._emit("    sete al")
-                self._emit("    movzx rax, al")
-        elif isinstance(expr, ast.BinaryOp):
-            if expr.op in {"&&", "||"}:
-                self._emit_logical(expr, env)
-            else:
-                self._emit_expr(expr.left, env)
-                self._emit("    push rax")
-                self._emit_expr(expr.right, env)
-                self._emit("    pop rbx")
-                self._emit_binary(expr.op)
-        elif isinstance(expr, ast.Call):
-            self._emit_call(expr, env)
+    def _select_call(self, instr: ir.Call) -> None:
+        self._emit_call(instr.callee, instr.args)
+        self._store(instr.target, "rax")
+
+    def _select_tail_call(self, instr: ir.TailCall) -> None:
+        """Jump to the callee with this function's return address still on the stack.
+
+        Its stack arguments overwrite the ones this function was passed,
+        so there must be at most as many; otherwise it is an ordinary call
+        followed by a return.
+        """
+        stack_args = instr.args[len(self.param_regs) :]
+        if len(stack_args) > self.stack_params:
+            self._emit_call(instr.callee, instr.args)
+            self._emit_epilogue()
+            return
+        for idx, arg in enumerate(stack_args):
+            self._emit(f"    mov {self._stack_arg(idx)}, {self._source(arg, 'rax', memory_ok=False)}")
+        # The frame is still intact here, so every argument can be read
+        # from its location before the epilogue restores registers.
+        for reg, arg in zip(self.param_regs, instr.args):
+            self._load(reg, arg)
+        self._emit_epilogue(tail_target=instr.callee)
+
+    def _emit_call(self, callee: str, args: List[ir.Operand]) -> None:
+        # Stack arguments are pushed last to first, padded so rsp is 16-byte
+        # aligned at the call; no vreg lives in an argument register, so the
+        # register arguments can be written in any order.
+        stack_args = args[len(self.param_regs) :]
+        pad = len(stack_args) % 2
+        if pad:
+            self._emit("    sub rsp, 8")
+        for arg in reversed(stack_args):
+            self._emit(f"    push {self._source(arg, 'rax')}")
+        for reg, arg in zip(self.param_regs, args):
+            self._load(reg, arg)
+        self._emit(f"    call {callee}")
+        if stack_args:
+            self._emit(f"    add rsp, {8 * (len(stack_args) + pad)}")
+
+    def _select_print(self, instr: ir.Print) -> None:
+        if instr.kind == "string":
+            self._load("rdi", instr.src)
+            self._emit("    call puts")
+            return
+        self._load("rsi", instr.src)
+        self._emit("    lea rdi, [rip + .LC_fmt_int]")
+        self._emit("    xor eax, eax")
+        self._emit("    call printf")
+
+    def _emit_compare(self, op: str, lhs: ir.Operand, rhs: ir.Operand) -> str:
+        """Emit ``cmp`` for ``lhs op rhs``; return the comparison the flags now answer.
+
+        A constant left operand is swapped to the right, mirroring ``op``.
+        """
+        if isinstance(lhs, ir.Imm) and not isinstance(rhs, ir.Imm):
+            lhs, rhs, op = rhs, lhs, _MIRRORED[op]
+        left = self._place(lhs, "rax")
+        right = self._source(rhs, "rcx", memory_ok=not _is_memory(left))
+        self._emit(f"    cmp {left}, {right}")
+        return op
+
+    def _select_branch(self, instr: ir.Branch, following: Optional[str]) -> None:
+        cond = instr.cond
+        if isinstance(cond, ir.Imm):
+            taken = instr.if_true if cond.value else instr.if_false
+            if taken != following:
+                self._emit(f"    jmp {self._label(taken)}")
+            return
+        compare = self.fused.get(cond.id) if isinstance(cond, ir.VReg) else None
+        if compare is not None:
+            op = self._emit_compare(compare.op, compare.lhs, compare.rhs)
         else:
-            raise ValueError(f"Unhandled expr {expr}")
-
-    def _emit_binary(self, op: str) -> None:
-        if op == "+":
-            self._emit("    add rax, rbx")
-        elif op == "-":
-            self._emit("    sub rbx, rax")
-            self._emit("    mov rax, rbx")
-        elif op == "*":
-            self._emit("    imul rax, rbx")
-        elif op == "/":
-            self._emit("    mov rdx, 0")
-            self._emit("    mov rcx, rax")
-            self._emit("    mov rax, rbx")
-            self._emit("    idiv rcx")
-        elif op in {"==", "!=", "<", ">", "<=", ">="}:
-            self._emit("    cmp rbx, rax")
-            set_instr = {
-                "==": "sete",
-                "!=": "setne",
-                "<": "setl",
-                "<=": "setle",
-                ">": "setg",
-                ">=": "setge",
-            }[op]
-            self._emit(f"    {set_instr} al")
-            self._emit("    movzx rax, al")
+            value = self._place(cond, "rax")
+            self._emit(f"    test {value}, {value}" if _is_register(value) else f"    cmp {value}, 0")
+            op = "ne"
+        if instr.if_true == following:
+            self._emit(f"    {_JUMP_INSTR[_NEGATED[op]]} {self._label(instr.if_false)}")
         else:
-            raise ValueError(f"Unknown binary op {op}")
-
-    def _emit_logical(self, expr: ast.BinaryOp, env: Dict[str, int]) -> None:
-        end = self._new_label("logic_end")
-        short = self._new_label("logic_short")
-        if expr.op == "&&":
-            self._emit_expr(expr.left, env)
-            self._emit("    cmp rax, 0")
-            self._emit(f"    je {short}")
-            self._emit_expr(expr.right, env)
-            self._emit("    cmp rax, 0")
-            self._emit("    setne al")
-            self._emit("    movzx rax, al")
-            self._emit(f"    jmp {end}")
-            self._emit(f"{short}:")
-            self._emit("    mov rax, 0")
-        else:  # ||
-            self._emit_expr(expr.left, env)
-            self._emit("    cmp rax, 0")
-            self._emit(f"    jne {short}")
-            self._emit_expr(expr.right, env)
-            self._emit("    cmp rax, 0")
-            self._emit("    setne al")
-            self._emit("    movzx rax, al")
-            self._emit(f"    jmp {end}")
-            self._emit(f"{short}:")
-            self._emit("    mov rax, 1")
-        self._emit(f"{end}:")
-
-    def _emit_call(self, call: ast.Call, env: Dict[str, int]) -> None:
-        if call.callee == "print":
-            arg = call.args[0]
-            self._emit_expr(arg, env)
-            if getattr(arg, "inferred_type", None) == "string":
-                self._emit("    mov rdi, rax")
-                self._emit("    call puts")
-                self._emit("    mov rax, 0")
-            else:
-                self._emit("    mov rsi, rax")
-                self._emit("    lea rdi, [rel .LC_fmt_int]")
-                self._emit("    xor eax, eax")
-                self._emit("    call printf")
-                self._emit("    mov rax, 0")
-            return
+            self._emit(f"    {_JUMP_INSTR[op]} {self._label(instr.if_true)}")
+            if instr.if_false != following:
+                self._emit(f"    jmp {self._label(instr.if_false)}")
 
-        for idx, arg in enumerate(call.args):
-            self._emit_expr(arg, env)
-            if idx < len(self.param_regs):
-                reg = self.param_regs[idx]
-                self._emit(f"    mov {reg}, rax")
-        self._emit(f"    call {call.callee}")
-
-    def _new_label(self, prefix: str) -> str:
-        lbl = f".L{prefix}{self.label_counter}"
-        self.label_counter += 1
-        return lbl
+
+def is_leaf(fn: ir.Function) -> bool:
+    """True if ``fn`` calls nothing, neither other functions nor the C library (``print``)."""
+    return not any(
+        isinstance(instr, (ir.Call, ir.TailCall, ir.Print)) for block in fn.blocks for instr in block.instrs
+    )
+
+
+def _fusable_compares(fn: ir.Function) -> Dict[int, ir.Binary]:
+    """Comparisons whose only use is the branch right after them, by result vreg id.
+
+    Those compare straight into the branch's flags instead of
+    materializing 0 or 1 first.
+    """
+    uses = Counter(
+        value.id for block in fn.blocks for instr in block.instrs for value in instr.uses() if isinstance(value, ir.VReg)
+    )
+    fused: Dict[int, ir.Binary] = {}
+    for block in fn.blocks:
+        term = block.terminator
+        if not isinstance(term, ir.Branch) or len(block.instrs) < 2:
+            continue
+        compare = block.instrs[-2]
+        if isinstance(compare, ir.Binary) and compare.op in _JUMP_INSTR and compare.target is term.cond:
+            if uses[compare.target.id] == 1:
+                fused[compare.target.id] = compare
+    return fused
+
+
+def _relabel_strings(lines: List[str], labels: List[str]) -> List[str]:
+    def relabel(m: re.Match) -> str:
+        return labels[int(m.group(1))]
+
+    return [_STRING_REF.sub(relabel, line) if ".Lstr" in line else line for line in lines]
 
 
 def generate_x86_64(prog: ast.Program) -> str:
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from . import ast
+from .callgraph import CallGraph
+from .optimize import INT_MAX, INT_MIN, binary_value, const_expr, is_const, wrap_int
+from .typesys import FunctionSig
+from .walk import iter_block_exprs
+
+# Statements (and calls and loop tests) one call site may run at -O2 before
+# its evaluation is abandoned, and how deeply calls may nest meanwhile.
+DEFAULT_CTFE_STEPS = 20_000
+MAX_CTFE_DEPTH = 64
+
+Value = Union[int, bool]
+
+# The only types a pure function's parameters and result may have.
+_VALUE_TYPES = {"int": int, "bool": bool}
+
+
+class _Abort(Exception):
+    """Evaluation gave up: the budget ran out, or the code would trap or isn't well typed."""
+
+
+def pure_functions(prog: ast.Program, sigs: Dict[str, FunctionSig], graph: CallGraph) -> Set[str]:
+    """Functions whose result depends only on their arguments, with no other effect.
+
+    A pure function takes and returns only ints and bools, uses no strings,
+    doesn't print and calls only pure functions. Components of the call
+    graph are visited callees first, and a recursive component is pure if
+    all of its members are, given that the others are.
+    """
+    functions = {fn.name: fn for fn in prog.functions}
+    pure: Set[str] = set()
+    for component in graph.sccs():
+        allowed = pure | set(component)
+        if all(_pure_body(functions[name], sigs[name], allowed) for name in component):
+            pure.update(component)
+    return pure
+
+
+def _pure_body(fn: ast.FunctionDef, sig: FunctionSig, allowed: Set[str]) -> bool:
+    if sig.ret not in _VALUE_TYPES or any(param not in _VALUE_TYPES for param in sig.params):
+        return False
+    for expr in iter_block_exprs(fn.body):
+        if isinstance(expr, ast.StringLiteral):
+            return False
+        if isinstance(expr, ast.Call) and expr.callee not in allowed:
+            return False
+    return True
+
+
+class CallEvaluator:
+    """Evaluates calls to pure functions with constant arguments at compile time.
+
+    :meth:`fold_call` is the ``fold_call`` hook of the AST passes. Each call
+    site gets a fresh budget of ``steps``; a call that runs out of it, nests
+    deeper than ``MAX_CTFE_DEPTH``, or would trap at runtime is left to run
+    at runtime. Bodies are looked up in ``functions`` on every call, so they
+    may be replaced (once checked and optimized) while the evaluator is in
+    use; optimizing a function doesn't change what it computes. Results are
+    remembered per callee and arguments.
+    """
+
+    def __init__(
+        self, functions: Dict[str, ast.FunctionDef], sigs: Dict[str, FunctionSig], pure: Set[str], steps: int
+    ):
+        self.functions = functions
+        self.sigs = sigs
+        self.pure = pure
+        self.budget = steps
+        self.steps = 0
+        self.results: Dict[Tuple[str, Tuple[Value, ...]], Optional[Value]] = {}
+
+    def fold_call(self, call: ast.Call) -> ast.Expr:
+        if call.callee not in self.pure or not all(is_const(arg) for arg in call.args):
+            return call
+        value = self.evaluate(call.callee, tuple(arg.value for arg in call.args))
+        if value is None:
+            return call
+        return const_expr(value)
+
+    def evaluate(self, name: str, args: Tuple[Value, ...]) -> Optional[Value]:
+        """The result of calling ``name`` on ``args``, or None if it can't be computed within the budget."""
+        key = (name, args)
+        if key not in self.results:
+            self.steps = self.budget
+            try:
+                value: Optional[Value] = self._call(name, list(args), 0)
+            except (_Abort, RecursionError):
+                value = None
+            self.results[key] = value
+        return self.results[key]
+
+    def _tick(self) -> None:
+        self.steps -= 1
+        if self.steps < 0:
+            raise _Abort
+
+    def _call(self, name: str, args: List[Value], depth: int) -> Value:
+        if name not in self.pure or depth > MAX_CTFE_DEPTH:
+            raise _Abort
+        self._tick()
+        fn, sig = self.functions[name], self.sigs[name]
+        if len(args) != len(sig.params):
+            raise _Abort
+        if any(type(arg) is not _VALUE_TYPES[param] for arg, param in zip(args, sig.params)):
+            raise _Abort
+        value = self._run(fn.body.statements, {param.name: arg for param, arg in zip(fn.params, args)}, depth)
+        if value is None or type(value) is not _VALUE_TYPES[sig.ret]:
+            raise _Abort
+        return value
+
+    def _run(self, stmts: List[ast.Stmt], env: Dict[str, Value], depth: int) -> Optional[Value]:
+        """Run ``stmts``; the value returned, or None if control falls off the end."""
+        for stmt in stmts:
+            self._tick()
+            kind = type(stmt)
+            if kind is ast.AssignStmt or kind is ast.LetStmt:
+                env[stmt.name] = self._eval(stmt.expr, env, depth)
+            elif kind is ast.WhileStmt:
+                while self._test(stmt.cond, env, depth):
+                    self._tick()
+                    value = self._run(stmt.body.statements, env, depth)
+                    if value is not None:
+                        return value
+            elif kind is ast.IfStmt:
+                taken = stmt.then_block if self._test(stmt.cond, env, depth) else stmt.else_block
+                if taken is not None:
+                    value = self._run(taken.statements, env, depth)
+                    if value is not None:
+                        return value
+            elif kind is ast.ReturnStmt:
+                if stmt.expr is None:
+                    raise _Abort
+                return self._eval(stmt.expr, env, depth)
+            elif kind is ast.ExprStmt:
+                self._eval(stmt.expr, env, depth)
+            else:
+                raise _Abort
+        return None
+
+    def _test(self, expr: ast.Expr, env: Dict[str, Value], depth: int) -> bool:
+        value = self._eval(expr, env, depth)
+        if type(value) is not bool:
+            raise _Abort
+        return value
+
+    def _eval(self, expr: ast.Expr, env: Dict[str, Value], depth: int) -> Value:
+        # Dispatch on the exact node class; this is the interpreter's hot path.
+        kind = type(expr)
+        if kind is ast.VarRef:
+            if expr.name not in env:
+                raise _Abort
+            return env[expr.name]
+        if kind is ast.IntLiteral:
+            if not INT_MIN <= expr.value <= INT_MAX:
+                raise _Abort
+            return expr.value
+        if kind is ast.BinaryOp:
+            op = expr.op
+            if op == "&&" or op == "||":
+                left = self._test(expr.left, env, depth)
+                return left if left == (op == "||") else self._test(expr.right, env, depth)
+            left, right = self._eval(expr.left, env, depth), self._eval(expr.right, env, depth)
+            if type(left) is not type(right) or (type(left) is bool and op != "==" and op != "!="):
+                raise _Abort
+            value = binary_value(op, left, right)
+            if value is None:
+                raise _Abort
+            return value
+        if kind is ast.BoolLiteral:
+            return expr.value
+        if kind is ast.UnaryOp:
+            inner = self._eval(expr.expr, env, depth)
+            if expr.op == "-" and type(inner) is int:
+                return wrap_int(-inner)
+            if expr.op == "!" and type(inner) is bool:
+                return not inner
+            raise _Abort
+        if kind is ast.Call:
+            return self._call(expr.callee, [self._eval(arg, env, depth) for arg in expr.args], depth + 1)
+        raise _Abort
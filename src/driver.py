@@ -0,0 +1,434 @@
+from __future__ import annotations
+
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from . import ast, ir
+from .cache import CacheEntry, CacheStats, FunctionCache
+from .callgraph import build_call_graph, entry_points, function_size, reachable_from
+from .codegen import FunctionAsm, X86Codegen
+from .ctfe import DEFAULT_CTFE_STEPS, CallEvaluator, pure_functions
+from .encoder import MachineCode
+from .errors import CompileError
+from .instrument import CompileStats, Instrumentation, phase
+from .inline import DEFAULT_INLINE_GROWTH, DEFAULT_INLINE_THRESHOLD, InlinePlan, inline_calls, plan_inlining
+from .ir import format_function
+from .iropt import optimize_ir
+from .lexer import tokenize
+from .loopopt import DEFAULT_UNROLL
+from .lower import lower_function
+from .optimize import optimize_function
+from .parser import parse_tokens
+from .peephole import PeepholeStats, run_peephole
+from .tailcall import eliminate_tail_recursion, mark_tail_calls
+from .typesys import TypeChecker
+from .valnum import ValueNumberingStats
+from .verify import verify
+
+
+EMIT_KINDS = ("asm", "ir", "obj")
+# Not a file: compile_program returns the encoded MachineCode, for src/jit.py to load.
+EMIT_MACHINE_CODE = "machine"
+
+
+@dataclass
+class CompileOptions:
+    target: str = "x86_64"
+    opt_level: int = 0
+    emit: str = "asm"  # one of EMIT_KINDS, or EMIT_MACHINE_CODE
+    verify_ir: bool = False
+    # None picks the level's default: inlining is on from -O2.
+    inline_threshold: Optional[int] = None
+    inline_growth: int = DEFAULT_INLINE_GROWTH
+    # From -O1: self tail calls become loops, other tail calls jumps.
+    tail_calls: bool = True
+    # None picks the level's default: loops are unrolled from -O2.
+    unroll: Optional[int] = None
+    # From -O2, loop-invariant computations move out of loops.
+    hoist_invariants: bool = True
+    # One of VALUE_NUMBERING_MODES (src/iropt.py); "global" needs -O2's SSA form.
+    value_numbering: str = "local"
+    # From -O1, functions that call nothing skip the frame pointer and use free argument registers.
+    leaf_functions: bool = True
+    # None picks the level's default: calls to pure functions are evaluated from -O2.
+    ctfe_steps: Optional[int] = None
+    # Functions emitted and exported even if nothing calls them, besides main.
+    keep: Tuple[str, ...] = ()
+
+    def inline_limit(self) -> int:
+        """Largest callee to inline; 0 disables inlining."""
+        if self.inline_threshold is not None:
+            return self.inline_threshold
+        return DEFAULT_INLINE_THRESHOLD if self.opt_level >= 2 else 0
+
+    def unroll_factor(self) -> int:
+        """How many copies of a counted loop's body to run per test; 1 disables unrolling."""
+        if self.unroll is not None:
+            return max(self.unroll, 1)
+        return DEFAULT_UNROLL if self.opt_level >= 2 else 1
+
+    def ctfe_budget(self) -> int:
+        """Steps a call evaluated at compile time may take; 0 disables compile-time evaluation."""
+        if self.opt_level < 1:
+            return 0  # calls are folded by the AST passes, which -O0 doesn't run
+        if self.ctfe_steps is not None:
+            return max(self.ctfe_steps, 0)
+        return DEFAULT_CTFE_STEPS if self.opt_level >= 2 else 0
+
+    def tail_calls_enabled(self) -> bool:
+        return self.tail_calls and self.opt_level >= 1
+
+    def leaf_functions_enabled(self) -> bool:
+        return self.leaf_functions and self.opt_level >= 1
+
+    def cache_tag(self) -> str:
+        """Options that change generated code, folded into cache keys."""
+        tag = f"target={self.target};O{self.opt_level}"
+        if self.inline_limit() > 0:
+            tag += f";inline={self.inline_limit()},{self.inline_growth}"
+        if self.ctfe_budget() > 0:
+            tag += f";ctfe={self.ctfe_budget()}"
+        if self.unroll_factor() > 1:
+            tag += f";unroll={self.unroll_factor()}"
+        if self.opt_level >= 2 and not self.hoist_invariants:
+            tag += ";no-licm"
+        if self.opt_level >= 1 and not self.tail_calls:
+            tag += ";no-tail-calls"
+        if self.opt_level >= 1 and self.value_numbering != "local":
+            tag += f";value-numbering={self.value_numbering}"
+        if self.opt_level >= 1 and not self.leaf_functions:
+            tag += ";no-leaf-functions"
+        return tag
+
+
+def compile_source(
+    source: str,
+    options: Optional[CompileOptions] = None,
+    cache: Optional[FunctionCache] = None,
+    peephole_stats: Optional[PeepholeStats] = None,
+    value_numbering_stats: Optional[ValueNumberingStats] = None,
+    instrument: Optional[Instrumentation] = None,
+) -> Union[str, bytes, MachineCode]:
+    """Compile Nova source text to assembly (or an IR dump or object), reusing cached functions when given a cache.
+
+    With ``instrument``, each phase is timed and reported to its observers,
+    and the sizes of the program and its output are added to its stats.
+    """
+    options = options or CompileOptions()
+    if options.target != "x86_64":
+        raise CompileError("ARM64 backend not implemented yet")
+    with phase(instrument, "tokenize"):
+        tokens = tokenize(source)
+    with phase(instrument, "parse"):
+        prog = parse_tokens(tokens)
+    if instrument is not None:
+        instrument.stats.tokens += len(tokens)
+    return compile_program(prog, source, options, cache, peephole_stats, value_numbering_stats, instrument)
+
+
+def compile_program(
+    prog: ast.Program,
+    source: str,
+    options: CompileOptions,
+    cache: Optional[FunctionCache] = None,
+    peephole_stats: Optional[PeepholeStats] = None,
+    value_numbering_stats: Optional[ValueNumberingStats] = None,
+    instrument: Optional[Instrumentation] = None,
+) -> Union[str, bytes, MachineCode]:
+    """Type-check, optimize and generate each function, skipping those with a fresh cache entry.
+
+    Only ``main``, the functions in ``options.keep`` and whatever their
+    generated code still calls are emitted, so functions that are never
+    called, or whose calls were all inlined or evaluated at compile time,
+    are not generated at all (see :func:`entry_points` for programs without
+    ``main``). From -O1 the generated code goes through the peephole pass;
+    its rule counts (for the functions actually compiled) are added to
+    ``peephole_stats``, and the expressions value numbering reused to
+    ``value_numbering_stats``. With ``emit="obj"`` the code is encoded here
+    rather than by an assembler, and the result is a relocatable object;
+    with ``EMIT_MACHINE_CODE`` it is the encoded code itself.
+    ``instrument`` is as for :func:`compile_source`.
+    """
+    if instrument is not None:
+        instrument.stats.functions += len(prog.functions)
+        instrument.stats.ast_nodes += sum(1 + function_size(fn) for fn in prog.functions)
+    checker = TypeChecker(prog)
+    with phase(instrument, "typecheck"):
+        checker.check(only=())  # signatures only; bodies are checked on a miss
+    graph = build_call_graph(prog)
+    plan = plan_inlining(prog, options.inline_limit(), options.inline_growth, graph)
+    builder = _IRBuilder(prog, checker, options, plan, value_numbering_stats, instrument)
+    if options.ctfe_budget() > 0:
+        pure = pure_functions(prog, checker.funcs, graph)
+        builder.evaluator = CallEvaluator(builder.functions, checker.funcs, pure, options.ctfe_budget())
+    roots = entry_points(prog, options.keep)
+    if options.emit == "ir":
+        # IR dumps are for inspection; they are never cached.
+        live = set(reachable_from(roots, lambda name: ir.callees(builder.get(name))))
+        return "\n\n".join(format_function(builder.get(fn.name)) for fn in prog.functions if fn.name in live) + "\n"
+    codegen = X86Codegen(
+        prog, allocate_registers=options.opt_level >= 1, leaf_functions=options.leaf_functions_enabled()
+    )
+    tag = options.cache_tag()
+    index = {fn.name: idx for idx, fn in enumerate(prog.functions)}
+    units: Dict[str, FunctionAsm] = {}
+
+    def generate(name: str) -> List[str]:
+        idx = index[name]
+        fn = prog.functions[idx]
+        key = None
+        if cache is not None:
+            # With inlining or compile-time calls, a function's code also depends on what it calls.
+            deps = [builder.functions[dep] for dep in sorted(graph.reachable([name]) - {name})]
+            key = cache.key(fn, source, checker.funcs, tag, deps if plan.inline or builder.evaluator is not None else ())
+        entry = cache.load(key) if key is not None else None
+        if entry is not None:
+            if entry.typed_fn is not None:
+                entry.typed_fn.span = fn.span
+                prog.functions[idx] = entry.typed_fn
+                builder.use_typed(entry.typed_fn)
+            units[name] = entry.unit
+            return entry.unit.calls
+        ir_fn = builder.get(name)
+        with phase(instrument, "codegen", name):
+            unit = codegen.compile_ir(ir_fn)
+        if options.opt_level >= 1:
+            with phase(instrument, "peephole", name):
+                unit.lines = run_peephole(unit.lines, stats=peephole_stats)
+        if key is not None:
+            cache.store(key, CacheEntry(unit, builder.functions[name]))
+        units[name] = unit
+        return unit.calls
+
+    reachable_from(roots, generate)
+    emitted = [units[fn.name] for fn in prog.functions if fn.name in units]
+    with phase(instrument, "link"):
+        if options.emit == "obj":
+            asm = codegen.link_object(emitted, roots)
+        elif options.emit == EMIT_MACHINE_CODE:
+            asm = codegen.machine_code(emitted)
+        else:
+            asm = codegen.link(emitted, roots)
+    if instrument is not None:
+        _count_output(instrument.stats, emitted, codegen.string_labels)
+    return asm
+
+
+def _count_output(stats: CompileStats, units: Sequence[FunctionAsm], strings: Iterable[str]) -> None:
+    stats.emitted_functions += len(units)
+    for unit in units:
+        stats.instructions += sum(1 for line in unit.lines if line.startswith(" "))
+        stats.frame_bytes += unit.frame_bytes
+        stats.max_frame_bytes = max(stats.max_frame_bytes, unit.frame_bytes)
+    for value in strings:
+        stats.strings += 1
+        stats.string_bytes += len(value.encode()) + 1
+
+
+def build_ir(
+    fn: ast.FunctionDef,
+    options: CompileOptions,
+    callees: Optional[Dict[str, ir.Function]] = None,
+    value_numbering_stats: Optional[ValueNumberingStats] = None,
+    instrument: Optional[Instrumentation] = None,
+) -> ir.Function:
+    """Lower a type-checked function, inline ``callees`` and run the IR passes for the options' level.
+
+    Self tail recursion becomes a loop before the IR passes; the tail
+    calls left afterwards are marked last. With ``verify_ir``, the IR is
+    verified after lowering and inlining and after every pass.
+    """
+    with phase(instrument, "lower", fn.name):
+        ir_fn = lower_function(fn)
+    if callees:
+        with phase(instrument, "inline", fn.name):
+            if inline_calls(ir_fn, callees):
+                ir.remove_unreachable(ir_fn)
+                ir.merge_blocks(ir_fn)
+    with phase(instrument, "ir-opt", fn.name):
+        if options.tail_calls_enabled():
+            eliminate_tail_recursion(ir_fn)
+        if options.verify_ir:
+            verify(ir_fn)
+        optimize_ir(
+            ir_fn,
+            options.opt_level,
+            options.verify_ir,
+            options.value_numbering,
+            value_numbering_stats,
+            options.unroll_factor(),
+            options.hoist_invariants,
+        )
+        if options.tail_calls_enabled() and mark_tail_calls(ir_fn) and options.verify_ir:
+            verify(ir_fn)
+    return ir_fn
+
+
+class _IRBuilder:
+    """Builds each function's final IR on demand, after the IR of the callees it inlines."""
+
+    def __init__(
+        self,
+        prog: ast.Program,
+        checker: TypeChecker,
+        options: CompileOptions,
+        plan: InlinePlan,
+        value_numbering_stats: Optional[ValueNumberingStats] = None,
+        instrument: Optional[Instrumentation] = None,
+    ):
+        self.functions: Dict[str, ast.FunctionDef] = {fn.name: fn for fn in prog.functions}
+        self.checker = checker
+        self.options = options
+        self.plan = plan
+        self.value_numbering_stats = value_numbering_stats
+        self.instrument = instrument
+        self.prepared: Set[str] = set()
+        self.built: Dict[str, ir.Function] = {}
+        # Set when calls to pure functions are evaluated at compile time.
+        self.evaluator: Optional[CallEvaluator] = None
+
+    def use_typed(self, fn: ast.FunctionDef) -> None:
+        """Adopt an already checked and optimized function (from the cache)."""
+        self.functions[fn.name] = fn
+        self.prepared.add(fn.name)
+
+    def prepare(self, name: str) -> ast.FunctionDef:
+        fn = self.functions[name]
+        if name not in self.prepared:
+            with phase(self.instrument, "typecheck", name):
+                self.checker.check(only=(fn,))
+            fold_call = self.evaluator.fold_call if self.evaluator is not None else None
+            with phase(self.instrument, "ast-opt", name):
+                optimize_function(fn, self.options.opt_level, fold_call)
+            self.prepared.add(name)
+        return fn
+
+    def get(self, name: str) -> ir.Function:
+        ir_fn = self.built.get(name)
+        if ir_fn is None:
+            callees = {callee: self.get(callee) for callee in self.plan.callees(name)}
+            ir_fn = self.built[name] = build_ir(
+                self.prepare(name), self.options, callees, self.value_numbering_stats, self.instrument
+            )
+        return ir_fn
+
+
+@dataclass
+class BuildJob:
+    input: Path
+    output: Path
+
+
+@dataclass
+class BuildResult:
+    job: BuildJob
+    error: Optional[str] = None
+    cache_stats: CacheStats = field(default_factory=CacheStats)
+    peephole_stats: PeepholeStats = field(default_factory=PeepholeStats)
+    value_numbering_stats: ValueNumberingStats = field(default_factory=ValueNumberingStats)
+    compile_stats: CompileStats = field(default_factory=CompileStats)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class BuildConfig:
+    options: CompileOptions = field(default_factory=CompileOptions)
+    cache_dir: Optional[Path] = None  # None disables the cache
+    cache_max_bytes: int = 0
+    # Whether to time phases and count sizes into each result's compile_stats.
+    instrument: bool = False
+
+
+# Per-process state for pool workers, set up once by _init_worker.
+_worker_config: Optional[BuildConfig] = None
+_worker_cache: Optional[FunctionCache] = None
+
+
+def _init_worker(config: BuildConfig) -> None:
+    global _worker_config, _worker_cache
+    _worker_config = config
+    _worker_cache = FunctionCache(config.cache_dir, config.cache_max_bytes) if config.cache_dir else None
+
+
+def build_one(job: BuildJob) -> BuildResult:
+    """Compile one file with the worker's config; any error becomes this file's diagnostic."""
+    result = BuildResult(job)
+    cache = _worker_cache
+    if cache is not None:
+        cache.stats = result.cache_stats
+    try:
+        source = job.input.read_text(encoding="utf-8")
+        instrument = Instrumentation(result.compile_stats) if _worker_config.instrument else None
+        asm = compile_source(
+            source, _worker_config.options, cache, result.peephole_stats, result.value_numbering_stats, instrument
+        )
+        job.output.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(asm, bytes):
+            job.output.write_bytes(asm)
+        else:
+            job.output.write_text(asm, encoding="utf-8")
+    except (CompileError, OSError) as exc:
+        result.error = f"{type(exc).__name__}: {exc}"
+    except Exception as exc:
+        # A compiler limit or bug, such as RecursionError on deeply nested
+        # input, fails only this file; the rest of the build goes on.
+        result.error = f"internal error: {type(exc).__name__}: {exc}"
+    return result
+
+
+def build(jobs: Sequence[BuildJob], config: BuildConfig, workers: int = 1) -> Tuple[List[BuildResult], CacheStats]:
+    """Compile every job, in parallel when ``workers`` > 1.
+
+    Results come back in job order whatever order the workers finish in, so
+    diagnostics and output listings are deterministic. Cache eviction runs
+    once at the end rather than per file; the returned stats cover the
+    whole build including it.
+    """
+    if workers <= 1 or len(jobs) <= 1:
+        _init_worker(config)
+        results = [build_one(job) for job in jobs]
+    else:
+        # Batch small files so per-task IPC doesn't dominate on large corpora.
+        chunksize = max(1, len(jobs) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,)) as pool:
+            results = list(pool.map(build_one, jobs, chunksize=chunksize))
+    stats = CacheStats()
+    for result in results:
+        stats.add(result.cache_stats)
+    if config.cache_dir:
+        cache = FunctionCache(config.cache_dir, config.cache_max_bytes)
+        cache.stats = stats
+        cache.evict()
+    return results, stats
+
+
+def expand_inputs(specs: Iterable[str]) -> List[Path]:
+    """Resolve files, directories (searched recursively for .nv) and glob patterns.
+
+    Each spec's matches are sorted; duplicates keep their first position.
+    """
+    paths: List[Path] = []
+    seen = set()
+    for spec in specs:
+        path = Path(spec)
+        if path.is_dir():
+            matches = sorted(path.rglob("*.nv"))
+        elif path.exists() or not glob.has_magic(spec):
+            matches = [path]
+        else:
+            matches = sorted(Path(m) for m in glob.glob(spec, recursive=True))
+            if not matches:
+                raise CompileError(f"No input files match '{spec}'")
+        for match in matches:
+            key = os.path.normpath(match)
+            if key not in seen:
+                seen.add(key)
+                paths.append(match)
+    return paths
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import struct
+from typing import Dict, List, Sequence, Tuple
+
+from .encoder import MachineCode
+
+# Relocatable ELF64 objects for x86-64 Linux, as ``as`` would write for the
+# assembly X86Codegen emits: code in .text, string literals in .rodata, an
+# empty .note.GNU-stack (so the stack stays non-executable), and one
+# symbol per function. The object links with the C compiler like any other.
+#
+# References from code to .rodata are relocated against the section (the
+# string labels are local and get no symbols of their own), calls to libc
+# against an undefined symbol through the PLT.
+
+_EHDR = struct.Struct("<16sHHIQQQIHHHHHH")
+_SHDR = struct.Struct("<IIQQQQIIQQ")
+_SYM = struct.Struct("<IBBHQQ")
+_RELA = struct.Struct("<QQq")
+
+_ET_REL = 1
+_EM_X86_64 = 62
+_IDENT = b"\x7fELF" + bytes([2, 1, 1, 0]) + bytes(8)  # 64-bit, little-endian, version 1, System V
+
+_SHT_PROGBITS, _SHT_SYMTAB, _SHT_STRTAB, _SHT_RELA = 1, 2, 3, 4
+_SHF_ALLOC, _SHF_EXECINSTR, _SHF_INFO_LINK = 0x2, 0x4, 0x40
+_STB_LOCAL, _STB_GLOBAL = 0, 1
+_STT_NOTYPE, _STT_FUNC, _STT_SECTION = 0, 2, 3
+_SHN_UNDEF = 0
+R_X86_64_PC32 = 2
+R_X86_64_PLT32 = 4
+
+# Section header indexes, in the order write_object writes the sections.
+_TEXT, _RELA_TEXT, _RODATA, _NOTE, _SYMTAB, _STRTAB, _SHSTRTAB = range(1, 8)
+
+
+class _StringTable:
+    def __init__(self) -> None:
+        self.data = bytearray(b"\0")
+        self.offsets: Dict[str, int] = {"": 0}
+
+    def add(self, name: str) -> int:
+        if name not in self.offsets:
+            self.offsets[name] = len(self.data)
+            self.data += name.encode() + b"\0"
+        return self.offsets[name]
+
+
+def write_object(code: MachineCode, exported: Sequence[str]) -> bytes:
+    """A relocatable object holding ``code``; the functions in ``exported`` are global."""
+    text, rodata_labels, functions = code.text, code.rodata_labels, code.functions
+    strtab = _StringTable()
+    exported_set = set(exported)
+    starts = sorted(text.labels[name] for name in functions)
+    ends = dict(zip(starts, starts[1:] + [len(text.code)]))
+
+    def function_symbol(name: str, bind: int) -> bytes:
+        offset = text.labels[name]
+        return _SYM.pack(strtab.add(name), bind << 4 | _STT_FUNC, 0, _TEXT, offset, ends[offset] - offset)
+
+    symbols: List[bytes] = [
+        _SYM.pack(0, 0, 0, _SHN_UNDEF, 0, 0),
+        _SYM.pack(0, _STB_LOCAL << 4 | _STT_SECTION, 0, _TEXT, 0, 0),
+        _SYM.pack(0, _STB_LOCAL << 4 | _STT_SECTION, 0, _RODATA, 0, 0),
+    ]
+    rodata_symbol = 2
+    symbols += [function_symbol(name, _STB_LOCAL) for name in functions if name not in exported_set]
+    first_global = len(symbols)
+    index: Dict[str, int] = {}
+    for name in functions:
+        if name in exported_set:
+            index[name] = len(symbols)
+            symbols.append(function_symbol(name, _STB_GLOBAL))
+
+    relocations = bytearray()
+    for reloc in text.relocations:
+        if reloc.symbol in rodata_labels:
+            sym, addend = rodata_symbol, reloc.addend + rodata_labels[reloc.symbol]
+        else:
+            if reloc.symbol not in index:
+                index[reloc.symbol] = len(symbols)
+                symbols.append(_SYM.pack(strtab.add(reloc.symbol), _STB_GLOBAL << 4 | _STT_NOTYPE, 0, _SHN_UNDEF, 0, 0))
+            sym, addend = index[reloc.symbol], reloc.addend
+        kind = R_X86_64_PLT32 if reloc.branch else R_X86_64_PC32
+        relocations += _RELA.pack(reloc.offset, sym << 32 | kind, addend)
+
+    shstrtab = _StringTable()
+    # name, type, flags, data, link, info, align, entsize
+    sections: List[Tuple[str, int, int, bytes, int, int, int, int]] = [
+        (".text", _SHT_PROGBITS, _SHF_ALLOC | _SHF_EXECINSTR, text.code, 0, 0, 16, 0),
+        (".rela.text", _SHT_RELA, _SHF_INFO_LINK, bytes(relocations), _SYMTAB, _TEXT, 8, _RELA.size),
+        (".rodata", _SHT_PROGBITS, _SHF_ALLOC, code.rodata, 0, 0, 1, 0),
+        (".note.GNU-stack", _SHT_PROGBITS, 0, b"", 0, 0, 1, 0),
+        (".symtab", _SHT_SYMTAB, 0, b"".join(symbols), _STRTAB, first_global, 8, _SYM.size),
+        (".strtab", _SHT_STRTAB, 0, bytes(strtab.data), 0, 0, 1, 0),
+    ]
+    for name, *_ in sections:
+        shstrtab.add(name)
+    shstrtab.add(".shstrtab")
+    sections.append((".shstrtab", _SHT_STRTAB, 0, bytes(shstrtab.data), 0, 0, 1, 0))
+
+    out = bytearray(_EHDR.size)
+    headers = [_SHDR.pack(0, 0, 0, 0, 0, 0, 0, 0, 0, 0)]
+    for name, kind, flags, data, link, info, align, entsize in sections:
+        out += bytes(-len(out) % align)
+        headers.append(
+            _SHDR.pack(shstrtab.offsets[name], kind, flags, 0, len(out), len(data), link, info, align, entsize)
+        )
+        out += data
+    out += bytes(-len(out) % 8)
+    shoff = len(out)
+    out += b"".join(headers)
+    out[: _EHDR.size] = _EHDR.pack(
+        _IDENT, _ET_REL, _EM_X86_64, 1, 0, 0, shoff, 0, _EHDR.size, 0, 0, _SHDR.size, len(headers), _SHSTRTAB
+    )
+    return bytes(out)
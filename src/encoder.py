@@ -0,0 +1,583 @@
+from __future__ import annotations
+
+import re
+import struct
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from .errors import EncodeError
+from .peephole import AsmInstr, parse_line
+
+# x86-64 machine code for the instructions X86Codegen and the peephole pass
+# emit, read from the same lines that go into a .s file.
+#
+# Each instruction is encoded on its own except jumps, which are sized by
+# relaxation: every jump to a label in the same section starts in its
+# 2-byte form, and the ones whose target ends up out of reach are widened
+# to rel32, repeatedly until nothing changes. Widening only ever moves
+# code further apart, so this terminates.
+
+_REG64 = ("rax", "rcx", "rdx", "rbx", "rsp", "rbp", "rsi", "rdi") + tuple(f"r{n}" for n in range(8, 16))
+_REG32 = ("eax", "ecx", "edx", "ebx", "esp", "ebp", "esi", "edi") + tuple(f"r{n}d" for n in range(8, 16))
+_REG8 = ("al", "cl", "dl", "bl", "spl", "bpl", "sil", "dil") + tuple(f"r{n}b" for n in range(8, 16))
+_REGISTERS: Dict[str, Tuple[int, int]] = {}  # name -> (bits, number)
+for _bits, _names in ((64, _REG64), (32, _REG32), (8, _REG8)):
+    for _num, _name in enumerate(_names):
+        _REGISTERS[_name] = (_bits, _num)
+# Byte registers that need a REX prefix; without one, 4 to 7 are ah, ch, dh and bh.
+_REX_BYTES = frozenset({"spl", "bpl", "sil", "dil"})
+_RSP, _RBP = 4, 5
+
+_CONDITIONS = {
+    "o": 0, "no": 1, "b": 2, "c": 2, "nae": 2, "ae": 3, "nb": 3, "nc": 3,
+    "e": 4, "z": 4, "ne": 5, "nz": 5, "be": 6, "na": 6, "a": 7, "nbe": 7,
+    "s": 8, "ns": 9, "p": 10, "pe": 10, "np": 11, "po": 11,
+    "l": 12, "nge": 12, "ge": 13, "nl": 13, "le": 14, "ng": 14, "g": 15, "nle": 15,
+}  # fmt: skip
+# Opcode extensions: the ALU group (and its 01/03 + 8n register forms), the
+# shift group (C1/D1/D3) and the unary group (F7).
+_ALU = {"add": 0, "or": 1, "adc": 2, "sbb": 3, "and": 4, "sub": 5, "xor": 6, "cmp": 7}
+_SHIFTS = {"rol": 0, "ror": 1, "shl": 4, "sal": 4, "shr": 5, "sar": 7}
+_UNARY = {"not": 2, "neg": 3, "mul": 4, "imul": 5, "div": 6, "idiv": 7}
+_NO_OPERANDS = {"ret": b"\xc3", "leave": b"\xc9", "cqo": b"\x48\x99", "cdq": b"\x99", "nop": b"\x90"}
+
+# Distinct instruction lines whose encodings are kept between calls to assemble.
+_LINE_CACHE_SIZE = 16384
+
+_SIZES = {"byte": 8, "word": 16, "dword": 32, "qword": 64}
+_PTR = re.compile(r"(byte|word|dword|qword) ptr\s+")
+_TERM = re.compile(r"[+-]?[^+-]+")
+_NUMBER = re.compile(r"-?\d+$")
+_SYMBOL = re.compile(r"[A-Za-z_.$][\w.$]*$")
+
+
+@dataclass(frozen=True)
+class Reg:
+    name: str
+    bits: int
+    num: int
+
+
+@dataclass(frozen=True)
+class Mem:
+    # Operand size from a ``qword ptr``-style prefix; None for a bare address (lea).
+    bits: Optional[int]
+    base: Optional[int] = None
+    index: Optional[int] = None
+    scale: int = 1
+    disp: int = 0
+    # Set for ``[rip + symbol]``; ``disp`` is then added to the symbol's address.
+    symbol: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Imm:
+    value: int
+
+
+@dataclass(frozen=True)
+class Ref:
+    """A label or symbol named by a call or jump."""
+
+    name: str
+
+
+Operand = Union[Reg, Mem, Imm, Ref]
+
+
+def parse_operand(text: str) -> Operand:
+    text = text.strip()
+    if text in _REGISTERS:
+        return Reg(text, *_REGISTERS[text])
+    bits = None
+    rest = text
+    m = _PTR.match(rest)
+    if m:
+        bits = _SIZES[m.group(1)]
+        rest = rest[m.end() :]
+    if rest.startswith("[") and rest.endswith("]"):
+        return _parse_address(rest[1:-1], bits, text)
+    if bits is None and _NUMBER.match(rest):
+        return Imm(int(rest))
+    if bits is None and _SYMBOL.match(rest):
+        return Ref(rest)
+    raise EncodeError(f"Cannot encode operand '{text}'")
+
+
+def _parse_address(inner: str, bits: Optional[int], text: str) -> Mem:
+    """``base + index*scale + disp``, ``rip + symbol``, or constant terms, in any order."""
+    inner = inner.replace(" ", "")
+    terms = _TERM.findall(inner)
+    if "".join(terms) != inner:
+        raise EncodeError(f"Cannot encode operand '{text}'")
+    base = index = symbol = None
+    scale, disp, rip = 1, 0, False
+    for term in terms:
+        negative = term.startswith("-")
+        factors = term.lstrip("+-").split("*")
+        regs = [f for f in factors if f in _REGISTERS or f == "rip"]
+        if not regs and all(_NUMBER.match(f) for f in factors):
+            value = 1
+            for f in factors:
+                value *= int(f)
+            disp += -value if negative else value
+        elif len(factors) == 1 and factors[0] == "rip" and not negative:
+            rip = True
+        elif len(factors) == 1 and _SYMBOL.match(factors[0]) and not regs and symbol is None and not negative:
+            symbol = factors[0]
+        elif len(regs) == 1 and not negative and _REGISTERS.get(regs[0], (0,))[0] == 64:
+            num = _REGISTERS[regs[0]][1]
+            others = [f for f in factors if f != regs[0]]
+            if not others and base is None:
+                base = num
+            elif index is None and all(_NUMBER.match(f) for f in others) and len(others) <= 1:
+                index, scale = num, int(others[0]) if others else 1
+            else:
+                raise EncodeError(f"Cannot encode operand '{text}'")
+        else:
+            raise EncodeError(f"Cannot encode operand '{text}'")
+    if scale not in (1, 2, 4, 8) or (symbol is not None) != rip or rip and (base is not None or index is not None):
+        raise EncodeError(f"Cannot encode operand '{text}'")
+    if index == _RSP:
+        # rsp can't be an index; as a lone scale-1 "index" it is the base.
+        if scale != 1 or base == _RSP:
+            raise EncodeError(f"Cannot encode operand '{text}'")
+        base, index = index, base
+    if not -(1 << 31) <= disp < (1 << 31):
+        raise EncodeError(f"Displacement out of range in '{text}'")
+    return Mem(bits, base, index, scale, disp, symbol)
+
+
+@dataclass
+class Fixup:
+    """A rel32 field at ``offset`` in an instruction that ends ``end`` bytes after it starts.
+
+    It holds the address of ``symbol`` plus ``addend``, relative to the end
+    of the instruction. ``branch`` is set for calls and jumps.
+    """
+
+    offset: int
+    end: int
+    symbol: str
+    addend: int = 0
+    branch: bool = False
+
+
+@dataclass
+class Encoded:
+    code: bytes
+    fixup: Optional[Fixup] = None
+
+
+def _pack_imm(value: int, size: int, bits: int) -> bytes:
+    """``value`` as a ``size``-byte immediate of a ``bits``-wide operation, which sign-extends it."""
+    if size == 1:
+        return struct.pack("<b", value)
+    if bits == 32 and 0 <= value < (1 << 32):
+        return struct.pack("<I", value)
+    return struct.pack("<i", value)
+
+
+def _fits8(value: int) -> bool:
+    return -128 <= value < 128
+
+
+def _fits_imm(value: int, bits: int) -> bool:
+    if bits == 32:
+        return -(1 << 31) <= value < (1 << 32)
+    return -(1 << 31) <= value < (1 << 31)
+
+
+def _modrm(reg: int, rm: Union[Reg, Mem]) -> Tuple[int, bytes, Optional[Tuple[int, str, int]]]:
+    """The REX.R/X/B bits and the ModRM (and SIB and displacement) bytes for ``reg`` and ``rm``.
+
+    For a rip-relative ``rm`` also returns its fixup: the offset of the
+    disp32 in the returned bytes, the symbol and the addend.
+    """
+    rex = (reg >> 3) << 2
+    reg &= 7
+    if isinstance(rm, Reg):
+        return rex | rm.num >> 3, bytes([0xC0 | reg << 3 | rm.num & 7]), None
+    if rm.symbol is not None:
+        return rex, bytes([reg << 3 | 5]) + b"\0\0\0\0", (1, rm.symbol, rm.disp)
+    base, index, disp = rm.base, rm.index, rm.disp
+    if base is None:
+        # No base: SIB with base 101 and mod 00 means disp32 only.
+        sib_index = 4 if index is None else index & 7
+        sib = _scale_bits(rm.scale) << 6 | sib_index << 3 | 5
+        x = (index >> 3) << 1 if index is not None else 0
+        return rex | x, bytes([reg << 3 | 4, sib]) + struct.pack("<i", disp), None
+    if disp == 0 and base & 7 != _RBP:
+        mod, tail = 0, b""
+    elif _fits8(disp):
+        mod, tail = 1, struct.pack("<b", disp)
+    else:
+        mod, tail = 2, struct.pack("<i", disp)
+    if index is None and base & 7 != _RSP:
+        return rex | base >> 3, bytes([mod << 6 | reg << 3 | base & 7]) + tail, None
+    sib_index = 4 if index is None else index & 7
+    sib = _scale_bits(rm.scale) << 6 | sib_index << 3 | base & 7
+    x = (index >> 3) << 1 if index is not None else 0
+    return rex | x | base >> 3, bytes([mod << 6 | reg << 3 | 4, sib]) + tail, None
+
+
+def _scale_bits(scale: int) -> int:
+    return {1: 0, 2: 1, 4: 2, 8: 3}[scale]
+
+
+def _with_modrm(
+    opcode: bytes, reg: int, rm: Union[Reg, Mem], wide: bool, imm: bytes = b"", force_rex: bool = False
+) -> Encoded:
+    rex, tail, rip = _modrm(reg, rm)
+    if wide:
+        rex |= 8
+    prefix = bytes([0x40 | rex]) if rex or force_rex else b""
+    code = prefix + opcode + tail + imm
+    fixup = None
+    if rip is not None:
+        offset, symbol, addend = rip
+        fixup = Fixup(len(prefix) + len(opcode) + offset, len(code), symbol, addend)
+    return Encoded(code, fixup)
+
+
+def _with_reg_in_opcode(opcode: int, reg: Reg, wide: bool, imm: bytes = b"") -> Encoded:
+    rex = (8 if wide else 0) | reg.num >> 3
+    prefix = bytes([0x40 | rex]) if rex else b""
+    return Encoded(prefix + bytes([opcode + (reg.num & 7)]) + imm)
+
+
+def _width(*operands: Operand) -> int:
+    """The operation size given by the register and sized memory operands, which must agree."""
+    widths = {op.bits for op in operands if isinstance(op, Reg) or isinstance(op, Mem) and op.bits is not None}
+    if len(widths) != 1 or not widths <= {32, 64}:
+        raise EncodeError("Operand sizes are missing or don't match")
+    return widths.pop()
+
+
+def _needs_rex(*operands: Operand) -> bool:
+    return any(isinstance(op, Reg) and op.name in _REX_BYTES for op in operands)
+
+
+def _is_rm(operand: Operand) -> bool:
+    return isinstance(operand, (Reg, Mem))
+
+
+def encode(instr: AsmInstr) -> Encoded:
+    """Machine code for one instruction other than a jump to a label; raises EncodeError if unsupported."""
+    operands = [parse_operand(text) for text in instr.operands]
+    try:
+        encoded = _encode(instr.op, operands)
+    except (EncodeError, struct.error, KeyError):
+        encoded = None
+    if encoded is None:
+        raise EncodeError(f"Cannot encode '{instr.render().strip()}'")
+    return encoded
+
+
+def _encode(op: str, args: List[Operand]) -> Optional[Encoded]:
+    n = len(args)
+    if n == 0:
+        return Encoded(_NO_OPERANDS[op]) if op in _NO_OPERANDS else None
+    if op in _ALU and n == 2:
+        return _alu(_ALU[op], *args)
+    if op in ("mov", "movabs") and n == 2:
+        return _mov(*args, force_imm64=op == "movabs")
+    if op == "lea" and n == 2 and isinstance(args[0], Reg) and isinstance(args[1], Mem):
+        addr = args[1]
+        if addr.base is None and addr.index is None and addr.symbol is None and addr.disp >= 0:
+            # An absolute address is just a constant: mov r32, imm32.
+            return _mov(args[0], Imm(addr.disp))
+        return _with_modrm(b"\x8d", args[0].num, addr, _width(args[0]) == 64)
+    if op == "test" and n == 2:
+        return _test(*args)
+    if op == "movzx" and n == 2 and isinstance(args[0], Reg) and _is_rm(args[1]):
+        src = args[1]
+        if src.bits != 8:
+            return None
+        return _with_modrm(b"\x0f\xb6", args[0].num, src, _width(args[0]) == 64, force_rex=_needs_rex(src))
+    if op == "imul" and n >= 2:
+        return _imul(*args)
+    if op in _UNARY and n == 1 and _is_rm(args[0]):
+        return _with_modrm(b"\xf7", _UNARY[op], args[0], _width(args[0]) == 64)
+    if op in _SHIFTS and n == 2 and _is_rm(args[0]):
+        return _shift(_SHIFTS[op], *args)
+    if op in ("push", "pop") and n == 1:
+        return _push_pop(op, args[0])
+    if op.startswith("set") and op[3:] in _CONDITIONS and n == 1 and _is_rm(args[0]):
+        if args[0].bits != 8:
+            return None
+        opcode = bytes([0x0F, 0x90 + _CONDITIONS[op[3:]]])
+        return _with_modrm(opcode, 0, args[0], False, force_rex=_needs_rex(args[0]))
+    if op.startswith("cmov") and op[4:] in _CONDITIONS and n == 2 and isinstance(args[0], Reg) and _is_rm(args[1]):
+        opcode = bytes([0x0F, 0x40 + _CONDITIONS[op[4:]]])
+        return _with_modrm(opcode, args[0].num, args[1], _width(*args) == 64)
+    if op == "xchg" and n == 2 and _is_rm(args[0]) and _is_rm(args[1]):
+        reg, rm = (args[0], args[1]) if isinstance(args[0], Reg) else (args[1], args[0])
+        if not isinstance(reg, Reg):
+            return None
+        return _with_modrm(b"\x87", reg.num, rm, _width(*args) == 64)
+    if op == "call" and n == 1 and isinstance(args[0], Ref):
+        return Encoded(b"\xe8\0\0\0\0", Fixup(1, 5, args[0].name, branch=True))
+    return None
+
+
+def _alu(ext: int, dst: Operand, src: Operand) -> Optional[Encoded]:
+    if not _is_rm(dst):
+        return None
+    if isinstance(src, Imm):
+        bits = _width(dst)
+        if _fits8(src.value):
+            return _with_modrm(b"\x83", ext, dst, bits == 64, _pack_imm(src.value, 1, bits))
+        if not _fits_imm(src.value, bits):
+            return None
+        if isinstance(dst, Reg) and dst.num == 0:
+            # The accumulator has a form without ModRM: 05 + 8n.
+            rex = b"\x48" if bits == 64 else b""
+            return Encoded(rex + bytes([ext << 3 | 5]) + _pack_imm(src.value, 4, bits))
+        return _with_modrm(b"\x81", ext, dst, bits == 64, _pack_imm(src.value, 4, bits))
+    bits = _width(dst, src)
+    if isinstance(src, Reg):
+        return _with_modrm(bytes([ext << 3 | 1]), src.num, dst, bits == 64)
+    if isinstance(dst, Reg) and isinstance(src, Mem):
+        return _with_modrm(bytes([ext << 3 | 3]), dst.num, src, bits == 64)
+    return None
+
+
+def _test(left: Operand, right: Operand) -> Optional[Encoded]:
+    if isinstance(left, Reg) and isinstance(right, Mem):
+        left, right = right, left
+    if not _is_rm(left):
+        return None
+    if isinstance(right, Imm):
+        bits = _width(left)
+        if not _fits_imm(right.value, bits):
+            return None
+        return _with_modrm(b"\xf7", 0, left, bits == 64, _pack_imm(right.value, 4, bits))
+    if isinstance(right, Reg):
+        return _with_modrm(b"\x85", right.num, left, _width(left, right) == 64)
+    return None
+
+
+def _mov(dst: Operand, src: Operand, force_imm64: bool = False) -> Optional[Encoded]:
+    if isinstance(src, Imm):
+        value = src.value
+        if isinstance(dst, Reg):
+            bits = _width(dst)
+            if bits == 64 and (force_imm64 or not -(1 << 31) <= value < (1 << 32)):
+                if not -(1 << 63) <= value < (1 << 64):
+                    return None
+                return _with_reg_in_opcode(0xB8, dst, True, struct.pack("<Q", value & ((1 << 64) - 1)))
+            if bits == 64 and value < 0:
+                # Sign-extended imm32: C7 /0.
+                return _with_modrm(b"\xc7", 0, dst, True, _pack_imm(value, 4, 64))
+            if not _fits_imm(value, 32):
+                return None
+            # Writing the 32-bit register zero-extends, so this also sets a
+            # 64-bit register to any value in [0, 2**32).
+            return _with_reg_in_opcode(0xB8, dst, False, _pack_imm(value, 4, 32))
+        if isinstance(dst, Mem) and not force_imm64:
+            bits = _width(dst)
+            if not _fits_imm(value, bits):
+                return None
+            return _with_modrm(b"\xc7", 0, dst, bits == 64, _pack_imm(value, 4, bits))
+        return None
+    if force_imm64:
+        return None
+    bits = _width(dst, src)
+    if isinstance(src, Reg) and _is_rm(dst):
+        return _with_modrm(b"\x89", src.num, dst, bits == 64)
+    if isinstance(dst, Reg) and isinstance(src, Mem):
+        return _with_modrm(b"\x8b", dst.num, src, bits == 64)
+    return None
+
+
+def _imul(dst: Operand, src: Operand, imm: Optional[Operand] = None) -> Optional[Encoded]:
+    if imm is None and isinstance(src, Imm):
+        src, imm = dst, src
+    if not (isinstance(dst, Reg) and _is_rm(src)):
+        return None
+    bits = _width(dst, src)
+    if imm is None:
+        return _with_modrm(b"\x0f\xaf", dst.num, src, bits == 64)
+    if not isinstance(imm, Imm):
+        return None
+    if _fits8(imm.value):
+        return _with_modrm(b"\x6b", dst.num, src, bits == 64, _pack_imm(imm.value, 1, bits))
+    if not _fits_imm(imm.value, bits):
+        return None
+    return _with_modrm(b"\x69", dst.num, src, bits == 64, _pack_imm(imm.value, 4, bits))
+
+
+def _shift(ext: int, dst: Operand, count: Operand) -> Optional[Encoded]:
+    wide = _width(dst) == 64
+    if isinstance(count, Imm):
+        if count.value == 1:
+            return _with_modrm(b"\xd1", ext, dst, wide)
+        if not 0 <= count.value < 256:
+            return None
+        return _with_modrm(b"\xc1", ext, dst, wide, bytes([count.value]))
+    if isinstance(count, Reg) and count.name == "cl":
+        return _with_modrm(b"\xd3", ext, dst, wide)
+    return None
+
+
+def _push_pop(op: str, arg: Operand) -> Optional[Encoded]:
+    if isinstance(arg, Reg):
+        if arg.bits != 64:
+            return None
+        return _with_reg_in_opcode(0x50 if op == "push" else 0x58, arg, False)
+    if isinstance(arg, Mem):
+        if arg.bits not in (None, 64):
+            return None
+        # push and pop are 64-bit by default; no REX.W.
+        return _with_modrm(b"\xff" if op == "push" else b"\x8f", 6 if op == "push" else 0, arg, False)
+    if isinstance(arg, Imm) and op == "push":
+        if _fits8(arg.value):
+            return Encoded(b"\x6a" + _pack_imm(arg.value, 1, 64))
+        if _fits_imm(arg.value, 64):
+            return Encoded(b"\x68" + _pack_imm(arg.value, 4, 64))
+    return None
+
+
+@dataclass
+class _Jump:
+    """A jmp or jcc to a label or symbol, sized by relaxation."""
+
+    condition: Optional[int]  # None for jmp
+    target: str
+    near: bool = False
+
+    def size(self) -> int:
+        if not self.near:
+            return 2
+        return 5 if self.condition is None else 6
+
+    def encode(self) -> Encoded:
+        if not self.near:
+            opcode = 0xEB if self.condition is None else 0x70 + self.condition
+            return Encoded(bytes([opcode, 0]), Fixup(1, 2, self.target, branch=True))
+        opcode = b"\xe9" if self.condition is None else bytes([0x0F, 0x80 + self.condition])
+        code = opcode + b"\0\0\0\0"
+        return Encoded(code, Fixup(len(opcode), len(code), self.target, branch=True))
+
+
+@dataclass
+class Relocation:
+    """A rel32 field at ``offset`` that must hold ``symbol + addend - (address of the field)``.
+
+    ``branch`` is set for calls and jumps, which may go through the PLT.
+    """
+
+    offset: int
+    symbol: str
+    addend: int
+    branch: bool = False
+
+
+@dataclass
+class Assembled:
+    code: bytes
+    # Offset of every label defined in the code.
+    labels: Dict[str, int] = field(default_factory=dict)
+    # References to symbols the code doesn't define, for the linker.
+    relocations: List[Relocation] = field(default_factory=list)
+
+
+@dataclass
+class MachineCode:
+    """A whole program's code and read-only data, before it is placed anywhere."""
+
+    text: Assembled
+    rodata: bytes
+    # Offset in ``rodata`` of each label the code refers to.
+    rodata_labels: Dict[str, int]
+    # Labels in ``text`` that start functions, in order.
+    functions: List[str]
+
+
+@lru_cache(maxsize=_LINE_CACHE_SIZE)
+def _encode_line(text: str) -> Union[Encoded, Tuple[Optional[int], str]]:
+    """Machine code for one instruction, or a jump's condition and target.
+
+    Generated code repeats the same instructions a lot (frame setup,
+    spills, calls to printf), so each distinct line is only encoded once.
+    The result is shared and must not be changed.
+    """
+    item = parse_line(text)
+    if item.op.startswith("."):
+        raise EncodeError(f"Cannot encode directive '{text}'")
+    if (item.op == "jmp" or item.op[0] == "j" and item.op[1:] in _CONDITIONS) and len(item.operands) == 1:
+        target = parse_operand(item.operands[0])
+        if not isinstance(target, Ref):
+            raise EncodeError(f"Cannot encode '{text}'")
+        return None if item.op == "jmp" else _CONDITIONS[item.op[1:]], target.name
+    return encode(item)
+
+
+def assemble(lines: Iterable[str]) -> Assembled:
+    """Encode assembly lines (labels and instructions, no directives) into one section of code.
+
+    References to labels defined in ``lines`` are resolved here; any others
+    become relocations.
+    """
+    items: List[Union[Encoded, _Jump]] = []
+    label_items: Dict[str, int] = {}
+    for line in lines:
+        text = line.strip()
+        if not text:
+            continue
+        if text.endswith(":"):
+            name = text[:-1]
+            if name in label_items:
+                raise EncodeError(f"Label '{name}' is defined twice")
+            label_items[name] = len(items)
+            continue
+        item = _encode_line(text)
+        items.append(_Jump(*item) if isinstance(item, tuple) else item)
+
+    jumps = [item for item in items if isinstance(item, _Jump)]
+    for jump in jumps:
+        # Jumps out of this code go through the linker, which needs rel32.
+        jump.near = jump.target not in label_items
+    while True:
+        offsets, labels = _layout(items, label_items)
+        changed = False
+        for idx, item in enumerate(items):
+            if isinstance(item, _Jump) and not item.near and not _fits8(labels[item.target] - offsets[idx] - 2):
+                item.near = True
+                changed = True
+        if not changed:
+            break
+
+    code = bytearray()
+    relocations: List[Relocation] = []
+    for item in items:
+        encoded = item.encode() if isinstance(item, _Jump) else item
+        start = len(code)
+        code += encoded.code
+        fixup = encoded.fixup
+        if fixup is None:
+            continue
+        field_at = start + fixup.offset
+        if fixup.symbol in labels:
+            value = labels[fixup.symbol] + fixup.addend - (start + fixup.end)
+            if fixup.end - fixup.offset == 1:
+                code[field_at] = struct.pack("<b", value)[0]
+            else:
+                code[field_at : field_at + 4] = struct.pack("<i", value)
+        else:
+            addend = fixup.addend - (fixup.end - fixup.offset)
+            relocations.append(Relocation(field_at, fixup.symbol, addend, fixup.branch))
+    return Assembled(bytes(code), labels, relocations)
+
+
+def _layout(items: List[Union[Encoded, _Jump]], label_items: Dict[str, int]) -> Tuple[List[int], Dict[str, int]]:
+    """Each item's offset, and each label's, given the jumps' current sizes."""
+    offsets: List[int] = []
+    offset = 0
+    for item in items:
+        offsets.append(offset)
+        offset += item.size() if isinstance(item, _Jump) else len(item.code)
+    offsets.append(offset)
+    return offsets, {name: offsets[idx] for name, idx in label_items.items()}
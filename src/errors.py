@@ -12,3 +12,11 @@ class ParseError(CompileError):
 
 class TypeError(CompileError):
     pass
+
+
+class IRError(CompileError):
+    pass
+
+
+class EncodeError(CompileError):
+    pass
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from . import ast, ir
+from .callgraph import CallGraph, build_call_graph, function_size
+from .errors import IRError
+
+# Callee size limit (statements plus expression nodes) at -O2, and the size
+# a caller may grow to through inlining.
+DEFAULT_INLINE_THRESHOLD = 40
+DEFAULT_INLINE_GROWTH = 2000
+
+
+@dataclass
+class InlinePlan:
+    """Which calls get inlined, decided per (caller, callee) pair.
+
+    Every call from a caller to a callee in ``inline[caller]`` is replaced by
+    the callee's body. Deciding from the parsed program alone keeps the plan
+    stable across incremental builds, whichever functions come from the cache.
+    """
+
+    inline: Dict[str, List[str]] = field(default_factory=dict)
+
+    def callees(self, caller: str) -> List[str]:
+        return self.inline.get(caller, [])
+
+
+def plan_inlining(prog: ast.Program, threshold: int, growth: int, graph: Optional[CallGraph] = None) -> InlinePlan:
+    """Pick call edges to inline, callees before callers.
+
+    A callee qualifies if it is not ``main``, can't reach itself, and its
+    size after its own inlining is within ``threshold``; the caller's size
+    may not grow past ``growth``. A function left uncalled once its calls
+    are inlined is not emitted, since only what ``main`` reaches in the
+    generated code is (see :func:`driver.compile_program`).
+    """
+    plan = InlinePlan()
+    if threshold <= 0:
+        return plan
+    graph = graph or build_call_graph(prog)
+    recursive = graph.recursive()
+    functions = {fn.name: fn for fn in prog.functions}
+    size: Dict[str, int] = {}
+    for component in graph.sccs():
+        for name in component:
+            total = function_size(functions[name])
+            chosen: List[str] = []
+            for callee, count in graph.calls[name].items():
+                fits = callee not in recursive and callee != "main" and size.get(callee, threshold + 1) <= threshold
+                if fits and total + count * size[callee] <= growth:
+                    chosen.append(callee)
+                    total += count * size[callee]
+            if chosen:
+                plan.inline[name] = chosen
+            size[name] = total
+    return plan
+
+
+def inline_calls(fn: ir.Function, callees: Dict[str, ir.Function]) -> int:
+    """Replace each call in ``fn`` to a function in ``callees`` by a copy of its body.
+
+    Both sides must be out of SSA form. Calls inside the copied bodies are
+    left alone. Returns the number of calls replaced.
+    """
+    count = 0
+    idx = 0
+    while idx < len(fn.blocks):
+        block = fn.blocks[idx]
+        idx += 1
+        for pos, instr in enumerate(block.instrs):
+            if isinstance(instr, ir.Call) and instr.callee in callees:
+                break
+        else:
+            continue
+        rest = fn.new_block(f"{instr.callee}_ret")
+        rest.instrs = block.instrs[pos + 1 :]
+        params, body = _clone_body(fn, callees[instr.callee], instr, rest.label)
+        del block.instrs[pos:]
+        block.instrs.extend(ir.Copy(param, arg) for param, arg in zip(params, instr.args))
+        block.instrs.append(ir.Jump(body[0].label))
+        fn.blocks[idx:idx] = body
+        # Carry on with the code after the call; the copied blocks are skipped.
+        idx += len(body)
+        fn.blocks.insert(idx, rest)
+        count += 1
+    return count
+
+
+def _clone_body(
+    fn: ir.Function, callee: ir.Function, call: ir.Call, exit_label: str
+) -> Tuple[List[ir.VReg], List[ir.Block]]:
+    """Copy ``callee``'s blocks into ``fn`` under fresh vregs and labels, returning into ``call.target``.
+
+    Returns the copied parameters and blocks.
+    """
+    labels = {block.label: fn.new_block(f"{callee.name}_").label for block in callee.blocks}
+    # Copied vregs are named after the copy's entry block, so each call site's are told apart.
+    prefix = labels[callee.entry.label]
+    vregs: Dict[int, ir.VReg] = {}
+
+    def rename(value: ir.Operand) -> ir.Operand:
+        if not isinstance(value, ir.VReg):
+            return value
+        copy = vregs.get(value.id)
+        if copy is None:
+            copy = vregs[value.id] = fn.new_vreg(f"{prefix}.{value.name}")
+        return copy
+
+    blocks = []
+    for block in callee.blocks:
+        instrs: List[ir.Instr] = []
+        for instr in block.instrs:
+            if isinstance(instr, ir.Return):
+                instrs.append(ir.Copy(call.target, rename(instr.value)))
+                instrs.append(ir.Jump(exit_label))
+            elif isinstance(instr, ir.Copy):
+                instrs.append(ir.Copy(rename(instr.target), rename(instr.src)))
+            elif isinstance(instr, ir.Unary):
+                instrs.append(ir.Unary(rename(instr.target), instr.op, rename(instr.src)))
+            elif isinstance(instr, ir.Binary):
+                instrs.append(ir.Binary(rename(instr.target), instr.op, rename(instr.lhs), rename(instr.rhs)))
+            elif isinstance(instr, ir.TailCall):
+                args = [rename(arg) for arg in instr.args]
+                instrs.append(ir.Call(call.target, instr.callee, args))
+                instrs.append(ir.Jump(exit_label))
+            elif isinstance(instr, ir.Call):
+                instrs.append(ir.Call(rename(instr.target), instr.callee, [rename(arg) for arg in instr.args]))
+            elif isinstance(instr, ir.Print):
+                instrs.append(ir.Print(rename(instr.src), instr.kind))
+            elif isinstance(instr, ir.Jump):
+                instrs.append(ir.Jump(labels[instr.label]))
+            elif isinstance(instr, ir.Branch):
+                instrs.append(ir.Branch(rename(instr.cond), labels[instr.if_true], labels[instr.if_false]))
+            else:
+                raise IRError(f"Cannot inline {instr} from {callee.name}")
+        blocks.append(ir.Block(labels[block.label], instrs))
+    return [rename(param) for param in callee.params], blocks
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import ContextManager, Dict, Iterator, List, Optional, Sequence
+
+# The phases a compilation is timed in, in pipeline order. Per-function
+# phases run once for each function that isn't loaded from the cache.
+PHASES = ("tokenize", "parse", "typecheck", "ast-opt", "lower", "inline", "ir-opt", "codegen", "peephole", "link")
+
+
+@dataclass
+class PhaseTime:
+    wall: float = 0.0  # seconds
+    cpu: float = 0.0  # seconds of this process's CPU time
+    runs: int = 0
+
+    def add(self, other: "PhaseTime") -> None:
+        self.wall += other.wall
+        self.cpu += other.cpu
+        self.runs += other.runs
+
+
+@dataclass
+class CompileStats:
+    """Sizes and phase times of one or more compilations; :meth:`add` merges another's."""
+
+    tokens: int = 0
+    # Functions plus their statements and expression nodes.
+    ast_nodes: int = 0
+    functions: int = 0
+    emitted_functions: int = 0
+    instructions: int = 0
+    # Stack reserved by each emitted function below its return address:
+    # rbp, the callee-saved registers it pushes and its spill slots.
+    frame_bytes: int = 0
+    max_frame_bytes: int = 0
+    strings: int = 0
+    string_bytes: int = 0  # including terminating NULs
+    phases: Dict[str, PhaseTime] = field(default_factory=dict)
+
+    def add(self, other: "CompileStats") -> None:
+        self.tokens += other.tokens
+        self.ast_nodes += other.ast_nodes
+        self.functions += other.functions
+        self.emitted_functions += other.emitted_functions
+        self.instructions += other.instructions
+        self.frame_bytes += other.frame_bytes
+        self.max_frame_bytes = max(self.max_frame_bytes, other.max_frame_bytes)
+        self.strings += other.strings
+        self.string_bytes += other.string_bytes
+        for name, timing in other.phases.items():
+            self.phases.setdefault(name, PhaseTime()).add(timing)
+
+    def report(self) -> str:
+        rows = [
+            ("tokens", self.tokens),
+            ("ast nodes", self.ast_nodes),
+            ("functions", self.functions),
+            ("emitted", self.emitted_functions),
+            ("instructions", self.instructions),
+            ("frame bytes", self.frame_bytes),
+            ("max frame", self.max_frame_bytes),
+            ("strings", self.strings),
+            ("string bytes", self.string_bytes),
+        ]
+        return "\n".join([f"{'compilation':<16}{'count':>9}"] + [f"{name:<16}{value:>9}" for name, value in rows])
+
+    def time_report(self) -> str:
+        lines = [f"{'phase':<16}{'wall ms':>10}{'cpu ms':>10}{'runs':>7}"]
+        total = PhaseTime()
+        for name in _ordered(self.phases):
+            timing = self.phases[name]
+            total.add(timing)
+            lines.append(f"{name:<16}{timing.wall * 1e3:>10.2f}{timing.cpu * 1e3:>10.2f}{timing.runs:>7}")
+        lines.append(f"{'total':<16}{total.wall * 1e3:>10.2f}{total.cpu * 1e3:>10.2f}{total.runs:>7}")
+        return "\n".join(lines)
+
+    def as_dict(self) -> Dict[str, object]:
+        """Plain data for JSON output; times are in seconds."""
+        data: Dict[str, object] = {
+            name: getattr(self, name)
+            for name in (
+                "tokens",
+                "ast_nodes",
+                "functions",
+                "emitted_functions",
+                "instructions",
+                "frame_bytes",
+                "max_frame_bytes",
+                "strings",
+                "string_bytes",
+            )
+        }
+        data["phases"] = {
+            name: {"wall": self.phases[name].wall, "cpu": self.phases[name].cpu, "runs": self.phases[name].runs}
+            for name in _ordered(self.phases)
+        }
+        return data
+
+
+def _ordered(phases: Dict[str, PhaseTime]) -> List[str]:
+    """Known phases in pipeline order, then any others in the order first seen."""
+    return [name for name in PHASES if name in phases] + [name for name in phases if name not in PHASES]
+
+
+class PassObserver:
+    """Notified around every phase of an instrumented compilation; override either method.
+
+    ``function`` names the function the phase works on, or is None for
+    phases over the whole program.
+    """
+
+    def phase_started(self, phase: str, function: Optional[str]) -> None:
+        pass
+
+    def phase_finished(self, phase: str, function: Optional[str], wall: float, cpu: float) -> None:
+        pass
+
+
+class Instrumentation:
+    """Times the phases of compilations into ``stats`` and reports them to ``observers``.
+
+    Pass one to :func:`driver.compile_source` (or :func:`driver.compile_program`)
+    to have that compilation's sizes and phase times added to ``stats``.
+    """
+
+    def __init__(self, stats: Optional[CompileStats] = None, observers: Sequence[PassObserver] = ()):
+        self.stats = stats if stats is not None else CompileStats()
+        self.observers: List[PassObserver] = list(observers)
+
+    def add_observer(self, observer: PassObserver) -> None:
+        self.observers.append(observer)
+
+    @contextmanager
+    def phase(self, name: str, function: Optional[str] = None) -> Iterator[None]:
+        for observer in self.observers:
+            observer.phase_started(name, function)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            timing = self.stats.phases.setdefault(name, PhaseTime())
+            timing.wall += wall
+            timing.cpu += cpu
+            timing.runs += 1
+            for observer in self.observers:
+                observer.phase_finished(name, function, wall, cpu)
+
+
+def phase(instrument: Optional[Instrumentation], name: str, function: Optional[str] = None) -> ContextManager[None]:
+    """``instrument.phase(name, function)``, or a context that does nothing without ``instrument``."""
+    return nullcontext() if instrument is None else instrument.phase(name, function)
@@ -0,0 +1,518 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+
+# A three-address IR: functions are lists of basic blocks, each ending in
+# exactly one terminator, over an unbounded supply of virtual registers.
+# Variables of the source program are ordinary vregs that may be assigned
+# more than once; `to_ssa` (src/ssa.py) renames them into single-assignment
+# form with phi nodes and `from_ssa` turns phis back into copies.
+
+BINARY_OPS = {
+    "+": "add",
+    "-": "sub",
+    "*": "mul",
+    "/": "div",
+    "==": "eq",
+    "!=": "ne",
+    "<": "lt",
+    "<=": "le",
+    ">": "gt",
+    ">=": "ge",
+}
+COMPARISONS = frozenset({"eq", "ne", "lt", "le", "gt", "ge"})
+# Operations with no source-level operator, introduced by strength reduction
+# (src/strength.py): shifts by a constant, and the high half of a signed
+# 128-bit product.
+SHIFT_OPS = frozenset({"shl", "sar", "shr"})
+MACHINE_OPS = SHIFT_OPS | {"mulhs"}
+UNARY_OPS = {"-": "neg", "!": "not"}
+
+
+@dataclass(slots=True, eq=False)
+class VReg:
+    """A virtual register; compared by identity."""
+
+    id: int
+    name: str
+
+    def __str__(self) -> str:
+        return f"%{self.name}"
+
+
+@dataclass(slots=True, frozen=True)
+class Imm:
+    value: int
+
+    def __str__(self) -> str:
+        return str(self.value)
+
+
+@dataclass(slots=True, frozen=True)
+class Str:
+    """Address of a string literal."""
+
+    value: str
+
+    def __str__(self) -> str:
+        escaped = self.value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\t", "\\t")
+        return f'"{escaped}"'
+
+
+Operand = Union[VReg, Imm, Str]
+
+
+@dataclass(slots=True, eq=False)
+class Instr:
+    def uses(self) -> List[Operand]:
+        return []
+
+    def replace_uses(self, mapping: Dict[VReg, Operand]) -> None:
+        pass
+
+    @property
+    def dst(self) -> Optional[VReg]:
+        return None
+
+
+@dataclass(slots=True, eq=False)
+class Copy(Instr):
+    target: VReg
+    src: Operand
+
+    @property
+    def dst(self) -> VReg:
+        return self.target
+
+    def uses(self) -> List[Operand]:
+        return [self.src]
+
+    def replace_uses(self, mapping: Dict[VReg, Operand]) -> None:
+        self.src = mapping.get(self.src, self.src)
+
+    def __str__(self) -> str:
+        return f"{self.target} = {self.src}"
+
+
+@dataclass(slots=True, eq=False)
+class Unary(Instr):
+    target: VReg
+    op: str
+    src: Operand
+
+    @property
+    def dst(self) -> VReg:
+        return self.target
+
+    def uses(self) -> List[Operand]:
+        return [self.src]
+
+    def replace_uses(self, mapping: Dict[VReg, Operand]) -> None:
+        self.src = mapping.get(self.src, self.src)
+
+    def __str__(self) -> str:
+        return f"{self.target} = {self.op} {self.src}"
+
+
+@dataclass(slots=True, eq=False)
+class Binary(Instr):
+    target: VReg
+    op: str
+    lhs: Operand
+    rhs: Operand
+
+    @property
+    def dst(self) -> VReg:
+        return self.target
+
+    def uses(self) -> List[Operand]:
+        return [self.lhs, self.rhs]
+
+    def replace_uses(self, mapping: Dict[VReg, Operand]) -> None:
+        self.lhs = mapping.get(self.lhs, self.lhs)
+        self.rhs = mapping.get(self.rhs, self.rhs)
+
+    def __str__(self) -> str:
+        return f"{self.target} = {self.op} {self.lhs}, {self.rhs}"
+
+
+@dataclass(slots=True, eq=False)
+class Call(Instr):
+    target: VReg
+    callee: str
+    args: List[Operand]
+
+    @property
+    def dst(self) -> VReg:
+        return self.target
+
+    def uses(self) -> List[Operand]:
+        return self.args
+
+    def replace_uses(self, mapping: Dict[VReg, Operand]) -> None:
+        self.args = [mapping.get(arg, arg) for arg in self.args]
+
+    def __str__(self) -> str:
+        return f"{self.target} = call {self.callee}({', '.join(map(str, self.args))})"
+
+
+@dataclass(slots=True, eq=False)
+class Print(Instr):
+    src: Operand
+    kind: str  # "int" or "string"
+
+    def uses(self) -> List[Operand]:
+        return [self.src]
+
+    def replace_uses(self, mapping: Dict[VReg, Operand]) -> None:
+        self.src = mapping.get(self.src, self.src)
+
+    def __str__(self) -> str:
+        return f"print.{self.kind} {self.src}"
+
+
+@dataclass(slots=True, eq=False)
+class Phi(Instr):
+    target: VReg
+    # (predecessor label, value arriving along that edge)
+    incoming: List[Tuple[str, Operand]]
+
+    @property
+    def dst(self) -> VReg:
+        return self.target
+
+    def uses(self) -> List[Operand]:
+        return [value for _, value in self.incoming]
+
+    def replace_uses(self, mapping: Dict[VReg, Operand]) -> None:
+        self.incoming = [(label, mapping.get(value, value)) for label, value in self.incoming]
+
+    def __str__(self) -> str:
+        return f"{self.target} = phi " + ", ".join(f"[{label}: {value}]" for label, value in self.incoming)
+
+
+@dataclass(slots=True, eq=False)
+class Terminator(Instr):
+    def successors(self) -> List[str]:
+        return []
+
+    def retarget(self, old: str, new: str) -> None:
+        pass
+
+
+@dataclass(slots=True, eq=False)
+class Jump(Terminator):
+    label: str
+
+    def successors(self) -> List[str]:
+        return [self.label]
+
+    def retarget(self, old: str, new: str) -> None:
+        if self.label == old:
+            self.label = new
+
+    def __str__(self) -> str:
+        return f"jmp {self.label}"
+
+
+@dataclass(slots=True, eq=False)
+class Branch(Terminator):
+    cond: Operand
+    if_true: str
+    if_false: str
+
+    def uses(self) -> List[Operand]:
+        return [self.cond]
+
+    def replace_uses(self, mapping: Dict[VReg, Operand]) -> None:
+        self.cond = mapping.get(self.cond, self.cond)
+
+    def successors(self) -> List[str]:
+        return [self.if_true, self.if_false]
+
+    def retarget(self, old: str, new: str) -> None:
+        if self.if_true == old:
+            self.if_true = new
+        if self.if_false == old:
+            self.if_false = new
+
+    def __str__(self) -> str:
+        return f"br {self.cond}, {self.if_true}, {self.if_false}"
+
+
+@dataclass(slots=True, eq=False)
+class Return(Terminator):
+    value: Operand
+
+    def uses(self) -> List[Operand]:
+        return [self.value]
+
+    def replace_uses(self, mapping: Dict[VReg, Operand]) -> None:
+        self.value = mapping.get(self.value, self.value)
+
+    def __str__(self) -> str:
+        return f"ret {self.value}"
+
+
+@dataclass(slots=True, eq=False)
+class TailCall(Terminator):
+    """Call ``callee`` and return its result, reusing the caller's frame where the ABI allows."""
+
+    callee: str
+    args: List[Operand]
+
+    def uses(self) -> List[Operand]:
+        return self.args
+
+    def replace_uses(self, mapping: Dict[VReg, Operand]) -> None:
+        self.args = [mapping.get(arg, arg) for arg in self.args]
+
+    def __str__(self) -> str:
+        return f"tailcall {self.callee}({', '.join(map(str, self.args))})"
+
+
+@dataclass(slots=True, eq=False)
+class Block:
+    label: str
+    instrs: List[Instr] = field(default_factory=list)
+
+    @property
+    def terminator(self) -> Optional[Terminator]:
+        last = self.instrs[-1] if self.instrs else None
+        return last if isinstance(last, Terminator) else None
+
+    def successors(self) -> List[str]:
+        term = self.terminator
+        return term.successors() if term is not None else []
+
+    def phis(self) -> Iterator[Phi]:
+        for instr in self.instrs:
+            if not isinstance(instr, Phi):
+                return
+            yield instr
+
+
+@dataclass(slots=True, eq=False)
+class Function:
+    name: str
+    params: List[VReg]
+    blocks: List[Block] = field(default_factory=list)
+    ssa: bool = False
+    next_vreg: int = 0
+    next_block: int = 0
+
+    @property
+    def entry(self) -> Block:
+        return self.blocks[0]
+
+    def new_vreg(self, name: Optional[str] = None) -> VReg:
+        vreg = VReg(self.next_vreg, name or f"t{self.next_vreg}")
+        self.next_vreg += 1
+        return vreg
+
+    def new_block(self, hint: str = "B") -> Block:
+        block = Block(f"{hint}{self.next_block}")
+        self.next_block += 1
+        return block
+
+    def block_map(self) -> Dict[str, Block]:
+        return {block.label: block for block in self.blocks}
+
+
+def callees(fn: Function) -> List[str]:
+    """Functions ``fn`` calls or tail-calls, in order of first call."""
+    names: Dict[str, None] = {}
+    for block in fn.blocks:
+        for instr in block.instrs:
+            if isinstance(instr, (Call, TailCall)):
+                names.setdefault(instr.callee)
+    return list(names)
+
+
+def predecessors(fn: Function) -> Dict[str, List[str]]:
+    preds: Dict[str, List[str]] = {block.label: [] for block in fn.blocks}
+    for block in fn.blocks:
+        for succ in block.successors():
+            if block.label not in preds[succ]:
+                preds[succ].append(block.label)
+    return preds
+
+
+def reverse_postorder(fn: Function) -> List[Block]:
+    """Blocks reachable from the entry, in reverse postorder."""
+    blocks = fn.block_map()
+    seen = {fn.entry.label}
+    order: List[Block] = []
+    stack = [(fn.entry, iter(fn.entry.successors()))]
+    while stack:
+        block, succs = stack[-1]
+        label = next(succs, None)
+        if label is None:
+            stack.pop()
+            order.append(block)
+        elif label not in seen:
+            seen.add(label)
+            succ = blocks[label]
+            stack.append((succ, iter(succ.successors())))
+    order.reverse()
+    return order
+
+
+def remove_unreachable(fn: Function) -> bool:
+    reachable = {block.label for block in reverse_postorder(fn)}
+    if len(reachable) == len(fn.blocks):
+        return False
+    fn.blocks = [block for block in fn.blocks if block.label in reachable]
+    for block in fn.blocks:
+        for phi in block.phis():
+            phi.incoming = [(label, value) for label, value in phi.incoming if label in reachable]
+    return True
+
+
+def merge_blocks(fn: Function) -> bool:
+    """Append each block that is only reached by a jump from one block to that block.
+
+    A merged block's phis have a single incoming value and become copies.
+    """
+    blocks = fn.block_map()
+    preds = predecessors(fn)
+    changed = False
+    for block in fn.blocks:
+        if block.label not in blocks:
+            continue
+        while isinstance(block.terminator, Jump):
+            succ = blocks[block.terminator.label]
+            if succ is fn.entry or succ is block or len(preds[succ.label]) != 1:
+                break
+            block.instrs.pop()
+            for instr in succ.instrs:
+                if isinstance(instr, Phi):
+                    instr = Copy(instr.target, instr.incoming[0][1])
+                block.instrs.append(instr)
+            for label in succ.successors():
+                preds[label] = [block.label if pred == succ.label else pred for pred in preds[label]]
+                for phi in blocks[label].phis():
+                    phi.incoming = [(block.label if pred == succ.label else pred, v) for pred, v in phi.incoming]
+            del blocks[succ.label]
+            changed = True
+    if changed:
+        fn.blocks = [block for block in fn.blocks if block.label in blocks]
+    return changed
+
+
+def dominators(fn: Function) -> Dict[str, Optional[str]]:
+    """Immediate dominator of every reachable block (the entry maps to None).
+
+    Cooper, Harvey and Kennedy's iterative algorithm over reverse postorder.
+    """
+    order = reverse_postorder(fn)
+    index = {block.label: idx for idx, block in enumerate(order)}
+    preds = predecessors(fn)
+    idom: Dict[str, Optional[str]] = {order[0].label: order[0].label}
+
+    def intersect(a: str, b: str) -> str:
+        while a != b:
+            while index[a] > index[b]:
+                a = idom[a]
+            while index[b] > index[a]:
+                b = idom[b]
+        return a
+
+    changed = True
+    while changed:
+        changed = False
+        for block in order[1:]:
+            new_idom = None
+            for pred in preds[block.label]:
+                if pred not in idom:
+                    continue
+                new_idom = pred if new_idom is None else intersect(pred, new_idom)
+            if idom.get(block.label) != new_idom:
+                idom[block.label] = new_idom
+                changed = True
+    idom[order[0].label] = None
+    return idom
+
+
+def dominator_children(idom: Dict[str, Optional[str]]) -> Dict[str, List[str]]:
+    children: Dict[str, List[str]] = {label: [] for label in idom}
+    for label, parent in idom.items():
+        if parent is not None:
+            children[parent].append(label)
+    return children
+
+
+def dominance_frontiers(fn: Function, idom: Dict[str, Optional[str]]) -> Dict[str, Set[str]]:
+    preds = predecessors(fn)
+    frontiers: Dict[str, Set[str]] = {label: set() for label in idom}
+    for label in idom:
+        block_preds = [pred for pred in preds[label] if pred in idom]
+        if len(block_preds) < 2:
+            continue
+        for pred in block_preds:
+            runner = pred
+            while runner != idom[label]:
+                frontiers[runner].add(label)
+                runner = idom[runner]
+    return frontiers
+
+
+def liveness(fn: Function) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Live-in and live-out sets of every block, as bitsets over vreg ids.
+
+    Phi operands are live out of the matching predecessor rather than into
+    the phi's block.
+    """
+    gen: Dict[str, int] = {}
+    kill: Dict[str, int] = {}
+    phi_uses: Dict[str, int] = {block.label: 0 for block in fn.blocks}
+    for block in fn.blocks:
+        used = defined = 0
+        for instr in block.instrs:
+            if isinstance(instr, Phi):
+                for label, value in instr.incoming:
+                    if isinstance(value, VReg):
+                        phi_uses[label] |= 1 << value.id
+            else:
+                for value in instr.uses():
+                    if isinstance(value, VReg) and not defined >> value.id & 1:
+                        used |= 1 << value.id
+            dst = instr.dst
+            if dst is not None:
+                defined |= 1 << dst.id
+        gen[block.label] = used
+        kill[block.label] = defined
+    live_in = {block.label: 0 for block in fn.blocks}
+    live_out = {block.label: 0 for block in fn.blocks}
+    order = [block.label for block in reversed(reverse_postorder(fn))]
+    succs = {block.label: block.successors() for block in fn.blocks}
+    changed = True
+    while changed:
+        changed = False
+        for label in order:
+            out = phi_uses[label]
+            for succ in succs[label]:
+                out |= live_in[succ]
+            new_in = gen[label] | (out & ~kill[label])
+            if out != live_out[label] or new_in != live_in[label]:
+                live_out[label] = out
+                live_in[label] = new_in
+                changed = True
+    return live_in, live_out
+
+
+def iter_bits(bits: int) -> Iterator[int]:
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def format_function(fn: Function) -> str:
+    lines = [f"fn {fn.name}({', '.join(map(str, fn.params))}) {{"]
+    for block in fn.blocks:
+        lines.append(f"{block.label}:")
+        lines.extend(f"    {instr}" for instr in block.instrs)
+    lines.append("}")
+    return "\n".join(lines)
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+from . import ir
+from .loopopt import hoist_invariants, unroll_loops
+from .optimize import INT_MIN, wrap_int
+from .ssa import from_ssa, to_ssa
+from .strength import lower_arithmetic, reduce_induction_variables
+from .valnum import ValueNumberingStats, number_values_globally, number_values_locally
+from .verify import verify
+
+IRPass = Callable[[ir.Function], bool]
+
+# How far value numbering looks for an earlier result: nowhere, in the same
+# block, or (in SSA form, so from -O2) also in dominating blocks.
+VALUE_NUMBERING_MODES = ("off", "local", "global")
+
+
+def _resolve(mapping: Dict[ir.VReg, ir.Operand], value: ir.Operand) -> ir.Operand:
+    while isinstance(value, ir.VReg) and value in mapping:
+        value = mapping[value]
+    return value
+
+
+def propagate_copies(fn: ir.Function) -> bool:
+    """Forward the source of every copy (and trivial phi) to the copy's uses. SSA only."""
+    mapping: Dict[ir.VReg, ir.Operand] = {}
+    changed = True
+    while changed:
+        changed = False
+        for block in fn.blocks:
+            for instr in block.instrs:
+                dst = instr.dst
+                if dst is None or dst in mapping:
+                    continue
+                if isinstance(instr, ir.Copy):
+                    mapping[dst] = _resolve(mapping, instr.src)
+                    changed = True
+                elif isinstance(instr, ir.Phi):
+                    # A phi whose operands are all one value (or itself) is that value.
+                    values = {_resolve(mapping, value) for _, value in instr.incoming} - {dst}
+                    if len(values) == 1:
+                        mapping[dst] = values.pop()
+                        changed = True
+    if not mapping:
+        return False
+    for block in fn.blocks:
+        kept: List[ir.Instr] = []
+        for instr in block.instrs:
+            if instr.dst is not None and instr.dst in mapping:
+                continue
+            instr.replace_uses({value: _resolve(mapping, value) for value in instr.uses() if value in mapping})
+            kept.append(instr)
+        block.instrs = kept
+    return True
+
+
+def fold_binary(op: str, a: int, b: int) -> Optional[int]:
+    """Value of ``a op b`` with the generated code's semantics, or None if it must trap at runtime."""
+    if op == "add":
+        return wrap_int(a + b)
+    if op == "sub":
+        return wrap_int(a - b)
+    if op == "mul":
+        return wrap_int(a * b)
+    if op == "div":
+        if b == 0 or (a == INT_MIN and b == -1):
+            return None
+        quotient = abs(a) // abs(b)
+        return quotient if (a < 0) == (b < 0) else -quotient
+    if op == "shl":
+        return wrap_int(a << (b & 63))
+    if op == "sar":
+        return a >> (b & 63)
+    if op == "shr":
+        return wrap_int((a & _MASK) >> (b & 63))
+    if op == "mulhs":
+        return (a * b) >> 64
+    return int(_COMPARE[op](a, b))
+
+
+_MASK = (1 << 64) - 1
+
+
+_COMPARE: Dict[str, Callable[[int, int], bool]] = {
+    "eq": lambda a, b: a == b,
+    "ne": lambda a, b: a != b,
+    "lt": lambda a, b: a < b,
+    "le": lambda a, b: a <= b,
+    "gt": lambda a, b: a > b,
+    "ge": lambda a, b: a >= b,
+}
+
+
+def fold_constants(fn: ir.Function) -> bool:
+    """Replace operations on constants by copies of their value and fold constant branches. SSA only.
+
+    Blocks are visited in reverse postorder, where definitions come before
+    their uses (apart from phis on loop edges), so a constant computed by a
+    chain of operations folds in one pass.
+    """
+    consts: Dict[ir.VReg, ir.Operand] = {}
+    changed = False
+    for block in ir.reverse_postorder(fn):
+        for idx, instr in enumerate(block.instrs):
+            if not isinstance(instr, ir.Phi):
+                replaced = {value: consts[value] for value in instr.uses() if value in consts}
+                if replaced:
+                    instr.replace_uses(replaced)
+                    changed = True
+            value: Optional[int] = None
+            if isinstance(instr, ir.Copy) and isinstance(instr.src, ir.Imm):
+                consts[instr.target] = instr.src
+            elif isinstance(instr, ir.Binary) and isinstance(instr.lhs, ir.Imm) and isinstance(instr.rhs, ir.Imm):
+                value = fold_binary(instr.op, instr.lhs.value, instr.rhs.value)
+            elif isinstance(instr, ir.Unary) and isinstance(instr.src, ir.Imm):
+                value = wrap_int(-instr.src.value) if instr.op == "neg" else int(instr.src.value == 0)
+            if value is not None:
+                block.instrs[idx] = ir.Copy(instr.target, ir.Imm(value))
+                consts[instr.target] = ir.Imm(value)
+                changed = True
+        term = block.terminator
+        if isinstance(term, ir.Branch) and isinstance(term.cond, ir.Imm):
+            taken, skipped = (term.if_true, term.if_false) if term.cond.value else (term.if_false, term.if_true)
+            block.instrs[-1] = ir.Jump(taken)
+            if skipped != taken:
+                for phi in fn.block_map()[skipped].phis():
+                    phi.incoming = [(label, v) for label, v in phi.incoming if label != block.label]
+            changed = True
+    if changed:
+        ir.remove_unreachable(fn)
+        ir.merge_blocks(fn)
+    return changed
+
+
+def _has_side_effects(instr: ir.Instr) -> bool:
+    if isinstance(instr, (ir.Call, ir.Print, ir.Terminator)):
+        return True
+    if isinstance(instr, ir.Binary) and instr.op == "div":
+        # Division by zero or INT_MIN / -1 traps, which is observable.
+        return not (isinstance(instr.rhs, ir.Imm) and instr.rhs.value not in (0, -1))
+    return False
+
+
+def eliminate_dead_code(fn: ir.Function) -> bool:
+    """Remove instructions whose results are never used and that have no side effects. SSA only."""
+    defining: Dict[int, ir.Instr] = {}
+    for block in fn.blocks:
+        for instr in block.instrs:
+            if instr.dst is not None:
+                defining[instr.dst.id] = instr
+    live = set()
+    work = [instr for block in fn.blocks for instr in block.instrs if _has_side_effects(instr)]
+    while work:
+        instr = work.pop()
+        if id(instr) in live:
+            continue
+        live.add(id(instr))
+        for value in instr.uses():
+            if isinstance(value, ir.VReg) and value.id in defining:
+                work.append(defining[value.id])
+    changed = False
+    for block in fn.blocks:
+        kept = [instr for instr in block.instrs if id(instr) in live]
+        if len(kept) != len(block.instrs):
+            block.instrs = kept
+            changed = True
+    return changed
+
+
+def _value_numbering(mode: str, ssa: bool, stats: Optional[ValueNumberingStats]) -> List[IRPass]:
+    if mode == "off":
+        return []
+    run = number_values_globally if mode == "global" and ssa else number_values_locally
+    return [partial(run, stats=stats)]
+
+
+def ssa_pipeline(
+    level: int,
+    value_numbering: str = "local",
+    stats: Optional[ValueNumberingStats] = None,
+    hoist: bool = True,
+) -> List[IRPass]:
+    """SSA passes run at optimization ``level``, in order; ``hoist`` enables loop-invariant code motion."""
+    if level < 2:
+        return []
+    return [
+        fold_constants,
+        *_value_numbering(value_numbering, True, stats),
+        *([hoist_invariants] if hoist else []),
+        reduce_induction_variables,
+        propagate_copies,
+        eliminate_dead_code,
+    ]
+
+
+def lowering_pipeline(
+    level: int, value_numbering: str = "local", stats: Optional[ValueNumberingStats] = None
+) -> List[IRPass]:
+    """Passes run at ``level`` once out of SSA form, rewriting operations into cheaper ones.
+
+    Without SSA passes (-O1), value numbering runs here, within blocks.
+    """
+    if level < 1:
+        return []
+    if level < 2:
+        return [*_value_numbering(value_numbering, False, stats), lower_arithmetic]
+    return [lower_arithmetic]
+
+
+# The SSA passes repeat while any of them changes something, up to this many rounds.
+MAX_ROUNDS = 4
+
+
+def optimize_ir(
+    fn: ir.Function,
+    level: int,
+    check: bool = False,
+    value_numbering: str = "local",
+    stats: Optional[ValueNumberingStats] = None,
+    unroll: int = 1,
+    hoist: bool = True,
+) -> None:
+    """Run the IR passes for ``level`` on ``fn``, leaving it out of SSA form.
+
+    With ``check``, the IR is verified after every step. Expressions that
+    value numbering (one of :data:`VALUE_NUMBERING_MODES`) reuses are
+    counted in ``stats``. Counted loops are unrolled ``unroll`` times
+    first, and ``hoist`` moves loop-invariant code out of loops at -O2.
+    """
+    if unroll_loops(fn, unroll) and check:
+        verify(fn)
+    passes = ssa_pipeline(level, value_numbering, stats, hoist)
+    if passes:
+        to_ssa(fn)
+        if check:
+            verify(fn)
+        for _ in range(MAX_ROUNDS):
+            changed = False
+            for run_pass in passes:
+                changed |= run_pass(fn)
+                if check:
+                    verify(fn)
+            if not changed:
+                break
+        from_ssa(fn)
+        if check:
+            verify(fn)
+    for run_pass in lowering_pipeline(level, value_numbering, stats):
+        if run_pass(fn) and check:
+            verify(fn)
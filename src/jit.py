@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import ctypes
+import dataclasses
+import mmap
+import platform
+import struct
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from .driver import EMIT_MACHINE_CODE, CompileOptions, compile_source
+from .encoder import MachineCode
+from .errors import CompileError
+
+# Running Nova programs in this process, from memory.
+#
+# The encoded program is copied into an anonymous mapping laid out as
+#
+#     .text | .rodata | one stub per libc function
+#
+# and relocated for where it landed: references to .rodata become plain
+# rip-relative offsets, and calls to printf or puts go to a stub that jumps
+# through the function's absolute address in the host's libc, which may be
+# further away than a rel32 reaches. The mapping is then made read-only and
+# executable, and main is called through ctypes like any C function.
+
+_PROT_READ, _PROT_WRITE, _PROT_EXEC = 0x1, 0x2, 0x4
+_MAP_PRIVATE, _MAP_ANONYMOUS = 0x02, 0x20
+# jmp qword ptr [rip + 0], followed by the 8-byte target.
+_STUB = b"\xff\x25\0\0\0\0"
+_STUB_SIZE = 16
+
+
+def _align(value: int, alignment: int) -> int:
+    return -(-value // alignment) * alignment
+
+
+def _libc() -> ctypes.CDLL:
+    if sys.platform != "linux" or platform.machine() not in ("x86_64", "AMD64"):
+        raise CompileError("Running in-process needs an x86-64 Linux host")
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.mmap.restype = ctypes.c_void_p
+    libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+    libc.mprotect.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int]
+    libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+    libc.fflush.argtypes = [ctypes.c_void_p]
+    return libc
+
+
+class JitProgram:
+    """A program's machine code loaded into executable memory; :meth:`run` calls its ``main``.
+
+    Unmapped by :meth:`close`, or on leaving a ``with`` block.
+    """
+
+    def __init__(self, code: MachineCode):
+        self.libc = _libc()
+        text = code.text
+        rodata_at = _align(len(text.code), 16)
+        stubs_at = _align(rodata_at + len(code.rodata), 16)
+        externals = sorted({reloc.symbol for reloc in text.relocations if reloc.symbol not in code.rodata_labels})
+        stubs: Dict[str, int] = {name: stubs_at + idx * _STUB_SIZE for idx, name in enumerate(externals)}
+        self.size = _align(stubs_at + len(stubs) * _STUB_SIZE, mmap.PAGESIZE)
+        self.functions = {name: text.labels[name] for name in code.functions}
+
+        image = bytearray(self.size)
+        image[: len(text.code)] = text.code
+        image[rodata_at : rodata_at + len(code.rodata)] = code.rodata
+        for name, offset in stubs.items():
+            image[offset : offset + 14] = _STUB + struct.pack("<Q", self._resolve(name))
+        for reloc in text.relocations:
+            if reloc.symbol in code.rodata_labels:
+                target = rodata_at + code.rodata_labels[reloc.symbol]
+            else:
+                target = stubs[reloc.symbol]
+            image[reloc.offset : reloc.offset + 4] = struct.pack("<i", target + reloc.addend - reloc.offset)
+
+        address = self.libc.mmap(None, self.size, _PROT_READ | _PROT_WRITE, _MAP_PRIVATE | _MAP_ANONYMOUS, -1, 0)
+        if address is None or address == ctypes.c_void_p(-1).value:
+            raise OSError(ctypes.get_errno(), "mmap failed")
+        self.address: Optional[int] = address
+        ctypes.memmove(address, bytes(image), self.size)
+        if self.libc.mprotect(address, self.size, _PROT_READ | _PROT_EXEC) != 0:
+            errno = ctypes.get_errno()
+            self.close()
+            raise OSError(errno, "mprotect failed")
+
+    def _resolve(self, name: str) -> int:
+        try:
+            return ctypes.cast(getattr(self.libc, name), ctypes.c_void_p).value
+        except AttributeError:
+            raise CompileError(f"Undefined function '{name}' (not in the host C library)") from None
+
+    def run(self, entry: str = "main") -> int:
+        """Call ``entry`` and return what it returns; the C library's output is flushed afterwards."""
+        if self.address is None:
+            raise ValueError("the program was closed")
+        if entry not in self.functions:
+            raise CompileError(f"No function '{entry}' to run")
+        function = ctypes.CFUNCTYPE(ctypes.c_long)(self.address + self.functions[entry])
+        # Python's buffered output first, so the two streams come out in order.
+        sys.stdout.flush()
+        try:
+            return function()
+        finally:
+            self.libc.fflush(None)
+
+    def close(self) -> None:
+        if self.address is not None:
+            self.libc.munmap(self.address, self.size)
+            self.address = None
+
+    def __enter__(self) -> "JitProgram":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+@dataclass
+class JitResult:
+    status: int
+    # Seconds spent compiling and loading the program, and running it.
+    compile_seconds: float
+    run_seconds: float
+
+
+def run_source(source: str, options: Optional[CompileOptions] = None) -> JitResult:
+    """Compile ``source`` and run its ``main`` in this process; its output goes to this process's stdout."""
+    options = dataclasses.replace(options or CompileOptions(), emit=EMIT_MACHINE_CODE)
+    start = time.perf_counter()
+    code = compile_source(source, options)
+    with JitProgram(code) as program:
+        loaded = time.perf_counter()
+        status = program.run()
+        finished = time.perf_counter()
+    return JitResult(status, loaded - start, finished - loaded)
@@ -1,113 +1,111 @@
 from __future__ import annotations
 
-import string
-from typing import List
+import re
+from array import array
 
 from .errors import LexError
-from .tokens import KEYWORDS, Token
+from .tokens import (
+    KEYWORD_KINDS,
+    OPERATOR_KINDS,
+    TK_EOF,
+    TK_IDENT,
+    TK_INT_LIT,
+    TK_STRING_LIT,
+    LineIndex,
+    TokenBuffer,
+)
 
 
-def tokenize(source: str) -> List[Token]:
-    tokens: List[Token] = []
-    i = 0
-    line = 1
-    col = 1
+# Leading whitespace and comments are folded into each match, so one
+# ``finditer`` step produces one token. The skip run is captured in a
+# lookahead and re-consumed by backreference, which makes it atomic: the
+# engine can never give back part of a comment to satisfy the token groups.
+# The token itself is exactly one of the numbered groups and ``lastindex``
+# says which; ERROR catches anything the others reject and END absorbs
+# trailing whitespace so it is consumed in one step.
+_MASTER = re.compile(
+    r"""
+    (?=((?:[ \t\r\n]+|//[^\n]*)*))\1
+    (?:
+        (\d+)
+      | ([A-Za-z_]\w*)
+      | ("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (==|!=|<=|>=|&&|\|\||->|[-+*/<>=(){},;:!])
+      | (.)
+      | (\Z)
+    )
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+_G_INT, _G_IDENT, _G_STRING, _G_OP, _G_ERROR, _G_END = range(2, 8)
 
-    def advance(n: int = 1):
-        nonlocal i, line, col
-        for _ in range(n):
-            if source[i] == "\n":
-                line += 1
-                col = 1
-            else:
-                col += 1
-            i += 1
 
-    while i < len(source):
-        ch = source[i]
-        if ch in " \t\r":
-            advance()
-            continue
-        if ch == "\n":
-            advance()
-            continue
-        if ch == "/" and i + 1 < len(source) and source[i + 1] == "/":
-            while i < len(source) and source[i] != "\n":
-                advance()
-            continue
-        if ch.isdigit():
-            start_col = col
-            num = ch
-            advance()
-            while i < len(source) and source[i].isdigit():
-                num += source[i]
-                advance()
-            tokens.append(Token("INT", num, line, start_col))
-            continue
-        if ch == '"' or ch == "'":
-            quote = ch
-            start_col = col
-            advance()
-            val = ""
-            while i < len(source) and source[i] != quote:
-                if source[i] == "\\" and i + 1 < len(source):
-                    nxt = source[i + 1]
-                    if nxt == "n":
-                        val += "\n"
-                    elif nxt == "t":
-                        val += "\t"
-                    else:
-                        val += nxt
-                    advance(2)
-                else:
-                    val += source[i]
-                    advance()
-            if i >= len(source) or source[i] != quote:
-                raise LexError(f"Unterminated string at line {line}, col {start_col}")
-            advance()  # consume closing quote
-            tokens.append(Token("STRING", val, line, start_col))
-            continue
-        if ch in string.ascii_letters or ch == "_":
-            start_col = col
-            ident = ch
-            advance()
-            while i < len(source) and (source[i].isalnum() or source[i] == "_"):
-                ident += source[i]
-                advance()
-            if ident in KEYWORDS:
-                tokens.append(Token(ident.upper(), ident, line, start_col))
-            else:
-                tokens.append(Token("IDENT", ident, line, start_col))
-            continue
-        # multi-char operators
-        two = source[i : i + 2]
-        if two in ("==", "!=", "<=", ">=", "&&", "||", "->"):
-            tokens.append(Token(two, two, line, col))
-            advance(2)
-            continue
-        # single-char
-        single = {
-            "+": "PLUS",
-            "-": "MINUS",
-            "*": "STAR",
-            "/": "SLASH",
-            "<": "LT",
-            ">": "GT",
-            "=": "ASSIGN",
-            "(": "LPAREN",
-            ")": "RPAREN",
-            "{": "LBRACE",
-            "}": "RBRACE",
-            ",": "COMMA",
-            ";": "SEMICOLON",
-            ":": "COLON",
-            "!": "BANG",
-        }
-        if ch in single:
-            tokens.append(Token(single[ch], ch, line, col))
-            advance()
-            continue
-        raise LexError(f"Unexpected character '{ch}' at line {line}, col {col}")
+def tokenize(source: str) -> TokenBuffer:
+    """Lex ``source`` into a :class:`TokenBuffer` terminated by an EOF token.
 
-    tokens.append(Token("EOF", None, line, col))
-    return tokens
+    Only kinds and offsets are recorded here; the buffer slices values and
+    resolves line/column positions lazily through its :class:`LineIndex`.
+    """
+    kinds = array("B")
+    starts = array("I")
+    lengths = array("I")
+    add_kind = kinds.append
+    add_start = starts.append
+    add_length = lengths.append
+    keyword_kinds = KEYWORD_KINDS
+    operator_kinds = OPERATOR_KINDS
+    n = len(source)
+    pos = 0
+    while pos < n:
+        for m in _MASTER.finditer(source, pos):
+            group = m.lastindex
+            start = m.start(group)
+            end = m.end()
+            if group == _G_IDENT:
+                add_kind(keyword_kinds.get(m.group(group), TK_IDENT))
+            elif group == _G_OP:
+                add_kind(operator_kinds[m.group(group)])
+            elif group == _G_INT:
+                if end < n and source[end] > "\x7f" and source[end].isdigit():
+                    pos = start
+                    break
+                add_kind(TK_INT_LIT)
+            elif group == _G_STRING:
+                add_kind(TK_STRING_LIT)
+            elif group == _G_END:
+                pos = n
+                break
+            else:  # _G_ERROR
+                if not source[start].isdigit():
+                    _raise_at(source, start)
+                pos = start
+                break
+            add_start(start)
+            add_length(end - start)
+        else:
+            break
+        if pos < n:
+            # str.isdigit() accepts a few non-decimal digits that \d does not,
+            # so such numbers are finished here and the scan resumes after them.
+            end = pos + 1
+            while end < n and source[end].isdigit():
+                end += 1
+            add_kind(TK_INT_LIT)
+            add_start(pos)
+            add_length(end - pos)
+            pos = end
+    add_kind(TK_EOF)
+    add_start(n)
+    add_length(0)
+    return TokenBuffer(source, kinds, starts, lengths, LineIndex(source))
+
+
+def _raise_at(source: str, pos: int) -> None:
+    index = LineIndex(source)
+    ch = source[pos]
+    if ch == '"' or ch == "'":
+        # The string ran to end of input, so that is the line reported.
+        _, start_col = index.position(pos)
+        raise LexError(f"Unterminated string at line {index.line(len(source))}, col {start_col}")
+    line, col = index.position(pos)
+    raise LexError(f"Unexpected character '{ch}' at line {line}, col {col}")
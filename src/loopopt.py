@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import copy
+from typing import Dict, List, Optional, Tuple
+
+from . import ir
+from .loops import Loop, ensure_preheader, find_loops
+from .optimize import INT_MAX, wrap_int
+from .strength import induction_step
+
+# Unroll factor at -O2 unless --unroll says otherwise.
+DEFAULT_UNROLL = 4
+# Largest loop body, in instructions, that is unrolled.
+MAX_UNROLL_BODY = 24
+
+# Comparisons the loop test may use, with the one that holds when the
+# operands are swapped and the one that holds when the result is negated.
+_MIRRORED = {"lt": "gt", "le": "ge", "gt": "lt", "ge": "le"}
+_NEGATED = {"lt": "ge", "le": "gt", "gt": "le", "ge": "lt"}
+
+
+def _may_trap(instr: ir.Instr) -> bool:
+    return instr.op == "div" and not (isinstance(instr.rhs, ir.Imm) and instr.rhs.value not in (0, -1))
+
+
+def hoist_invariants(fn: ir.Function) -> bool:
+    """Move computations whose operands don't change inside a loop to its preheader. SSA only.
+
+    Only arithmetic that cannot trap moves, since the preheader runs even
+    when the loop body doesn't. Inner loops go first, and loops are found
+    again after each one that changed, so a value hoisted out of an inner
+    loop can then leave the outer one too.
+    """
+    changed = False
+    while any(_hoist_loop(fn, loop) for loop in find_loops(fn)):
+        changed = True
+    return changed
+
+
+def _hoist_loop(fn: ir.Function, loop: Loop) -> bool:
+    blocks = [block for block in fn.blocks if block.label in loop.blocks]
+    defined = {instr.dst.id for block in blocks for instr in block.instrs if instr.dst is not None}
+    hoisted: List[ir.Instr] = []
+    found = True
+    while found:
+        found = False
+        for block in blocks:
+            for instr in list(block.instrs):
+                if not isinstance(instr, (ir.Binary, ir.Unary)) or _may_trap(instr):
+                    continue
+                if any(isinstance(value, ir.VReg) and value.id in defined for value in instr.uses()):
+                    continue
+                block.instrs.remove(instr)
+                hoisted.append(instr)
+                defined.discard(instr.dst.id)
+                found = True
+    if not hoisted:
+        return False
+    preheader = ensure_preheader(fn, loop)
+    preheader.instrs[-1:-1] = hoisted
+    return True
+
+
+def unroll_loops(fn: ir.Function, factor: int) -> bool:
+    """Unroll each small counted innermost loop ``factor`` times, keeping the loop for the remainder. Not SSA.
+
+    A counted loop tests ``i < n`` (or ``<=``, ``>``, ``>=``) in its header,
+    where ``n`` is not assigned in the loop and ``i`` is assigned once, by
+    ``i = i + step`` on every iteration with a constant step in the
+    direction of the test; the header computes nothing else that is used
+    elsewhere, and only the header leaves the loop. The unrolled loop runs
+    ``factor`` copies of the body per test, as long as ``i`` is at least
+    ``factor - 1`` steps short of ``n``; the original loop then finishes
+    the remaining iterations.
+    """
+    if factor < 2:
+        return False
+    loops = find_loops(fn)
+    headers = {loop.header for loop in loops}
+    # Computed once for all loops: unrolling one loop only adds vregs local
+    # to its preheader and unrolled copies, so the live-out sets of the
+    # other loops' headers and the dominators of their blocks still hold.
+    _, live_out = ir.liveness(fn)
+    idom = ir.dominators(fn)
+    changed = False
+    for loop in loops:
+        if not (headers & loop.blocks) - {loop.header}:
+            changed |= _unroll_loop(fn, loop, factor, live_out, idom)
+    if changed:
+        ir.merge_blocks(fn)
+    return changed
+
+
+def _counted(
+    fn: ir.Function, loop: Loop, live_out: Dict[str, int], idom: Dict[str, Optional[str]]
+) -> Optional[Tuple[str, ir.VReg, ir.Operand, int, str, List[ir.Instr]]]:
+    """``(op, i, n, step, body entry, setup)`` if ``loop`` is counted as described in :func:`unroll_loops`.
+
+    ``n`` may be computed in the header from values the loop doesn't
+    assign; ``setup`` is then the header's instructions computing it.
+    ``live_out`` and ``idom`` are the function's liveness and dominators.
+    """
+    blocks = fn.block_map()
+    header = blocks[loop.header]
+    term = header.terminator
+    if len(loop.latches) != 1 or not isinstance(term, ir.Branch):
+        return None
+    if term.if_true in loop.blocks and term.if_false not in loop.blocks:
+        entry, negate = term.if_true, False
+    elif term.if_false in loop.blocks and term.if_true not in loop.blocks:
+        entry, negate = term.if_false, True
+    else:
+        return None
+    body = loop.blocks - {loop.header}
+    if entry == loop.header or any(succ not in loop.blocks for label in body for succ in blocks[label].successors()):
+        return None
+    if sum(len(blocks[label].instrs) for label in body) > MAX_UNROLL_BODY:
+        return None
+    # The header is skipped between copies of the body, so it may only
+    # compute values used by its own test.
+    test = None
+    for instr in header.instrs[:-1]:
+        if not isinstance(instr, (ir.Binary, ir.Unary, ir.Copy)) or live_out[header.label] >> instr.dst.id & 1:
+            return None
+        if isinstance(instr, ir.Binary) and _may_trap(instr):
+            return None
+        if instr.dst is term.cond:
+            test = instr
+    if not isinstance(test, ir.Binary) or test.op not in _MIRRORED:
+        return None
+
+    defs: Dict[int, List[Tuple[str, ir.Instr]]] = {}
+    for label in loop.blocks:
+        for instr in blocks[label].instrs:
+            if instr.dst is not None:
+                defs.setdefault(instr.dst.id, []).append((label, instr))
+
+    setup: List[ir.Instr] = []
+    seen: List[ir.Instr] = [test]
+
+    def invariant(value: ir.Operand) -> bool:
+        if isinstance(value, ir.Imm) or (isinstance(value, ir.VReg) and value.id not in defs):
+            return True
+        if not isinstance(value, ir.VReg) or len(defs[value.id]) != 1:
+            return False
+        label, instr = defs[value.id][0]
+        if label != loop.header or any(instr is other for other in seen):
+            return any(instr is other for other in setup)
+        seen.append(instr)
+        if not all(invariant(operand) for operand in instr.uses()):
+            return False
+        setup.append(instr)
+        return True
+
+    op = _NEGATED[test.op] if negate else test.op
+    if isinstance(test.lhs, ir.VReg) and invariant(test.rhs):
+        i, n = test.lhs, test.rhs
+    elif isinstance(test.rhs, ir.VReg) and invariant(test.lhs):
+        i, n, op = test.rhs, test.lhs, _MIRRORED[op]
+    else:
+        return None
+    if len(defs.get(i.id, ())) != 1:
+        return None
+    label, update = defs[i.id][0]
+    step = induction_step(update, i)
+    if step is None or label == loop.header or not (step > 0 if op in ("lt", "le") else step < 0):
+        return None
+    latch: Optional[str] = loop.latches[0]
+    while latch is not None and latch != label:
+        latch = idom[latch]
+    if latch is None:
+        return None
+    setup.sort(key=header.instrs.index)
+    return op, i, n, step, entry, setup
+
+
+def _unroll_loop(
+    fn: ir.Function, loop: Loop, factor: int, live_out: Dict[str, int], idom: Dict[str, Optional[str]]
+) -> bool:
+    counted = _counted(fn, loop, live_out, idom)
+    if counted is None:
+        return False
+    op, i, n, step, entry, setup = counted
+    # The unrolled loop runs while i is still factor - 1 steps short of n.
+    distance = (factor - 1) * step
+    if abs(distance) > INT_MAX // 2:
+        return False
+    if isinstance(n, ir.Imm):
+        limit: ir.Operand = ir.Imm(wrap_int(n.value - distance))
+        if (limit.value < n.value) != (distance > 0):
+            return False
+    preheader = ensure_preheader(fn, loop)
+    head = fn.new_block("unrolled")
+    if isinstance(n, ir.VReg):
+        limit = fn.new_vreg(f"{i.name}.limit")
+        preheader.instrs[-1:-1] = [copy.copy(instr) for instr in setup]
+        preheader.instrs.insert(-1, ir.Binary(limit, "sub", n, ir.Imm(distance)))
+        # Skip the unrolled loop if computing the limit wrapped around.
+        fits = fn.new_vreg(f"{i.name}.fits")
+        preheader.instrs[-1:] = [
+            ir.Binary(fits, "lt" if distance > 0 else "gt", limit, n),
+            ir.Branch(fits, head.label, loop.header),
+        ]
+    else:
+        preheader.terminator.retarget(loop.header, head.label)
+
+    body = [block for block in fn.blocks if block.label in loop.blocks and block.label != loop.header]
+    copies: List[ir.Block] = []
+    labels: List[Dict[str, str]] = [
+        {block.label: fn.new_block(f"{block.label}_u").label for block in body} for _ in range(factor)
+    ]
+    for idx, mapping in enumerate(labels):
+        # Each copy continues into the next one instead of back to the test.
+        after = labels[idx + 1][entry] if idx + 1 < factor else head.label
+        for block in body:
+            instrs = [copy.copy(instr) for instr in block.instrs]
+            term = instrs[-1]
+            for succ in set(term.successors()):
+                term.retarget(succ, after if succ == loop.header else mapping[succ])
+            copies.append(ir.Block(mapping[block.label], instrs))
+    test = fn.new_vreg(f"{i.name}.more")
+    head.instrs = [ir.Binary(test, op, i, limit), ir.Branch(test, labels[0][entry], loop.header)]
+    first = min(idx for idx, block in enumerate(fn.blocks) if block.label in loop.blocks)
+    fn.blocks[first:first] = copies + [head]
+    return True
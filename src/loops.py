@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from . import ir
+
+
+@dataclass
+class Loop:
+    """A natural loop: the blocks that reach one of ``latches`` without passing ``header``."""
+
+    header: str
+    blocks: Set[str] = field(default_factory=set)
+    # Blocks in the loop that jump back to the header.
+    latches: List[str] = field(default_factory=list)
+
+
+def find_loops(fn: ir.Function, idom: Optional[Dict[str, Optional[str]]] = None) -> List[Loop]:
+    """Natural loops of ``fn``, one per header, inner loops before the loops containing them.
+
+    A back edge is an edge to a block that dominates its source.
+    """
+    idom = idom if idom is not None else ir.dominators(fn)
+    preds = ir.predecessors(fn)
+
+    def dominates(a: str, b: Optional[str]) -> bool:
+        while b is not None and b != a:
+            b = idom[b]
+        return b == a
+
+    loops: Dict[str, Loop] = {}
+    for block in fn.blocks:
+        if block.label not in idom:
+            continue
+        for succ in block.successors():
+            if dominates(succ, block.label):
+                loop = loops.setdefault(succ, Loop(succ, {succ}))
+                loop.latches.append(block.label)
+                work = [block.label]
+                while work:
+                    label = work.pop()
+                    if label not in loop.blocks:
+                        loop.blocks.add(label)
+                        work.extend(pred for pred in preds[label] if pred in idom)
+    return sorted(loops.values(), key=lambda loop: len(loop.blocks))
+
+
+def ensure_preheader(fn: ir.Function, loop: Loop) -> ir.Block:
+    """The block that all entries into ``loop`` come through, created if there is none.
+
+    A preheader is outside the loop and ends in a jump to the header. A new
+    one takes over every edge from outside; in SSA form the header's phis
+    then receive those edges' values through phis in the preheader.
+    """
+    blocks = fn.block_map()
+    header = blocks[loop.header]
+    outside = [pred for pred in ir.predecessors(fn)[loop.header] if pred not in loop.blocks]
+    if len(outside) == 1 and blocks[outside[0]].successors() == [loop.header]:
+        return blocks[outside[0]]
+    preheader = fn.new_block("preheader")
+    for label in outside:
+        blocks[label].terminator.retarget(loop.header, preheader.label)
+    for phi in header.phis():
+        entering = [(label, value) for label, value in phi.incoming if label not in loop.blocks]
+        if len({value for _, value in entering}) == 1:
+            value = entering[0][1]
+        else:
+            value = fn.new_vreg(phi.target.name)
+            preheader.instrs.append(ir.Phi(value, entering))
+        phi.incoming = [(label, v) for label, v in phi.incoming if label in loop.blocks] + [(preheader.label, value)]
+    preheader.instrs.append(ir.Jump(loop.header))
+    # Loops are laid out with their test last, so the preheader goes before
+    # the loop's first block rather than before its header.
+    first = min(idx for idx, block in enumerate(fn.blocks) if block.label in loop.blocks)
+    fn.blocks.insert(first, preheader)
+    return preheader
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+from typing import Dict, List, Set
+
+from . import ast, ir
+
+
+class Lowering:
+    """Translates one type-checked function into IR.
+
+    Each source variable becomes one vreg, assigned wherever the variable
+    is, mirroring the one-slot-per-name semantics of the language. Every
+    operator result gets a fresh temporary. Expressions are lowered from an
+    explicit work stack, so deeply nested ones don't recurse.
+    """
+
+    def __init__(self, fn: ast.FunctionDef):
+        self.ast_fn = fn
+        self.variables: Dict[str, ir.VReg] = {}
+        self.variable_ids: Set[int] = set()
+        self.fn = ir.Function(fn.name, [])
+        self.fn.params = [self.variable(param.name) for param in fn.params]
+        self.block = self.fn.new_block("entry")
+        self.fn.blocks.append(self.block)
+
+    def variable(self, name: str) -> ir.VReg:
+        vreg = self.variables.get(name)
+        if vreg is None:
+            vreg = self.variables[name] = self.fn.new_vreg(name)
+            self.variable_ids.add(vreg.id)
+        return vreg
+
+    def emit(self, instr: ir.Instr) -> None:
+        self.block.instrs.append(instr)
+
+    def start(self, block: ir.Block) -> None:
+        self.fn.blocks.append(block)
+        self.block = block
+
+    def lower(self) -> ir.Function:
+        self.lower_block(self.ast_fn.body)
+        if self.block.terminator is None:
+            self.emit(ir.Return(ir.Imm(0)))
+        ir.remove_unreachable(self.fn)
+        return self.fn
+
+    def lower_block(self, block: ast.Block) -> None:
+        for stmt in block.statements:
+            self.lower_stmt(stmt)
+
+    def lower_stmt(self, stmt: ast.Stmt) -> None:
+        if isinstance(stmt, (ast.LetStmt, ast.AssignStmt)):
+            self.assign(self.variable(stmt.name), stmt.expr)
+        elif isinstance(stmt, ast.ExprStmt):
+            self.lower_expr(stmt.expr)
+        elif isinstance(stmt, ast.ReturnStmt):
+            value = ir.Imm(0) if stmt.expr is None else self.lower_expr(stmt.expr)
+            self.emit(ir.Return(value))
+            # Anything after a return is unreachable; it is dropped once
+            # the whole function is lowered.
+            self.start(self.fn.new_block("dead"))
+        elif isinstance(stmt, ast.IfStmt):
+            then_block = self.fn.new_block("then")
+            join = self.fn.new_block("endif")
+            else_block = self.fn.new_block("else") if stmt.else_block is not None else join
+            self.lower_cond(stmt.cond, then_block.label, else_block.label)
+            self.start(then_block)
+            self.lower_block(stmt.then_block)
+            self.emit(ir.Jump(join.label))
+            if stmt.else_block is not None:
+                self.start(else_block)
+                self.lower_block(stmt.else_block)
+                self.emit(ir.Jump(join.label))
+            self.start(join)
+        elif isinstance(stmt, ast.WhileStmt):
+            # The test is laid out after the body, so each iteration ends in
+            # one conditional jump back to the body; only entering the loop
+            # jumps forward to the test.
+            header = self.fn.new_block("while")
+            body = self.fn.new_block("body")
+            exit_block = self.fn.new_block("endwhile")
+            self.emit(ir.Jump(header.label))
+            self.start(body)
+            self.lower_block(stmt.body)
+            self.emit(ir.Jump(header.label))
+            self.start(header)
+            self.lower_cond(stmt.cond, body.label, exit_block.label)
+            self.start(exit_block)
+        else:
+            raise ValueError(f"Unhandled statement {stmt}")
+
+    def lower_cond(self, expr: ast.Expr, if_true: str, if_false: str) -> None:
+        """Emit code that jumps to ``if_true`` or ``if_false`` depending on ``expr``.
+
+        ``&&``, ``||``, ``!`` and literals become jumps instead of 0/1
+        values, so a comparison feeds its branch directly. Like
+        :meth:`lower_expr`, this works from an explicit stack.
+        """
+        stack: List[object] = [(expr, if_true, if_false)]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, ir.Block):
+                self.start(item)
+                continue
+            cond, on_true, on_false = item
+            if isinstance(cond, ast.BinaryOp) and cond.op in ("&&", "||"):
+                rhs_block = self.fn.new_block("and" if cond.op == "&&" else "or")
+                if cond.op == "&&":
+                    left_targets = (rhs_block.label, on_false)
+                else:
+                    left_targets = (on_true, rhs_block.label)
+                stack.extend([(cond.right, on_true, on_false), rhs_block, (cond.left, *left_targets)])
+            elif isinstance(cond, ast.UnaryOp) and cond.op == "!":
+                stack.append((cond.expr, on_false, on_true))
+            elif isinstance(cond, ast.BoolLiteral):
+                self.emit(ir.Jump(on_true if cond.value else on_false))
+            else:
+                self.emit(ir.Branch(self.lower_expr(cond), on_true, on_false))
+
+    def assign(self, var: ir.VReg, expr: ast.Expr) -> None:
+        value = self.lower_expr(expr)
+        last = self.block.instrs[-1] if self.block.instrs else None
+        # A temporary computed by the last instruction is written straight
+        # into the variable instead of being copied.
+        if last is not None and last.dst is value and value.id not in self.variable_ids:
+            last.target = var
+            return
+        self.emit(ir.Copy(var, value))
+
+    def lower_expr(self, expr: ast.Expr) -> ir.Operand:
+        """Emit code computing ``expr`` and return the operand holding its value.
+
+        The stack holds expressions still to lower and callables that
+        combine the operands their children left on ``values``.
+        """
+        values: List[ir.Operand] = []
+        stack: List[object] = [expr]
+        while stack:
+            item = stack.pop()
+            if not isinstance(item, ast.Expr):
+                item(values)
+            elif isinstance(item, ast.IntLiteral):
+                values.append(ir.Imm(item.value))
+            elif isinstance(item, ast.BoolLiteral):
+                values.append(ir.Imm(1 if item.value else 0))
+            elif isinstance(item, ast.StringLiteral):
+                values.append(ir.Str(item.value))
+            elif isinstance(item, ast.VarRef):
+                values.append(self.variable(item.name))
+            elif isinstance(item, ast.UnaryOp):
+                stack.append(lambda vals, op=ir.UNARY_OPS[item.op]: self._unary(op, vals))
+                stack.append(item.expr)
+            elif isinstance(item, ast.BinaryOp) and item.op in ("&&", "||"):
+                stack.extend(reversed(self._logical(item)))
+            elif isinstance(item, ast.BinaryOp):
+                stack.append(lambda vals, op=ir.BINARY_OPS[item.op]: self._binary(op, vals))
+                stack.append(item.right)
+                stack.append(item.left)
+            elif isinstance(item, ast.Call):
+                stack.append(lambda vals, call=item: self._call(call, vals))
+                stack.extend(reversed(item.args))
+            else:
+                raise ValueError(f"Unhandled expr {item}")
+        return values.pop()
+
+    def _unary(self, op: str, values: List[ir.Operand]) -> None:
+        dst = self.fn.new_vreg()
+        self.emit(ir.Unary(dst, op, values.pop()))
+        values.append(dst)
+
+    def _binary(self, op: str, values: List[ir.Operand]) -> None:
+        rhs = values.pop()
+        lhs = values.pop()
+        dst = self.fn.new_vreg()
+        self.emit(ir.Binary(dst, op, lhs, rhs))
+        values.append(dst)
+
+    def _call(self, call: ast.Call, values: List[ir.Operand]) -> None:
+        argc = len(call.args)
+        args = values[len(values) - argc :]
+        del values[len(values) - argc :]
+        if call.callee == "print":
+            self.emit(ir.Print(args[0], "string" if call.args[0].inferred_type == "string" else "int"))
+            values.append(ir.Imm(0))
+            return
+        dst = self.fn.new_vreg()
+        self.emit(ir.Call(dst, call.callee, args))
+        values.append(dst)
+
+    def _logical(self, expr: ast.BinaryOp) -> List[object]:
+        """Short-circuit ``&&``/``||`` into a result vreg assigned on both paths."""
+        result = self.fn.new_vreg()
+        rhs_block = self.fn.new_block("rhs")
+        short_block = self.fn.new_block("short")
+        join = self.fn.new_block("logic")
+
+        def branch(values: List[ir.Operand]) -> None:
+            left = values.pop()
+            if expr.op == "&&":
+                self.emit(ir.Branch(left, rhs_block.label, short_block.label))
+            else:
+                self.emit(ir.Branch(left, short_block.label, rhs_block.label))
+            self.start(rhs_block)
+
+        def finish(values: List[ir.Operand]) -> None:
+            self.emit(ir.Copy(result, values.pop()))
+            self.emit(ir.Jump(join.label))
+            self.start(short_block)
+            self.emit(ir.Copy(result, ir.Imm(0 if expr.op == "&&" else 1)))
+            self.emit(ir.Jump(join.label))
+            self.start(join)
+            values.append(result)
+
+        return [expr.left, branch, expr.right, finish]
+
+
+def lower_function(fn: ast.FunctionDef) -> ir.Function:
+    return Lowering(fn).lower()
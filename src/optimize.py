@@ -0,0 +1,382 @@
+from __future__ import annotations
+
+import functools
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+
+from . import ast
+from .walk import child_exprs, iter_block_exprs, iter_exprs, iter_stmts
+
+# Nova ints are 64-bit two's complement; folded results wrap the same way
+# the generated code does.
+INT_MIN = -(1 << 63)
+INT_MAX = (1 << 63) - 1
+
+MAX_OPT_LEVEL = 2
+
+# Known constant value of each variable at the current point, by name. The
+# backend gives every name one frame slot per function, so a `let` in a
+# nested block writes the same variable as an outer one of that name.
+ConstEnv = Dict[str, ast.Expr]
+FunctionPass = Callable[[ast.FunctionDef], bool]
+# Replaces a call whose arguments are folded with its result, or returns it unchanged.
+CallFolder = Callable[[ast.Call], ast.Expr]
+
+
+def wrap_int(value: int) -> int:
+    value &= (1 << 64) - 1
+    return value - (1 << 64) if value > INT_MAX else value
+
+
+def is_const(expr: ast.Expr) -> bool:
+    if isinstance(expr, ast.IntLiteral):
+        return INT_MIN <= expr.value <= INT_MAX
+    return isinstance(expr, ast.BoolLiteral)
+
+
+def is_pure(expr: ast.Expr) -> bool:
+    """True if evaluating ``expr`` can have no effect besides producing its value.
+
+    Division is excluded because it can trap at runtime.
+    """
+    for node in iter_exprs(expr):
+        if isinstance(node, ast.Call):
+            return False
+        if isinstance(node, ast.BinaryOp) and node.op == "/":
+            return False
+    return True
+
+
+def _int(value: int) -> ast.IntLiteral:
+    return ast.IntLiteral(value, inferred_type="int")
+
+
+def _bool(value: bool) -> ast.BoolLiteral:
+    return ast.BoolLiteral(value, inferred_type="bool")
+
+
+def const_expr(value: Union[int, bool]) -> ast.Expr:
+    """A typed literal holding ``value``."""
+    return _bool(value) if isinstance(value, bool) else _int(value)
+
+
+def _copy_const(expr: ast.Expr) -> ast.Expr:
+    return const_expr(expr.value)
+
+
+def _same_const(a: ast.Expr, b: ast.Expr) -> bool:
+    return type(a) is type(b) and a.value == b.value
+
+
+def fold_binary(expr: ast.BinaryOp) -> ast.Expr:
+    """Fold ``expr`` whose operands are already folded; returns ``expr`` if it can't."""
+    op, left, right = expr.op, expr.left, expr.right
+    if op in ("&&", "||"):
+        # Only a constant left operand decides whether the right one runs.
+        if isinstance(left, ast.BoolLiteral):
+            if left.value == (op == "||"):
+                return _bool(left.value)
+            return right
+        if isinstance(right, ast.BoolLiteral) and right.value == (op == "&&"):
+            return left
+        return expr
+    if not (is_const(left) and is_const(right)):
+        return _simplify_identity(expr)
+    value = binary_value(op, left.value, right.value)
+    return expr if value is None else const_expr(value)
+
+
+def binary_value(op: str, a: int, b: int) -> Optional[Union[int, bool]]:
+    """The value of ``a op b`` as the generated code computes it; None for a trapping division."""
+    if op == "+":
+        return wrap_int(a + b)
+    if op == "-":
+        return wrap_int(a - b)
+    if op == "*":
+        return wrap_int(a * b)
+    if op == "/":
+        if b == 0 or (a == INT_MIN and b == -1):
+            return None  # leave the trap to runtime
+        quotient = abs(a) // abs(b)
+        return quotient if (a < 0) == (b < 0) else -quotient
+    if op == "==":
+        return a == b
+    if op == "!=":
+        return a != b
+    if op == "<":
+        return a < b
+    if op == ">":
+        return a > b
+    if op == "<=":
+        return a <= b
+    if op == ">=":
+        return a >= b
+    return None
+
+
+def _simplify_identity(expr: ast.BinaryOp) -> ast.Expr:
+    """``x + 0``, ``x - 0``, ``x * 1``, ``x / 1`` and mirrored forms become ``x``."""
+    left, right = expr.left, expr.right
+    if isinstance(right, ast.IntLiteral):
+        if (expr.op in ("+", "-") and right.value == 0) or (expr.op in ("*", "/") and right.value == 1):
+            return left
+    if isinstance(left, ast.IntLiteral):
+        if (expr.op == "+" and left.value == 0) or (expr.op == "*" and left.value == 1):
+            return right
+    return expr
+
+
+def fold_unary(expr: ast.UnaryOp) -> ast.Expr:
+    inner = expr.expr
+    if expr.op == "-":
+        if is_const(inner) and isinstance(inner, ast.IntLiteral):
+            return _int(wrap_int(-inner.value))
+        if isinstance(inner, ast.UnaryOp) and inner.op == "-":
+            return inner.expr
+    elif expr.op == "!":
+        if isinstance(inner, ast.BoolLiteral):
+            return _bool(not inner.value)
+        if isinstance(inner, ast.UnaryOp) and inner.op == "!":
+            return inner.expr
+    return expr
+
+
+def fold_expr(
+    expr: ast.Expr, env: Optional[ConstEnv] = None, fold_call: Optional[CallFolder] = None
+) -> Tuple[ast.Expr, int]:
+    """Fold constant subexpressions of ``expr``, bottom-up.
+
+    With ``env``, variables known to hold a constant are replaced by it
+    first; with ``fold_call``, calls are offered to it once their arguments
+    are folded. Composite nodes are updated in place; the returned node replaces
+    ``expr`` in its parent, along with the number of rewrites made. Uses an
+    explicit stack, so deep trees are fine.
+    """
+    rewrites = 0
+    results: List[ast.Expr] = []
+    stack: List[Tuple[ast.Expr, bool]] = [(expr, False)]
+    while stack:
+        node, ready = stack.pop()
+        if not ready:
+            children = child_exprs(node)
+            if children:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(children))
+            elif env is not None and isinstance(node, ast.VarRef) and node.name in env:
+                results.append(_copy_const(env[node.name]))
+                rewrites += 1
+            else:
+                results.append(node)
+            continue
+        if isinstance(node, ast.BinaryOp):
+            node.right = results.pop()
+            node.left = results.pop()
+            folded = fold_binary(node)
+        elif isinstance(node, ast.UnaryOp):
+            node.expr = results.pop()
+            folded = fold_unary(node)
+        else:  # Call
+            argc = len(node.args)
+            node.args = results[len(results) - argc :]
+            del results[len(results) - argc :]
+            folded = node if fold_call is None else fold_call(node)
+        if folded is not node:
+            rewrites += 1
+        results.append(folded)
+    return results.pop(), rewrites
+
+
+def assigned_names(block: ast.Block) -> Set[str]:
+    return {stmt.name for stmt in iter_stmts(block) if isinstance(stmt, (ast.LetStmt, ast.AssignStmt))}
+
+
+class Simplifier:
+    """Folds constants and control flow in one forward walk over a function.
+
+    Conditions that fold to a constant select their branch in place (or drop
+    the loop), and statements after one that always returns are removed.
+    With ``propagate``, constants bound by ``let`` or assignment also flow
+    into later uses of the variable until it may have been reassigned.
+    ``fold_call`` (see :func:`fold_expr`) may replace calls by their results.
+    """
+
+    def __init__(self, propagate: bool = False, fold_call: Optional[CallFolder] = None):
+        self.propagate = propagate
+        self.fold_call = fold_call
+        self.changed = False
+
+    def run(self, fn: ast.FunctionDef) -> bool:
+        self.changed = False
+        fn.body.statements, _ = self.block(fn.body.statements, {} if self.propagate else None)
+        return self.changed
+
+    def _fold(self, expr: ast.Expr, env: Optional[ConstEnv]) -> ast.Expr:
+        folded, rewrites = fold_expr(expr, env, self.fold_call)
+        if rewrites:
+            self.changed = True
+        return folded
+
+    def block(self, stmts: List[ast.Stmt], env: Optional[ConstEnv]) -> Tuple[List[ast.Stmt], bool]:
+        """Simplify ``stmts``; also reports whether control never falls off the end."""
+        out: List[ast.Stmt] = []
+        for idx, stmt in enumerate(stmts):
+            if self.stmt(stmt, env, out):
+                if idx + 1 < len(stmts):
+                    self.changed = True
+                return out, True
+        return out, False
+
+    def stmt(self, stmt: ast.Stmt, env: Optional[ConstEnv], out: List[ast.Stmt]) -> bool:
+        """Append the simplified ``stmt`` to ``out``; True if it always returns."""
+        if isinstance(stmt, (ast.LetStmt, ast.AssignStmt)):
+            stmt.expr = self._fold(stmt.expr, env)
+            if env is not None:
+                if is_const(stmt.expr):
+                    env[stmt.name] = stmt.expr
+                else:
+                    env.pop(stmt.name, None)
+            out.append(stmt)
+            return False
+        if isinstance(stmt, ast.ExprStmt):
+            stmt.expr = self._fold(stmt.expr, env)
+            if is_pure(stmt.expr):
+                self.changed = True
+                return False
+            out.append(stmt)
+            return False
+        if isinstance(stmt, ast.ReturnStmt):
+            if stmt.expr is not None:
+                stmt.expr = self._fold(stmt.expr, env)
+            out.append(stmt)
+            return True
+        if isinstance(stmt, ast.IfStmt):
+            return self._if(stmt, env, out)
+        if isinstance(stmt, ast.WhileStmt):
+            return self._while(stmt, env, out)
+        out.append(stmt)
+        return False
+
+    def _if(self, stmt: ast.IfStmt, env: Optional[ConstEnv], out: List[ast.Stmt]) -> bool:
+        stmt.cond = self._fold(stmt.cond, env)
+        if isinstance(stmt.cond, ast.BoolLiteral):
+            self.changed = True
+            taken = stmt.then_block if stmt.cond.value else stmt.else_block
+            if taken is None:
+                return False
+            stmts, returns = self.block(taken.statements, env)
+            out.extend(stmts)
+            return returns
+        then_env = None if env is None else dict(env)
+        else_env = None if env is None else dict(env)
+        stmt.then_block.statements, then_returns = self.block(stmt.then_block.statements, then_env)
+        else_returns = False
+        if stmt.else_block is not None:
+            stmt.else_block.statements, else_returns = self.block(stmt.else_block.statements, else_env)
+            if not stmt.else_block.statements:
+                stmt.else_block = None
+        if env is not None:
+            # Only facts that hold on every path that reaches the join survive.
+            if then_returns and not else_returns:
+                merged = else_env
+            elif else_returns and not then_returns:
+                merged = then_env
+            else:
+                merged = {
+                    name: value
+                    for name, value in then_env.items()
+                    if name in else_env and _same_const(value, else_env[name])
+                }
+            env.clear()
+            env.update(merged)
+        if not stmt.then_block.statements and stmt.else_block is None and is_pure(stmt.cond):
+            self.changed = True
+            return False
+        out.append(stmt)
+        return then_returns and else_returns
+
+    def _while(self, stmt: ast.WhileStmt, env: Optional[ConstEnv], out: List[ast.Stmt]) -> bool:
+        if env is not None:
+            # The condition and body also run after iterations that may have
+            # reassigned these, so their values aren't known inside the loop.
+            for name in assigned_names(stmt.body):
+                env.pop(name, None)
+        stmt.cond = self._fold(stmt.cond, env)
+        if isinstance(stmt.cond, ast.BoolLiteral) and not stmt.cond.value:
+            self.changed = True
+            return False
+        body_env = None if env is None else dict(env)
+        stmt.body.statements, _ = self.block(stmt.body.statements, body_env)
+        out.append(stmt)
+        # Nova has no `break`: a `while (true)` loop is only left by returning.
+        return isinstance(stmt.cond, ast.BoolLiteral)
+
+
+def fold_constants(fn: ast.FunctionDef, fold_call: Optional[CallFolder] = None) -> bool:
+    """Constant folding, branch folding and removal of unreachable statements."""
+    return Simplifier(propagate=False, fold_call=fold_call).run(fn)
+
+
+def propagate_constants(fn: ast.FunctionDef, fold_call: Optional[CallFolder] = None) -> bool:
+    """:func:`fold_constants` plus propagation of constant variables."""
+    return Simplifier(propagate=True, fold_call=fold_call).run(fn)
+
+
+def remove_dead_stores(fn: ast.FunctionDef) -> bool:
+    """Drop writes to variables that are never read.
+
+    A store whose value has side effects keeps them as an expression statement.
+    """
+    read = {expr.name for expr in iter_block_exprs(fn.body) if isinstance(expr, ast.VarRef)}
+    changed = False
+
+    def sweep(block: ast.Block) -> None:
+        nonlocal changed
+        kept: List[ast.Stmt] = []
+        for stmt in block.statements:
+            if isinstance(stmt, (ast.LetStmt, ast.AssignStmt)) and stmt.name not in read:
+                changed = True
+                if not is_pure(stmt.expr):
+                    kept.append(ast.ExprStmt(stmt.expr))
+                continue
+            if isinstance(stmt, ast.IfStmt):
+                sweep(stmt.then_block)
+                if stmt.else_block is not None:
+                    sweep(stmt.else_block)
+            elif isinstance(stmt, ast.WhileStmt):
+                sweep(stmt.body)
+            kept.append(stmt)
+        block.statements = kept
+
+    sweep(fn.body)
+    return changed
+
+
+# Rounds are repeated while any pass still changes something, up to this cap.
+_MAX_ROUNDS = 4
+
+
+def pipeline(level: int, fold_call: Optional[CallFolder] = None) -> List[FunctionPass]:
+    """The function passes run at optimization ``level``, in order.
+
+    ``fold_call`` is handed to the folding pass, as in :func:`fold_expr`.
+    """
+    if level <= 0:
+        return []
+    if level == 1:
+        return [functools.partial(fold_constants, fold_call=fold_call)]
+    return [functools.partial(propagate_constants, fold_call=fold_call), remove_dead_stores]
+
+
+def optimize_function(fn: ast.FunctionDef, level: int, fold_call: Optional[CallFolder] = None) -> None:
+    """Optimize a type-checked function in place."""
+    passes = pipeline(level, fold_call)
+    for _ in range(_MAX_ROUNDS if level >= 2 else 1):
+        changed = False
+        for run_pass in passes:
+            changed = run_pass(fn) or changed
+        if not changed:
+            break
+
+
+def optimize_program(prog: ast.Program, level: int) -> None:
+    for fn in prog.functions:
+        optimize_function(fn, level)
@@ -1,229 +1,252 @@
 from __future__ import annotations
 
-from typing import List, Optional
+from typing import Dict, List, Sequence, Tuple
 
 from . import ast
 from .errors import ParseError
-from .tokens import Token
+from .tokens import (
+    TK_AND,
+    TK_ARROW,
+    TK_ASSIGN,
+    TK_BANG,
+    TK_BOOL,
+    TK_COLON,
+    TK_COMMA,
+    TK_ELSE,
+    TK_EOF,
+    TK_EQ,
+    TK_FALSE,
+    TK_FN,
+    TK_GE,
+    TK_GT,
+    TK_IDENT,
+    TK_IF,
+    TK_INT,
+    TK_INT_LIT,
+    TK_LBRACE,
+    TK_LE,
+    TK_LET,
+    TK_LPAREN,
+    TK_LT,
+    TK_MINUS,
+    TK_NE,
+    TK_OR,
+    TK_PLUS,
+    TK_RBRACE,
+    TK_RETURN,
+    TK_RPAREN,
+    TK_SEMICOLON,
+    TK_SLASH,
+    TK_STAR,
+    TK_STRING,
+    TK_STRING_LIT,
+    TK_TRUE,
+    TK_VOID,
+    TK_WHILE,
+    TOKEN_TYPES,
+    Token,
+    TokenBuffer,
+)
 
+TYPE_KINDS = frozenset((TK_IDENT, TK_INT_LIT, TK_INT, TK_BOOL, TK_STRING_LIT, TK_STRING, TK_VOID))
+
+# Binary operators: kind -> (precedence, operator). Higher binds tighter.
+BINARY_OPS: Dict[int, Tuple[int, str]] = {
+    TK_OR: (1, "||"),
+    TK_AND: (2, "&&"),
+    TK_EQ: (3, "=="),
+    TK_NE: (3, "!="),
+    TK_LT: (4, "<"),
+    TK_GT: (4, ">"),
+    TK_LE: (4, "<="),
+    TK_GE: (4, ">="),
+    TK_PLUS: (5, "+"),
+    TK_MINUS: (5, "-"),
+    TK_STAR: (6, "*"),
+    TK_SLASH: (6, "/"),
+}
+UNARY_OPS: Dict[int, str] = {TK_MINUS: "-", TK_BANG: "!"}
 
 class Parser:
-    def __init__(self, tokens: List[Token]):
+    def __init__(self, tokens: Sequence[Token]):
+        if not isinstance(tokens, TokenBuffer):
+            tokens = TokenBuffer.from_tokens(tokens)
         self.tokens = tokens
+        self.kinds = tokens.kinds
+        self.value = tokens.value
         self.pos = 0
 
-    def current(self) -> Token:
-        return self.tokens[self.pos]
+    def current(self) -> int:
+        """Kind of the token under the cursor."""
+        return self.kinds[self.pos]
 
-    def consume(self, type_: str, msg: str) -> Token:
-        if self.current().type == type_:
-            tok = self.current()
-            self.pos += 1
-            return tok
-        raise ParseError(msg + f" (found {self.current().type} at line {self.current().line})")
+    def consume(self, kind: int, msg: str) -> int:
+        """Step over a token of ``kind`` and return its index in the buffer."""
+        pos = self.pos
+        if self.kinds[pos] == kind:
+            self.pos = pos + 1
+            return pos
+        raise ParseError(msg + f" (found {self.tokens.type(pos)} at line {self.tokens.line(pos)})")
 
-    def match(self, *types: str) -> Optional[Token]:
-        if self.current().type in types:
-            tok = self.current()
+    def match(self, kind: int) -> bool:
+        if self.kinds[self.pos] == kind:
             self.pos += 1
-            return tok
-        return None
+            return True
+        return False
 
     def parse(self) -> ast.Program:
         funcs: List[ast.FunctionDef] = []
-        while self.current().type != "EOF":
+        while self.current() != TK_EOF:
             funcs.append(self.parse_function())
         return ast.Program(funcs)
 
     def parse_function(self) -> ast.FunctionDef:
-        self.consume("FN", "Expected 'fn'")
-        name_tok = self.consume("IDENT", "Expected function name")
-        self.consume("LPAREN", "Expected '('")
+        start = self.consume(TK_FN, "Expected 'fn'")
+        name_tok = self.consume(TK_IDENT, "Expected function name")
+        self.consume(TK_LPAREN, "Expected '('")
         params = []
-        if self.current().type != "RPAREN":
+        if self.current() != TK_RPAREN:
             params.append(self.parse_param())
-            while self.match("COMMA"):
+            while self.match(TK_COMMA):
                 params.append(self.parse_param())
-        self.consume("RPAREN", "Expected ')'")
+        self.consume(TK_RPAREN, "Expected ')'")
         ret_type = None
-        if self.match("->"):
+        if self.match(TK_ARROW):
             ret_type = self.parse_type()
         body = self.parse_block()
-        return ast.FunctionDef(name_tok.value, params, ret_type, body)
+        return ast.FunctionDef(self.value(name_tok), params, ret_type, body, self.tokens.span(start, self.pos - 1))
 
     def parse_param(self) -> ast.Param:
-        name_tok = self.consume("IDENT", "Expected parameter name")
+        name_tok = self.consume(TK_IDENT, "Expected parameter name")
         type_name = None
-        if self.match("COLON"):
+        if self.match(TK_COLON):
             type_name = self.parse_type()
-        return ast.Param(name_tok.value, type_name)
+        return ast.Param(self.value(name_tok), type_name)
 
     def parse_type(self) -> str:
-        tok = self.current()
-        if tok.type in ("IDENT", "INT", "BOOL", "STRING", "VOID"):
+        pos = self.pos
+        if self.kinds[pos] in TYPE_KINDS:
             self.pos += 1
-            return tok.value if tok.value else tok.type.lower()
-        raise ParseError(f"Expected type at line {tok.line}")
+            return self.value(pos) or self.tokens.type(pos).lower()
+        raise ParseError(f"Expected type at line {self.tokens.line(pos)}")
 
     def parse_block(self) -> ast.Block:
-        self.consume("LBRACE", "Expected '{'")
+        self.consume(TK_LBRACE, "Expected '{'")
         statements: List[ast.Stmt] = []
-        while self.current().type != "RBRACE":
+        while self.current() != TK_RBRACE:
             statements.append(self.parse_statement())
-        self.consume("RBRACE", "Expected '}'")
+        self.consume(TK_RBRACE, "Expected '}'")
         return ast.Block(statements)
 
     def parse_statement(self) -> ast.Stmt:
-        tok = self.current()
-        if tok.type == "LET":
+        kind = self.current()
+        if kind == TK_LET:
             return self.parse_let()
-        if tok.type == "IF":
+        if kind == TK_IF:
             return self.parse_if()
-        if tok.type == "WHILE":
+        if kind == TK_WHILE:
             return self.parse_while()
-        if tok.type == "RETURN":
+        if kind == TK_RETURN:
             return self.parse_return()
         # assignment lookahead
-        if tok.type == "IDENT" and self.tokens[self.pos + 1].type == "ASSIGN":
-            name = tok.value
+        if kind == TK_IDENT and self.kinds[self.pos + 1] == TK_ASSIGN:
+            name = self.value(self.pos)
             self.pos += 2  # consume ident and '='
             expr = self.parse_expression()
-            self.consume("SEMICOLON", "Expected ';'")
+            self.consume(TK_SEMICOLON, "Expected ';'")
             return ast.AssignStmt(name, expr)
         expr = self.parse_expression()
-        self.consume("SEMICOLON", "Expected ';'")
+        self.consume(TK_SEMICOLON, "Expected ';'")
         return ast.ExprStmt(expr)
 
     def parse_let(self) -> ast.Stmt:
-        self.consume("LET", "Expected 'let'")
-        name_tok = self.consume("IDENT", "Expected identifier after 'let'")
+        self.consume(TK_LET, "Expected 'let'")
+        name_tok = self.consume(TK_IDENT, "Expected identifier after 'let'")
         type_name = None
-        if self.match("COLON"):
+        if self.match(TK_COLON):
             type_name = self.parse_type()
-        self.consume("ASSIGN", "Expected '=' in let binding")
+        self.consume(TK_ASSIGN, "Expected '=' in let binding")
         expr = self.parse_expression()
-        self.consume("SEMICOLON", "Expected ';'")
-        return ast.LetStmt(name_tok.value, type_name, expr)
+        self.consume(TK_SEMICOLON, "Expected ';'")
+        return ast.LetStmt(self.value(name_tok), type_name, expr)
 
     def parse_if(self) -> ast.Stmt:
-        self.consume("IF", "Expected 'if'")
-        self.consume("LPAREN", "Expected '(' after if")
+        self.consume(TK_IF, "Expected 'if'")
+        self.consume(TK_LPAREN, "Expected '(' after if")
         cond = self.parse_expression()
-        self.consume("RPAREN", "Expected ')' after condition")
+        self.consume(TK_RPAREN, "Expected ')' after condition")
         then_block = self.parse_block()
         else_block = None
-        if self.match("ELSE"):
+        if self.match(TK_ELSE):
             else_block = self.parse_block()
         return ast.IfStmt(cond, then_block, else_block)
 
     def parse_while(self) -> ast.Stmt:
-        self.consume("WHILE", "Expected 'while'")
-        self.consume("LPAREN", "Expected '(' after while")
+        self.consume(TK_WHILE, "Expected 'while'")
+        self.consume(TK_LPAREN, "Expected '(' after while")
         cond = self.parse_expression()
-        self.consume("RPAREN", "Expected ')' after condition")
+        self.consume(TK_RPAREN, "Expected ')' after condition")
         body = self.parse_block()
         return ast.WhileStmt(cond, body)
 
     def parse_return(self) -> ast.Stmt:
-        self.consume("RETURN", "Expected 'return'")
-        if self.current().type == "SEMICOLON":
-            self.consume("SEMICOLON", "Expected ';'")
+        self.consume(TK_RETURN, "Expected 'return'")
+        if self.current() == TK_SEMICOLON:
+            self.consume(TK_SEMICOLON, "Expected ';'")
             return ast.ReturnStmt(None)
         expr = self.parse_expression()
-        self.consume("SEMICOLON", "Expected ';'")
+        self.consume(TK_SEMICOLON, "Expected ';'")
         return ast.ReturnStmt(expr)
 
     def parse_expression(self) -> ast.Expr:
-        return self.parse_logical_or()
-
-    def parse_logical_or(self) -> ast.Expr:
-        expr = self.parse_logical_and()
-        while self.match("||"):
-            right = self.parse_logical_and()
-            expr = ast.BinaryOp(expr, "||", right)
-        return expr
-
-    def parse_logical_and(self) -> ast.Expr:
-        expr = self.parse_equality()
-        while self.match("&&"):
-            right = self.parse_equality()
-            expr = ast.BinaryOp(expr, "&&", right)
-        return expr
-
-    def parse_equality(self) -> ast.Expr:
-        expr = self.parse_comparison()
-        while True:
-            if self.match("=="):
-                right = self.parse_comparison()
-                expr = ast.BinaryOp(expr, "==", right)
-            elif self.match("!="):
-                right = self.parse_comparison()
-                expr = ast.BinaryOp(expr, "!=", right)
-            else:
-                break
-        return expr
-
-    def parse_comparison(self) -> ast.Expr:
-        expr = self.parse_term()
-        while True:
-            if self.match("LT"):
-                right = self.parse_term()
-                expr = ast.BinaryOp(expr, "<", right)
-            elif self.match("GT"):
-                right = self.parse_term()
-                expr = ast.BinaryOp(expr, ">", right)
-            elif self.match("<="):
-                right = self.parse_term()
-                expr = ast.BinaryOp(expr, "<=", right)
-            elif self.match(">="):
-                right = self.parse_term()
-                expr = ast.BinaryOp(expr, ">=", right)
-            else:
-                break
-        return expr
-
-    def parse_term(self) -> ast.Expr:
-        expr = self.parse_factor()
-        while True:
-            if self.match("PLUS"):
-                right = self.parse_factor()
-                expr = ast.BinaryOp(expr, "+", right)
-            elif self.match("MINUS"):
-                right = self.parse_factor()
-                expr = ast.BinaryOp(expr, "-", right)
-            else:
-                break
-        return expr
+        """Operator-precedence parse of a binary expression chain.
 
-    def parse_factor(self) -> ast.Expr:
-        expr = self.parse_unary()
-        while True:
-            if self.match("STAR"):
-                right = self.parse_unary()
-                expr = ast.BinaryOp(expr, "*", right)
-            elif self.match("SLASH"):
-                right = self.parse_unary()
-                expr = ast.BinaryOp(expr, "/", right)
-            else:
-                break
-        return expr
+        Operands and pending operators live on explicit stacks, so long
+        chains neither recurse nor walk one method per precedence level.
+        All operators are left-associative: a pending operator is reduced
+        as soon as the next one binds no tighter.
+        """
+        kinds = self.kinds
+        binary_ops = BINARY_OPS
+        operands = [self.parse_unary()]
+        pending: List[Tuple[int, str]] = []
+        entry = binary_ops.get(kinds[self.pos])
+        while entry is not None:
+            prec = entry[0]
+            while pending and pending[-1][0] >= prec:
+                right = operands.pop()
+                operands[-1] = ast.BinaryOp(operands[-1], pending.pop()[1], right)
+            pending.append(entry)
+            self.pos += 1
+            operands.append(self.parse_unary())
+            entry = binary_ops.get(kinds[self.pos])
+        while pending:
+            right = operands.pop()
+            operands[-1] = ast.BinaryOp(operands[-1], pending.pop()[1], right)
+        return operands[0]
 
     def parse_unary(self) -> ast.Expr:
-        if self.match("MINUS"):
-            return ast.UnaryOp("-", self.parse_unary())
-        if self.match("BANG"):
-            return ast.UnaryOp("!", self.parse_unary())
-        return self.parse_call()
+        kinds = self.kinds
+        prefix: List[str] = []
+        op = UNARY_OPS.get(kinds[self.pos])
+        while op is not None:
+            prefix.append(op)
+            self.pos += 1
+            op = UNARY_OPS.get(kinds[self.pos])
+        expr = self.parse_call()
+        while prefix:
+            expr = ast.UnaryOp(prefix.pop(), expr)
+        return expr
 
     def parse_call(self) -> ast.Expr:
         expr = self.parse_primary()
-        while self.match("LPAREN"):
+        while self.match(TK_LPAREN):
             args = []
-            if self.current().type != "RPAREN":
+            if self.current() != TK_RPAREN:
                 args.append(self.parse_expression())
-                while self.match("COMMA"):
+                while self.match(TK_COMMA):
                     args.append(self.parse_expression())
-            self.consume("RPAREN", "Expected ')' after arguments")
+            self.consume(TK_RPAREN, "Expected ')' after arguments")
             if isinstance(expr, ast.VarRef):
                 expr = ast.Call(expr.name, args)
             else:
@@ -231,29 +254,30 @@ class Parser:
         return expr
 
     def parse_primary(self) -> ast.Expr:
-        tok = self.current()
-        if tok.type == "INT":
+        pos = self.pos
+        kind = self.kinds[pos]
+        if kind == TK_INT_LIT:
             self.pos += 1
-            return ast.IntLiteral(int(tok.value))
-        if tok.type == "TRUE":
+            return ast.IntLiteral(int(self.value(pos)))
+        if kind == TK_TRUE:
             self.pos += 1
             return ast.BoolLiteral(True)
-        if tok.type == "FALSE":
+        if kind == TK_FALSE:
             self.pos += 1
             return ast.BoolLiteral(False)
-        if tok.type == "STRING":
+        if kind == TK_STRING_LIT:
             self.pos += 1
-            return ast.StringLiteral(tok.value or "")
-        if tok.type == "IDENT":
+            return ast.StringLiteral(self.value(pos) or "")
+        if kind == TK_IDENT:
             self.pos += 1
-            return ast.VarRef(tok.value)
-        if tok.type == "LPAREN":
+            return ast.VarRef(self.value(pos))
+        if kind == TK_LPAREN:
             self.pos += 1
             expr = self.parse_expression()
-            self.consume("RPAREN", "Expected ')'")
+            self.consume(TK_RPAREN, "Expected ')'")
             return expr
-        raise ParseError(f"Unexpected token {tok.type} at line {tok.line}")
+        raise ParseError(f"Unexpected token {TOKEN_TYPES[kind]} at line {self.tokens.line(pos)}")
 
 
-def parse_tokens(tokens: List[Token]) -> ast.Program:
+def parse_tokens(tokens: Sequence[Token]) -> ast.Program:
     return Parser(tokens).parse()
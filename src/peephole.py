@@ -0,0 +1,515 @@
+from __future__ import annotations
+
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+# Peephole optimization over the instructions of one function.
+#
+# Lines are parsed into records, and rules rewrite short windows of them.
+# The pass walks a function backwards, tracking which registers (and the
+# flags) are live after each instruction, so rules can delete or change
+# instructions whose results are never read. Liveness is tracked across
+# the function: jumps see what is live at their target label, and only
+# unknown instructions make everything live.
+
+
+@dataclass(slots=True)
+class AsmLabel:
+    name: str
+
+    def render(self) -> str:
+        return f"{self.name}:"
+
+
+@dataclass(slots=True)
+class AsmInstr:
+    op: str
+    operands: List[str] = field(default_factory=list)
+    # What effects() reports, worked out once when the record is made. Rules
+    # replace records rather than change them, so it never goes stale.
+    fx: Optional[Effects] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.fx = _compute_effects(self.op, self.operands)
+
+    def render(self) -> str:
+        if not self.operands:
+            return f"    {self.op}"
+        return f"    {self.op} {', '.join(self.operands)}"
+
+
+AsmItem = Union[AsmLabel, AsmInstr]
+
+
+def parse_line(line: str) -> AsmItem:
+    text = line.strip()
+    if text.endswith(":"):
+        return AsmLabel(text[:-1])
+    op, _, rest = text.partition(" ")
+    return AsmInstr(op, [operand.strip() for operand in rest.split(",")] if rest else [])
+
+
+# --- registers and liveness ---------------------------------------------------
+
+_GPRS = ("rax", "rbx", "rcx", "rdx", "rsi", "rdi", "rbp", "rsp") + tuple(f"r{n}" for n in range(8, 16))
+_DWORD = dict(zip(_GPRS, ("eax", "ebx", "ecx", "edx", "esi", "edi", "ebp", "esp") + tuple(f"r{n}d" for n in range(8, 16))))
+_BYTE = dict(zip(_GPRS, ("al", "bl", "cl", "dl", "sil", "dil", "bpl", "spl") + tuple(f"r{n}b" for n in range(8, 16))))
+_REG_BIT: Dict[str, int] = {}
+for _idx, _reg in enumerate(_GPRS):
+    _REG_BIT[_reg] = _REG_BIT[_DWORD[_reg]] = _REG_BIT[_BYTE[_reg]] = 1 << _idx
+_BYTE_NAMES = frozenset(_BYTE.values())
+FLAGS = 1 << len(_GPRS)
+ALL = (FLAGS << 1) - 1
+_FRAME = _REG_BIT["rsp"] | _REG_BIT["rbp"]
+
+
+def _bits(*regs: str) -> int:
+    mask = 0
+    for reg in regs:
+        mask |= _REG_BIT[reg]
+    return mask
+
+
+_ARG_REGS = _bits("rdi", "rsi", "rdx", "rcx", "r8", "r9")
+_CALL_CLOBBERED = _bits("rax", "rcx", "rdx", "rsi", "rdi", "r8", "r9", "r10", "r11") | FLAGS
+# rax carries the result; callee-saved registers and the frame must survive.
+_RET_LIVE = _bits("rax", "rbx", "rbp", "rsp", "r12", "r13", "r14", "r15")
+# A jump to another function is a tail call: it reads the arguments instead.
+_TAIL_LIVE = (_RET_LIVE & ~_bits("rax")) | _ARG_REGS
+
+_WORD = re.compile(r"\w+")
+_IMMEDIATE = re.compile(r"-?\d+$")
+
+INVERSE_JUMPS = {
+    "je": "jne",
+    "jne": "je",
+    "jl": "jge",
+    "jge": "jl",
+    "jle": "jg",
+    "jg": "jle",
+    "jz": "jnz",
+    "jnz": "jz",
+}
+_ARITH = frozenset({"add", "sub", "imul", "and", "or", "xor"})
+_SHIFTS = frozenset({"shl", "sar", "shr"})
+
+
+def is_register(operand: str) -> bool:
+    return operand in _REG_BIT
+
+
+def is_memory(operand: str) -> bool:
+    return operand.endswith("]")
+
+
+def is_immediate(operand: str) -> bool:
+    return _IMMEDIATE.match(operand) is not None
+
+
+def _fits_imm32(operand: str) -> bool:
+    return -(1 << 31) <= int(operand) < (1 << 31)
+
+
+def _reads_of(operand: str) -> int:
+    """Registers read when ``operand`` is a source."""
+    if operand in _REG_BIT:
+        return _REG_BIT[operand]
+    if is_memory(operand):
+        return _address_regs(operand)
+    return 0
+
+
+def _address_regs(operand: str) -> int:
+    mask = 0
+    for word in _WORD.findall(operand):
+        mask |= _REG_BIT.get(word, 0)
+    return mask
+
+
+def _partial(operand: str) -> bool:
+    """True if writing ``operand`` leaves the rest of its 64-bit register in place."""
+    return operand in _BYTE_NAMES
+
+
+@dataclass(slots=True)
+class Effects:
+    reads: int
+    writes: int
+
+
+def effects(instr: AsmInstr) -> Optional[Effects]:
+    """Registers and flags ``instr`` reads and writes, or None if it isn't understood."""
+    return instr.fx
+
+
+def _compute_effects(op: str, args: List[str]) -> Optional[Effects]:
+    def dst_write(operand: str) -> int:
+        if operand in _REG_BIT:
+            return _REG_BIT[operand]
+        return 0
+
+    def dst_reads(operand: str) -> int:
+        # Writing memory reads its address registers; writing a byte register
+        # keeps (so reads) the rest of it.
+        if is_memory(operand):
+            return _address_regs(operand)
+        return _REG_BIT[operand] if _partial(operand) else 0
+
+    if op in ("mov", "movzx", "movabs", "lea") and len(args) == 2:
+        src = _address_regs(args[1]) if op == "lea" else _reads_of(args[1])
+        return Effects(src | dst_reads(args[0]), dst_write(args[0]))
+    if op == "xor" and len(args) == 2 and args[0] == args[1] and is_register(args[0]):
+        return Effects(0, _REG_BIT[args[0]] | FLAGS)
+    if (op in _ARITH or op in _SHIFTS) and len(args) == 2:
+        return Effects(_reads_of(args[0]) | _reads_of(args[1]), dst_write(args[0]) | FLAGS)
+    if op == "imul" and len(args) == 3:
+        return Effects(_reads_of(args[1]) | dst_reads(args[0]), dst_write(args[0]) | FLAGS)
+    if op == "neg" and len(args) == 1:
+        return Effects(_reads_of(args[0]), dst_write(args[0]) | FLAGS)
+    if op in ("cmp", "test") and len(args) == 2:
+        return Effects(_reads_of(args[0]) | _reads_of(args[1]), FLAGS)
+    if op.startswith("set") and len(args) == 1:
+        return Effects(FLAGS | _reads_of(args[0]), dst_write(args[0]))
+    if op.startswith("cmov") and len(args) == 2:
+        return Effects(FLAGS | _reads_of(args[0]) | _reads_of(args[1]), dst_write(args[0]))
+    if op == "imul" and len(args) == 1:
+        return Effects(_bits("rax") | _reads_of(args[0]), _bits("rax", "rdx") | FLAGS)
+    if op == "cqo":
+        return Effects(_bits("rax"), _bits("rdx"))
+    if op == "idiv" and len(args) == 1:
+        return Effects(_bits("rax", "rdx") | _reads_of(args[0]), _bits("rax", "rdx") | FLAGS)
+    if op == "push" and len(args) == 1:
+        return Effects(_reads_of(args[0]) | _bits("rsp"), _bits("rsp"))
+    if op == "pop" and len(args) == 1:
+        return Effects(_bits("rsp") | dst_reads(args[0]), dst_write(args[0]) | _bits("rsp"))
+    if op == "xchg" and len(args) == 2:
+        both = _reads_of(args[0]) | _reads_of(args[1])
+        return Effects(both, dst_write(args[0]) | dst_write(args[1]))
+    if op == "leave":
+        return Effects(_bits("rbp"), _bits("rsp", "rbp"))
+    if op == "call":
+        return Effects(_ARG_REGS | _bits("rax", "rsp"), _CALL_CLOBBERED)
+    return None
+
+
+# Instructions live_before treats by their targets rather than their effects.
+_CONTROL = frozenset({"ret", "jmp", *INVERSE_JUMPS})
+
+
+def live_before(item: AsmItem, live_after: int, at_label: Dict[str, int]) -> int:
+    """Registers live before ``item`` given those live after it and at each label."""
+    if isinstance(item, AsmLabel):
+        return live_after
+    op = item.op
+    if op == "ret":
+        return _RET_LIVE
+    if op == "jmp":
+        target = item.operands[0]
+        return at_label.get(target, ALL if target.startswith(".") else _TAIL_LIVE)
+    if op in INVERSE_JUMPS:
+        return live_after | at_label.get(item.operands[0], ALL) | FLAGS
+    fx = item.fx
+    if fx is None:
+        return ALL
+    return (live_after & ~fx.writes) | fx.reads | _FRAME
+
+
+def label_liveness(items: Sequence[AsmItem]) -> Dict[str, int]:
+    """Registers live at each label of a function, by backward dataflow to a fixed point.
+
+    Each run of instructions between labels and jumps is first folded into
+    one transfer ``live & kept | added``, so the iterations only step
+    through labels, jumps and those runs.
+    """
+    steps: List[Union[AsmItem, Tuple[int, int]]] = []  # reversed
+    kept, added = ALL, 0
+    for item in reversed(items):
+        if isinstance(item, AsmLabel) or item.op in _CONTROL:
+            if (kept, added) != (ALL, 0):
+                steps.append((kept, added))
+                kept, added = ALL, 0
+            steps.append(item)
+        elif item.fx is None:
+            kept, added = 0, ALL
+        else:
+            kept, added = kept & ~item.fx.writes, (added & ~item.fx.writes) | item.fx.reads | _FRAME
+    if (kept, added) != (ALL, 0):
+        steps.append((kept, added))
+
+    at_label = {item.name: 0 for item in items if isinstance(item, AsmLabel)}
+    changed = True
+    while changed:
+        changed = False
+        live = ALL
+        for step in steps:
+            if isinstance(step, tuple):
+                live = live & step[0] | step[1]
+                continue
+            live = live_before(step, live, at_label)
+            if isinstance(step, AsmLabel) and at_label[step.name] != live:
+                at_label[step.name] = live
+                changed = True
+    return at_label
+
+
+# --- rules ---------------------------------------------------------------------
+
+# A rule looks at a window of ``width`` consecutive items and the registers
+# live after it, and returns the items to replace the window with, or None.
+RuleFn = Callable[[List[AsmItem], int], Optional[List[AsmItem]]]
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    width: int
+    rewrite: RuleFn
+
+
+def _instr(item: AsmItem, *ops: str) -> bool:
+    return isinstance(item, AsmInstr) and (not ops or item.op in ops)
+
+
+def _self_move(window: List[AsmItem], live: int) -> Optional[List[AsmItem]]:
+    (item,) = window
+    if _instr(item, "mov") and item.operands[0] == item.operands[1] and is_register(item.operands[0]):
+        return []
+    return None
+
+
+def _dead_write(window: List[AsmItem], live: int) -> Optional[List[AsmItem]]:
+    """Drop an instruction whose only effect is on registers (or flags) nobody reads."""
+    (item,) = window
+    if not _instr(item, "mov", "movzx", "movabs", "lea", "xor", "add", "sub", "imul", "neg", "and", "or"):
+        return None
+    if not is_register(item.operands[0]) or _REG_BIT[item.operands[0]] & _FRAME:
+        return None
+    fx = item.fx
+    if fx is None or fx.writes & live:
+        return None
+    return []
+
+
+def _zero_idiom(window: List[AsmItem], live: int) -> Optional[List[AsmItem]]:
+    (item,) = window
+    if _instr(item, "mov") and item.operands[1] == "0" and item.operands[0] in _DWORD and not live & FLAGS:
+        reg = _DWORD[item.operands[0]]
+        return [AsmInstr("xor", [reg, reg])]
+    return None
+
+
+def _identity_arith(window: List[AsmItem], live: int) -> Optional[List[AsmItem]]:
+    (item,) = window
+    if live & FLAGS or not _instr(item):
+        return None
+    args = item.operands
+    if item.op in ("add", "sub", "shl", "sar", "shr") and len(args) == 2 and args[1] == "0":
+        return []
+    if item.op == "imul" and len(args) == 3 and args[0] == args[1] and args[2] == "1":
+        return []
+    return None
+
+
+def _store_load(window: List[AsmItem], live: int) -> Optional[List[AsmItem]]:
+    """``mov M, R`` then ``mov R2, M``: read R instead of memory."""
+    store, load = window
+    if not (_instr(store, "mov") and _instr(load, "mov")):
+        return None
+    slot, reg = store.operands
+    if not (is_memory(slot) and is_register(reg) and load.operands[1] == slot and is_register(load.operands[0])):
+        return None
+    if load.operands[0] == reg:
+        return [store]
+    return [store, AsmInstr("mov", [load.operands[0], reg])]
+
+
+def _swap_back(window: List[AsmItem], live: int) -> Optional[List[AsmItem]]:
+    """``mov A, B`` then ``mov B, A``: the second move changes nothing."""
+    first, second = window
+    if _instr(first, "mov") and _instr(second, "mov") and first.operands == second.operands[::-1]:
+        if is_register(first.operands[0]) or is_register(first.operands[1]):
+            return [first]
+    return None
+
+
+def _push_pop(window: List[AsmItem], live: int) -> Optional[List[AsmItem]]:
+    push, pop = window
+    if not (_instr(push, "push") and _instr(pop, "pop") and is_register(pop.operands[0])):
+        return None
+    src, dst = push.operands[0], pop.operands[0]
+    if src == dst:
+        return []
+    return [AsmInstr("mov", [dst, src])]
+
+
+def _copy_update(window: List[AsmItem], live: int) -> Optional[List[AsmItem]]:
+    """``mov A, B; op A, X; mov B, A`` updates B in place: ``op B, X; mov A, B``.
+
+    The trailing copy usually dies and is then removed by ``dead-write``.
+    """
+    copy, update, back = window
+    if not (_instr(copy, "mov") and _instr(update, *_ARITH, *_SHIFTS) and _instr(back, "mov")):
+        return None
+    a, b = copy.operands
+    if not (is_register(a) and is_register(b)) or back.operands != [b, a] or len(update.operands) != 2:
+        return None
+    if update.operands[0] != a or update.op == "xor" and update.operands[1] == a:
+        return None
+    other = update.operands[1]
+    if _reads_of(other) & (_REG_BIT[a] | _REG_BIT[b]):
+        return None
+    return [AsmInstr(update.op, [b, other]), AsmInstr("mov", [a, b])]
+
+
+def _forward_copy(window: List[AsmItem], live: int) -> Optional[List[AsmItem]]:
+    """``mov A, S`` then ``op B, A`` with A dead afterwards is ``op B, S``."""
+    copy, use = window
+    if not (_instr(copy, "mov") and _instr(use, "mov", "cmp", *_ARITH) and len(use.operands) == 2):
+        return None
+    a, src = copy.operands
+    dst = use.operands[0]
+    if not is_register(a) or use.operands[1] != a or dst == a or _REG_BIT[a] & live:
+        return None
+    if is_memory(src) and is_memory(dst) or _partial(a) or _partial(dst):
+        return None
+    if is_memory(dst) and _address_regs(dst) & _REG_BIT[a]:
+        return None
+    if is_immediate(src) and (use.op == "imul" or not (use.op == "mov" and is_register(dst)) and not _fits_imm32(src)):
+        # imul has no two-operand immediate form; only mov to a register takes 64-bit immediates.
+        return None
+    return [AsmInstr(use.op, [dst, src])]
+
+
+def _retarget(window: List[AsmItem], live: int) -> Optional[List[AsmItem]]:
+    """``mov A, S; op A, X; mov C, A`` with A dead afterwards computes straight into C."""
+    copy, update, use = window
+    if not (_instr(copy, "mov") and _instr(update, *_ARITH, *_SHIFTS) and _instr(use, "mov")):
+        return None
+    a, src = copy.operands
+    c = use.operands[0]
+    if not (is_register(a) and is_register(c)) or use.operands[1] != a or _REG_BIT[a] & live:
+        return None
+    if len(update.operands) != 2 or update.operands[0] != a or _partial(a) or _partial(c):
+        return None
+    other = update.operands[1]
+    if _reads_of(other) & (_REG_BIT[a] | _REG_BIT[c]) or _reads_of(src) & _REG_BIT[a]:
+        return None
+    return [AsmInstr("mov", [c, src]), AsmInstr(update.op, [c, other])]
+
+
+def _jump_to_next(window: List[AsmItem], live: int) -> Optional[List[AsmItem]]:
+    jump, label = window
+    if _instr(jump, "jmp") and isinstance(label, AsmLabel) and jump.operands[0] == label.name:
+        return [label]
+    return None
+
+
+def _invert_branch(window: List[AsmItem], live: int) -> Optional[List[AsmItem]]:
+    """``jcc L1; jmp L2; L1:`` becomes ``jncc L2; L1:``."""
+    branch, jump, label = window
+    if not (_instr(branch, *INVERSE_JUMPS) and _instr(jump, "jmp") and isinstance(label, AsmLabel)):
+        return None
+    if branch.operands[0] != label.name:
+        return None
+    return [AsmInstr(INVERSE_JUMPS[branch.op], jump.operands), label]
+
+
+def _unreachable(window: List[AsmItem], live: int) -> Optional[List[AsmItem]]:
+    """Nothing between an unconditional jump or return and the next label can run."""
+    leave, item = window
+    if _instr(leave, "jmp", "ret") and isinstance(item, AsmInstr):
+        return [leave]
+    return None
+
+
+DEFAULT_RULES: Sequence[Rule] = (
+    Rule("self-move", 1, _self_move),
+    Rule("dead-write", 1, _dead_write),
+    Rule("identity-arith", 1, _identity_arith),
+    Rule("zero-idiom", 1, _zero_idiom),
+    Rule("store-load", 2, _store_load),
+    Rule("swap-back", 2, _swap_back),
+    Rule("push-pop", 2, _push_pop),
+    Rule("forward-copy", 2, _forward_copy),
+    Rule("copy-update", 3, _copy_update),
+    Rule("retarget", 3, _retarget),
+    Rule("jump-to-next", 2, _jump_to_next),
+    Rule("invert-branch", 3, _invert_branch),
+    Rule("unreachable", 2, _unreachable),
+)
+
+
+# --- driver -------------------------------------------------------------------
+
+
+@dataclass
+class PeepholeStats:
+    applied: Counter = field(default_factory=Counter)
+    removed: Counter = field(default_factory=Counter)  # net instructions removed
+    rounds: int = 0
+
+    def add(self, other: "PeepholeStats") -> None:
+        self.applied.update(other.applied)
+        self.removed.update(other.removed)
+        self.rounds += other.rounds
+
+    def report(self) -> str:
+        lines = [f"{'peephole rule':<16}{'applied':>9}{'removed':>9}"]
+        for name in sorted(self.applied, key=lambda n: (-self.removed[n], n)):
+            lines.append(f"{name:<16}{self.applied[name]:>9}{self.removed[name]:>9}")
+        lines.append(f"{'total':<16}{sum(self.applied.values()):>9}{sum(self.removed.values()):>9}")
+        return "\n".join(lines)
+
+    def as_dict(self) -> Dict[str, object]:
+        """Plain data for JSON output."""
+        return {"applied": dict(self.applied), "removed": dict(self.removed), "rounds": self.rounds}
+
+
+def _run_round(items: List[AsmItem], rules: Sequence[Rule], stats: PeepholeStats) -> bool:
+    """One backward sweep over ``items``, rewriting in place. True if anything changed.
+
+    A window always ends at the next item to move into the finished suffix,
+    so the registers live after it are known. Liveness at labels is
+    computed before the sweep; rewrites never add reads, so it stays a safe
+    over-approximation. A replacement is pushed back and offered to the
+    rules again.
+    """
+    at_label = label_liveness(items)
+    pending = items[:]
+    done: List[AsmItem] = []  # reversed
+    live = ALL
+    changed = False
+    while pending:
+        for rule in rules:
+            if rule.width > len(pending):
+                continue
+            window = pending[len(pending) - rule.width :]
+            replacement = rule.rewrite(window, live)
+            if replacement is None:
+                continue
+            del pending[len(pending) - rule.width :]
+            pending.extend(replacement)
+            stats.applied[rule.name] += 1
+            stats.removed[rule.name] += rule.width - len(replacement)
+            changed = True
+            break
+        else:
+            item = pending.pop()
+            live = live_before(item, live, at_label)
+            done.append(item)
+    done.reverse()
+    items[:] = done
+    return changed
+
+
+def run_peephole(lines: List[str], rules: Sequence[Rule] = DEFAULT_RULES, stats: Optional[PeepholeStats] = None) -> List[str]:
+    """Apply ``rules`` to one function's assembly lines until none fires."""
+    stats = stats if stats is not None else PeepholeStats()
+    items = [parse_line(line) for line in lines]
+    while True:
+        stats.rounds += 1
+        if not _run_round(items, rules, stats):
+            break
+    return [item.render() for item in items]
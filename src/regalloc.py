@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import bisect
+import heapq
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from . import ir
+
+# Allocatable registers. rax, rcx and rdx are scratch for expression
+# evaluation and division, and the argument registers are written around
+# every call, so neither set holds variables (except argument registers
+# a function without calls has no use for; see ``allocate``).
+CALLER_SAVED = ("r10", "r11")
+CALLEE_SAVED = ("rbx", "r12", "r13", "r14", "r15")
+
+
+@dataclass
+class LiveInterval:
+    """Range of instruction positions over which a vreg's value is needed."""
+
+    vreg: ir.VReg
+    start: int
+    end: int
+    crosses_call: bool = False
+    # A register name, or None once the interval is spilled to a stack slot.
+    register: Optional[str] = None
+    slot: Optional[int] = None
+
+
+@dataclass
+class Allocation:
+    intervals: Dict[int, LiveInterval] = field(default_factory=dict)  # by vreg id
+    # Callee-saved registers the function writes, in allocation order.
+    callee_saved: List[str] = field(default_factory=list)
+    spill_slots: int = 0
+
+
+def live_intervals(fn: ir.Function) -> List[LiveInterval]:
+    """One interval per vreg of ``fn`` (out of SSA form), ordered by start.
+
+    Instructions are numbered in block layout order. An interval is the
+    hull of every position where the vreg is defined, used, live into a
+    block (its start) or live out of one (its end), so values carried
+    around a loop cover the whole loop.
+    """
+    live_in, live_out = ir.liveness(fn)
+    ranges: Dict[int, List[int]] = {}
+    vregs: Dict[int, ir.VReg] = {}
+    calls: List[int] = []
+
+    def touch(vreg_id: int, pos: int) -> None:
+        span = ranges.get(vreg_id)
+        if span is None:
+            ranges[vreg_id] = [pos, pos]
+        elif pos < span[0]:
+            span[0] = pos
+        elif pos > span[1]:
+            span[1] = pos
+
+    for param in fn.params:
+        vregs[param.id] = param
+        touch(param.id, 0)
+    pos = 0
+    for block in fn.blocks:
+        pos += 1
+        for vreg_id in ir.iter_bits(live_in[block.label]):
+            touch(vreg_id, pos)
+        for instr in block.instrs:
+            pos += 1
+            for value in instr.uses():
+                if isinstance(value, ir.VReg):
+                    touch(value.id, pos)
+            if isinstance(instr, (ir.Call, ir.Print)):
+                calls.append(pos)
+            dst = instr.dst
+            if dst is not None:
+                vregs[dst.id] = dst
+                touch(dst.id, pos)
+        pos += 1
+        for vreg_id in ir.iter_bits(live_out[block.label]):
+            touch(vreg_id, pos)
+
+    intervals = []
+    for vreg_id, (start, end) in ranges.items():
+        idx = bisect.bisect_right(calls, start)
+        crosses = idx < len(calls) and calls[idx] < end
+        intervals.append(LiveInterval(vregs[vreg_id], start, end, crosses))
+    intervals.sort(key=lambda iv: (iv.start, iv.end))
+    return intervals
+
+
+def linear_scan(
+    intervals: Sequence[LiveInterval],
+    caller_saved: Iterable[str] = CALLER_SAVED,
+    callee_saved: Iterable[str] = CALLEE_SAVED,
+) -> Allocation:
+    """Assign registers to ``intervals`` (sorted by start) by linear scan.
+
+    Intervals live across a call may only take callee-saved registers. When
+    no suitable register is free, whichever of the current interval and the
+    active ones it could displace ends last is spilled. Spilled intervals
+    then share stack slots wherever their lifetimes don't overlap.
+    """
+    callee = list(callee_saved)
+    free = {"caller": list(caller_saved), "callee": list(callee)}
+    kind = {reg: "caller" for reg in free["caller"]}
+    kind.update((reg, "callee") for reg in callee)
+    active: List[LiveInterval] = []  # holding registers, sorted by end
+    spilled: List[LiveInterval] = []
+    used_callee: List[str] = []
+
+    for iv in intervals:
+        while active and active[0].end < iv.start:
+            done = active.pop(0)
+            free[kind[done.register]].append(done.register)
+        pools = ("callee",) if iv.crosses_call else ("caller", "callee")
+        reg = next((free[pool].pop(0) for pool in pools if free[pool]), None)
+        if reg is None:
+            candidates = [a for a in active if kind[a.register] in pools and a.end > iv.end]
+            if candidates:
+                victim = max(candidates, key=lambda a: a.end)
+                reg = victim.register
+                victim.register = None
+                active.remove(victim)
+                spilled.append(victim)
+        if reg is None:
+            spilled.append(iv)
+            continue
+        iv.register = reg
+        if kind[reg] == "callee" and reg not in used_callee:
+            used_callee.append(reg)
+        _insert_by_end(active, iv)
+
+    allocation = Allocation({iv.vreg.id: iv for iv in intervals}, [r for r in callee if r in used_callee])
+    allocation.spill_slots = _assign_slots(spilled)
+    return allocation
+
+
+def _insert_by_end(active: List[LiveInterval], iv: LiveInterval) -> None:
+    idx = len(active)
+    while idx and active[idx - 1].end > iv.end:
+        idx -= 1
+    active.insert(idx, iv)
+
+
+def _assign_slots(spilled: List[LiveInterval]) -> int:
+    """Give each spilled interval a slot, reusing slots of intervals that have ended."""
+    spilled.sort(key=lambda iv: (iv.start, iv.end))
+    busy: List[Tuple[int, int]] = []  # heap of (end, slot)
+    free: List[int] = []  # heap of slots
+    count = 0
+    for iv in spilled:
+        while busy and busy[0][0] < iv.start:
+            heapq.heappush(free, heapq.heappop(busy)[1])
+        if free:
+            iv.slot = heapq.heappop(free)
+        else:
+            iv.slot = count
+            count += 1
+        heapq.heappush(busy, (iv.end, iv.slot))
+    return count
+
+
+def allocate(fn: ir.Function, use_registers: bool = True, spare: Sequence[str] = ()) -> Allocation:
+    """Allocate ``fn``'s vregs; without registers, every vreg gets a (shared) stack slot.
+
+    ``spare`` registers are free for the whole function (argument registers
+    of a function that makes no calls) and are tried before the usual
+    caller-saved ones.
+    """
+    if use_registers:
+        return linear_scan(live_intervals(fn), (*spare, *CALLER_SAVED))
+    return linear_scan(live_intervals(fn), (), ())
@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import argparse
+import base64
+import dataclasses
+import hashlib
+import json
+import os
+import pickle
+import socketserver
+import stat
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Hashable, Optional, Sequence, TextIO, Union
+
+from . import ast
+from .cache import DEFAULT_MAX_BYTES, MemoryCache
+from .client import DEFAULT_SOCKET
+from .driver import EMIT_KINDS, CompileOptions, compile_program
+from .errors import CompileError
+from .lexer import tokenize
+from .optimize import MAX_OPT_LEVEL
+from .parser import parse_tokens
+
+# Sources whose ASTs are kept.
+DEFAULT_MAX_SOURCES = 256
+
+_OPTION_FIELDS = {f.name for f in dataclasses.fields(CompileOptions)}
+
+
+class LRUCache:
+    """Thread-safe mapping holding at most ``max_entries`` items; the least recently used go first."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[Hashable, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[object]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: object) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+def parse_options(fields: Dict[str, object]) -> CompileOptions:
+    """:class:`CompileOptions` from a request's ``options`` object; raises ValueError on bad fields."""
+    unknown = sorted(set(fields) - _OPTION_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown option(s): {', '.join(unknown)}")
+    fields = dict(fields)
+    if "keep" in fields:
+        fields["keep"] = tuple(fields["keep"])
+    options = CompileOptions(**fields)
+    if options.opt_level not in range(MAX_OPT_LEVEL + 1):
+        raise ValueError(f"opt_level must be 0 to {MAX_OPT_LEVEL}")
+    if options.emit not in EMIT_KINDS:
+        raise ValueError(f"emit must be one of {', '.join(EMIT_KINDS)}")
+    return options
+
+
+class CompileServer:
+    """Answers compile requests from warm in-memory caches; safe to call from several threads.
+
+    ASTs are cached per source text, keyed by its SHA-256, and kept pickled
+    because compiling a program changes its AST in place.
+    Generated functions go through a :class:`MemoryCache`, so an edit only
+    recompiles the functions it touches, as with the on-disk cache.
+    """
+
+    def __init__(self, max_sources: int = DEFAULT_MAX_SOURCES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.asts = LRUCache(max_sources)
+        self.functions = MemoryCache(max_bytes)
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def parse(self, source: str) -> ast.Program:
+        """A fresh AST of ``source``, from the cache when it was seen before."""
+        digest = hashlib.sha256(source.encode()).digest()
+        data = self.asts.get(digest)
+        if data is not None:
+            return pickle.loads(data)
+        prog = parse_tokens(tokenize(source))
+        try:
+            self.asts.put(digest, pickle.dumps(prog, protocol=pickle.HIGHEST_PROTOCOL))
+        except RecursionError:
+            pass  # too deep to pickle; it is parsed again next time
+        return prog
+
+    def compile(self, source: str, options: CompileOptions) -> Union[str, bytes]:
+        if options.target != "x86_64":
+            raise CompileError("ARM64 backend not implemented yet")
+        return compile_program(self.parse(source), source, options, self.functions)
+
+    def handle(self, request: Dict[str, object]) -> Dict[str, object]:
+        """The response to one decoded request; compile errors are reported in it, not raised."""
+        op = request.get("op", "compile")
+        response: Dict[str, object] = {"id": request.get("id"), "ok": True}
+        if op == "stats":
+            response["stats"] = self.summary()
+        elif op == "shutdown":
+            response["shutdown"] = True
+        elif op == "compile":
+            start = time.perf_counter()
+            try:
+                options = parse_options(request.get("options") or {})
+                if "source" in request:
+                    source = str(request["source"])
+                elif "path" in request:
+                    source = Path(str(request["path"])).read_text(encoding="utf-8")
+                else:
+                    raise ValueError("a compile request needs 'source' or 'path'")
+                asm = self.compile(source, options)
+                if request.get("output"):
+                    output = Path(str(request["output"]))
+                    output.parent.mkdir(parents=True, exist_ok=True)
+                    if isinstance(asm, bytes):
+                        output.write_bytes(asm)
+                    else:
+                        output.write_text(asm, encoding="utf-8")
+                    response["output"] = str(output)
+                elif isinstance(asm, bytes):
+                    response["object"] = base64.b64encode(asm).decode("ascii")
+                else:
+                    response["asm"] = asm
+            except Exception as exc:
+                # Whatever goes wrong with one request, the server keeps serving the others.
+                response.update(ok=False, error=f"{type(exc).__name__}: {exc}")
+            response["seconds"] = time.perf_counter() - start
+            with self._lock:
+                self.requests += 1
+                self.failures += not response["ok"]
+        else:
+            response.update(ok=False, error=f"unknown op {op!r}")
+        return response
+
+    def handle_line(self, line: str) -> Dict[str, object]:
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as exc:
+            return {"id": None, "ok": False, "error": f"invalid JSON: {exc}"}
+        if not isinstance(request, dict):
+            return {"id": None, "ok": False, "error": "a request must be a JSON object"}
+        return self.handle(request)
+
+    def summary(self) -> Dict[str, object]:
+        with self._lock:
+            requests, failures = self.requests, self.failures
+        return {
+            "requests": requests,
+            "failures": failures,
+            "asts": self.asts.summary(),
+            "functions": dict(
+                dataclasses.asdict(self.functions.stats), entries=len(self.functions), bytes=self.functions.size_bytes
+            ),
+        }
+
+
+def encode(response: Dict[str, object]) -> str:
+    return json.dumps(response, separators=(",", ":")) + "\n"
+
+
+def serve_stdio(server: CompileServer, infile: TextIO, outfile: TextIO) -> None:
+    """Answer one request per line of ``infile`` in order until EOF or a shutdown request."""
+    for line in infile:
+        if not line.strip():
+            continue
+        response = server.handle_line(line)
+        outfile.write(encode(response))
+        outfile.flush()
+        if response.get("shutdown"):
+            break
+
+
+class _Connection(socketserver.StreamRequestHandler):
+    """One client; its requests are answered in order, other clients' in parallel threads."""
+
+    server: "_SocketServer"
+
+    def handle(self) -> None:
+        for raw in self.rfile:
+            line = raw.decode("utf-8", errors="replace")
+            if not line.strip():
+                continue
+            response = self.server.compile_server.handle_line(line)
+            self.wfile.write(encode(response).encode())
+            self.wfile.flush()
+            if response.get("shutdown"):
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+
+
+class _SocketServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: Path, compile_server: CompileServer):
+        self.compile_server = compile_server
+        super().__init__(str(path), _Connection)
+
+
+def serve_socket(server: CompileServer, path: Path, ready: Optional[threading.Event] = None) -> None:
+    """Accept clients on the Unix socket ``path`` until one sends a shutdown request.
+
+    A stale socket left at ``path`` by a server that died is replaced; any
+    other file there is an error. The socket is removed on the way out.
+    """
+    try:
+        if stat.S_ISSOCK(path.lstat().st_mode):
+            path.unlink()
+    except FileNotFoundError:
+        pass
+    with _SocketServer(path, server) as listener:
+        try:
+            if ready is not None:
+                ready.set()
+            listener.serve_forever()
+        finally:
+            path.unlink(missing_ok=True)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="compiler.py serve",
+        description="Nova compile server: answers JSON-lines compile requests from warm in-memory caches",
+    )
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        nargs="?",
+        const=DEFAULT_SOCKET,
+        metavar="PATH",
+        help=f"Listen on a Unix socket (default {DEFAULT_SOCKET}) instead of reading requests from stdin",
+    )
+    parser.add_argument(
+        "--max-sources",
+        type=int,
+        default=DEFAULT_MAX_SOURCES,
+        help=f"Keep the AST of up to N distinct sources (default {DEFAULT_MAX_SOURCES})",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+        help="Evict least recently used compiled functions beyond this many MB",
+    )
+    args = parser.parse_args(argv)
+
+    server = CompileServer(args.max_sources, args.cache_size * 1024 * 1024)
+    if args.socket is None:
+        serve_stdio(server, sys.stdin, sys.stdout)
+        return
+    print(f"Listening on {args.socket} (pid {os.getpid()})", file=sys.stderr, flush=True)
+    try:
+        serve_socket(server, args.socket)
+    except KeyboardInterrupt:
+        pass
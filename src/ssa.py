@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from . import ir
+
+
+def to_ssa(fn: ir.Function) -> None:
+    """Rewrite ``fn`` in place into pruned SSA form.
+
+    Phis are placed on the iterated dominance frontier of each vreg's
+    definitions, but only where the vreg is live (Cytron et al. with
+    liveness pruning); a dominator-tree walk then gives every definition
+    its own vreg. A use with no reaching definition reads 0.
+    """
+    if fn.ssa:
+        return
+    idom = ir.dominators(fn)
+    frontiers = ir.dominance_frontiers(fn, idom)
+    live_in, _ = ir.liveness(fn)
+    preds = ir.predecessors(fn)
+    blocks = fn.block_map()
+
+    def_blocks: Dict[int, Set[str]] = {}
+    vregs: Dict[int, ir.VReg] = {param.id: param for param in fn.params}
+    for param in fn.params:
+        def_blocks[param.id] = {fn.entry.label}
+    for block in fn.blocks:
+        for instr in block.instrs:
+            dst = instr.dst
+            if dst is not None:
+                def_blocks.setdefault(dst.id, set()).add(block.label)
+                vregs[dst.id] = dst
+
+    # Only vregs live into some block can need a phi.
+    crossing = 0
+    for bits in live_in.values():
+        crossing |= bits
+    phi_vreg: Dict[int, ir.VReg] = {}  # id(phi) -> the vreg it merges
+    for vreg_id, defined_in in def_blocks.items():
+        if not crossing >> vreg_id & 1:
+            continue
+        worklist = list(defined_in)
+        placed: Set[str] = set()
+        while worklist:
+            label = worklist.pop()
+            for frontier in frontiers.get(label, ()):
+                if frontier in placed or not live_in[frontier] >> vreg_id & 1:
+                    continue
+                placed.add(frontier)
+                phi = ir.Phi(vregs[vreg_id], [(pred, vregs[vreg_id]) for pred in preds[frontier] if pred in idom])
+                blocks[frontier].instrs.insert(0, phi)
+                phi_vreg[id(phi)] = vregs[vreg_id]
+                if frontier not in defined_in:
+                    worklist.append(frontier)
+
+    _rename(fn, idom, blocks, phi_vreg)
+    fn.ssa = True
+
+
+def _rename(
+    fn: ir.Function,
+    idom: Dict[str, Optional[str]],
+    blocks: Dict[str, ir.Block],
+    phi_vreg: Dict[int, ir.VReg],
+) -> None:
+    children = ir.dominator_children(idom)
+    current: Dict[int, List[ir.Operand]] = {param.id: [param] for param in fn.params}
+    versions: Dict[int, int] = {param.id: 1 for param in fn.params}
+    undefined = ir.Imm(0)
+
+    def new_version(vreg: ir.VReg) -> ir.VReg:
+        count = versions.get(vreg.id, 0)
+        versions[vreg.id] = count + 1
+        return vreg if count == 0 else fn.new_vreg(f"{vreg.name}.{count}")
+
+    def reaching(vreg: ir.VReg) -> ir.Operand:
+        stack = current.get(vreg.id)
+        return stack[-1] if stack else undefined
+
+    # Entering a block renames it and schedules its dominator-tree children;
+    # leaving it pops the names it pushed.
+    work: List[Tuple[bool, str, List[int]]] = [(True, fn.entry.label, [])]
+    while work:
+        entering, label, pushed = work.pop()
+        if not entering:
+            for vreg_id in pushed:
+                current[vreg_id].pop()
+            continue
+        block = blocks[label]
+        for instr in block.instrs:
+            if not isinstance(instr, ir.Phi):
+                instr.replace_uses({value: reaching(value) for value in instr.uses() if isinstance(value, ir.VReg)})
+            dst = instr.dst
+            if dst is not None:
+                original = phi_vreg.get(id(instr), dst)
+                renamed = new_version(original)
+                instr.target = renamed
+                current.setdefault(original.id, []).append(renamed)
+                pushed.append(original.id)
+        for succ in block.successors():
+            for phi in blocks[succ].phis():
+                original = phi_vreg[id(phi)]
+                phi.incoming = [
+                    (pred, reaching(original) if pred == label else value) for pred, value in phi.incoming
+                ]
+        work.append((False, label, pushed))
+        work.extend((True, child, []) for child in children[label])
+
+
+def from_ssa(fn: ir.Function) -> None:
+    """Replace phis by copies at the end of each predecessor.
+
+    Edges from a conditional branch into a block with phis are split first,
+    so the copies run only on that edge and can't clobber the condition.
+    Each edge's copies happen in parallel and are ordered (with a
+    temporary to break cycles) so no source is overwritten before it is read.
+    """
+    if not fn.ssa:
+        return
+    blocks = fn.block_map()
+    for block in list(fn.blocks):
+        phis = list(block.phis())
+        if not phis:
+            continue
+        for pred_label in dict.fromkeys(label for phi in phis for label, _ in phi.incoming):
+            pred = blocks[pred_label]
+            if isinstance(pred.terminator, ir.Branch):
+                edge = fn.new_block("edge")
+                edge.instrs.append(ir.Jump(block.label))
+                pred.terminator.retarget(block.label, edge.label)
+                fn.blocks.insert(fn.blocks.index(block), edge)
+                blocks[edge.label] = edge
+                for phi in phis:
+                    phi.incoming = [(edge.label if label == pred_label else label, v) for label, v in phi.incoming]
+    for block in fn.blocks:
+        phis = list(block.phis())
+        if not phis:
+            continue
+        by_pred: Dict[str, List[Tuple[ir.VReg, ir.Operand]]] = {}
+        for phi in phis:
+            for pred, value in phi.incoming:
+                by_pred.setdefault(pred, []).append((phi.dst, value))
+        for pred, copies in by_pred.items():
+            instrs = blocks[pred].instrs
+            instrs[len(instrs) - 1 : len(instrs) - 1] = sequentialize(copies, fn.new_vreg)
+        del block.instrs[: len(phis)]
+    fn.ssa = False
+
+
+def sequentialize(copies: List[Tuple[ir.VReg, ir.Operand]], new_temp: Callable[[], ir.VReg]) -> List[ir.Copy]:
+    """Order a parallel copy as a sequence of copies with the same effect."""
+    pending = [(dst, src) for dst, src in copies if src is not dst]
+    result: List[ir.Copy] = []
+    while pending:
+        for idx, (dst, src) in enumerate(pending):
+            if not any(other is dst for _, other in pending):
+                result.append(ir.Copy(dst, src))
+                del pending[idx]
+                break
+        else:
+            # Every destination is still needed as a source: a cycle.
+            dst = pending[0][0]
+            saved = new_temp()
+            result.append(ir.Copy(saved, dst))
+            pending = [(d, saved if s is dst else s) for d, s in pending]
+    return result
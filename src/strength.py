@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple
+
+from . import ir
+from .loops import Loop, ensure_preheader, find_loops
+from .optimize import INT_MIN, wrap_int
+
+_MASK = (1 << 64) - 1
+# Multipliers a single lea computes: x + x*2, x + x*4, x + x*8.
+LEA_MULTIPLIERS = frozenset({3, 5, 9})
+
+
+def signed_magic(divisor: int) -> Tuple[int, int]:
+    """Magic multiplier and shift for signed 64-bit division by ``divisor`` (2 <= |divisor| < 2**63).
+
+    Hacker's Delight, section 10-4: ``n / divisor`` is the high half of
+    ``n * multiplier``, corrected by ``n`` when the signs of the two differ,
+    shifted right by ``shift`` and rounded toward zero.
+    """
+    two63 = 1 << 63
+    ad = abs(divisor)
+    t = two63 + (1 if divisor < 0 else 0)
+    anc = t - 1 - t % ad
+    p = 63
+    q1, r1 = divmod(two63, anc)
+    q2, r2 = divmod(two63, ad)
+    while True:
+        p += 1
+        q1, r1 = 2 * q1, 2 * r1
+        if r1 >= anc:
+            q1, r1 = q1 + 1, r1 - anc
+        q2, r2 = 2 * q2, 2 * r2
+        if r2 >= ad:
+            q2, r2 = q2 + 1, r2 - ad
+        delta = ad - r2
+        if not (q1 < delta or (q1 == delta and r1 == 0)):
+            break
+    multiplier = wrap_int((q2 + 1) & _MASK)
+    return (wrap_int(-multiplier) if divisor < 0 else multiplier), p - 64
+
+
+def _power_of_two(value: int) -> Optional[int]:
+    """``k`` if ``value`` is ``2**k`` (as an unsigned 64-bit number), else None."""
+    value &= _MASK
+    if value and value & (value - 1) == 0:
+        return value.bit_length() - 1
+    return None
+
+
+class _Expander:
+    """Emits the replacement for one instruction into ``instrs`` under fresh temporaries."""
+
+    def __init__(self, fn: ir.Function):
+        self.fn = fn
+        self.instrs: List[ir.Instr] = []
+
+    def binary(self, op: str, lhs: ir.Operand, rhs: ir.Operand) -> ir.VReg:
+        dst = self.fn.new_vreg()
+        self.instrs.append(ir.Binary(dst, op, lhs, rhs))
+        return dst
+
+    def unary(self, op: str, src: ir.Operand) -> ir.VReg:
+        dst = self.fn.new_vreg()
+        self.instrs.append(ir.Unary(dst, op, src))
+        return dst
+
+    def finish(self, target: ir.VReg) -> List[ir.Instr]:
+        """Write the last instruction's result, the final value, to ``target`` instead."""
+        self.instrs[-1].target = target
+        return self.instrs
+
+
+def _expand_mul(fn: ir.Function, instr: ir.Binary) -> Optional[List[ir.Instr]]:
+    """Shifts, lea-able multiplies, adds and subtracts computing ``x * c``, or None to keep the imul.
+
+    Sequences are at most two instructions long.
+    """
+    x, c = instr.lhs, instr.rhs.value
+    if c == 0 or c == 1:
+        return [ir.Copy(instr.target, x if c else ir.Imm(0))]
+    if c == -1:
+        return [ir.Unary(instr.target, "neg", x)]
+    shift = _power_of_two(c)
+    if shift is not None:
+        return [ir.Binary(instr.target, "shl", x, ir.Imm(shift))]
+    magnitude = abs(c)
+    shift = _power_of_two(magnitude & -magnitude)
+    odd = magnitude >> shift
+    out = _Expander(fn)
+    if odd == 1:
+        # Minus a power of two.
+        out.unary("neg", out.binary("shl", x, ir.Imm(shift)))
+    elif odd in LEA_MULTIPLIERS and (shift == 0 or c > 0):
+        value = out.binary("mul", x, ir.Imm(odd))
+        if shift:
+            out.binary("shl", value, ir.Imm(shift))
+        elif c < 0:
+            out.unary("neg", value)
+    elif c > 0 and _power_of_two(magnitude - 1) is not None:
+        out.binary("add", out.binary("shl", x, ir.Imm(_power_of_two(magnitude - 1))), x)
+    elif c > 0 and _power_of_two(magnitude + 1) is not None:
+        out.binary("sub", out.binary("shl", x, ir.Imm(_power_of_two(magnitude + 1))), x)
+    else:
+        return None
+    return out.finish(instr.target)
+
+
+def _expand_div(fn: ir.Function, instr: ir.Binary) -> Optional[List[ir.Instr]]:
+    """Shifts or a multiply-high computing ``x / d`` rounded toward zero, or None to keep the idiv.
+
+    Division by 0 or -1 is kept because it can trap, and by INT_MIN
+    because it is too rare to bother.
+    """
+    x, d = instr.lhs, instr.rhs.value
+    if d == 1:
+        return [ir.Copy(instr.target, x)]
+    if d in (0, -1, INT_MIN):
+        return None
+    out = _Expander(fn)
+    shift = _power_of_two(abs(d))
+    if shift is not None:
+        # Negative dividends get 2**shift - 1 added first so the shift truncates toward zero.
+        sign = out.binary("sar", x, ir.Imm(63)) if shift > 1 else x
+        bias = out.binary("shr", sign, ir.Imm(64 - shift))
+        value = out.binary("sar", out.binary("add", x, bias), ir.Imm(shift))
+        if d < 0:
+            out.unary("neg", value)
+        return out.finish(instr.target)
+    multiplier, shift = signed_magic(d)
+    value = out.binary("mulhs", x, ir.Imm(multiplier))
+    if d > 0 and multiplier < 0:
+        value = out.binary("add", value, x)
+    elif d < 0 and multiplier > 0:
+        value = out.binary("sub", value, x)
+    if shift:
+        value = out.binary("sar", value, ir.Imm(shift))
+    out.binary("add", value, out.binary("shr", value, ir.Imm(63)))
+    return out.finish(instr.target)
+
+
+def lower_arithmetic(fn: ir.Function) -> bool:
+    """Replace multiplication and division by constants with cheaper instruction sequences.
+
+    Multiplies become shifts, lea-able multiplies (by 3, 5 or 9), adds
+    and subtracts; divisions by powers of two become a biased arithmetic
+    shift, and by other constants a multiply-high by a magic number.
+    """
+    changed = False
+    for block in fn.blocks:
+        instrs: List[ir.Instr] = []
+        for instr in block.instrs:
+            expanded = None
+            if isinstance(instr, ir.Binary) and instr.op in ("mul", "div"):
+                if instr.op == "mul" and isinstance(instr.lhs, ir.Imm):
+                    instr.lhs, instr.rhs = instr.rhs, instr.lhs
+                if isinstance(instr.rhs, ir.Imm) and not isinstance(instr.lhs, ir.Imm):
+                    if instr.op == "div":
+                        expanded = _expand_div(fn, instr)
+                    elif instr.rhs.value not in LEA_MULTIPLIERS:
+                        expanded = _expand_mul(fn, instr)
+            if expanded is None:
+                instrs.append(instr)
+            else:
+                instrs.extend(expanded)
+                changed = True
+        block.instrs = instrs
+    return changed
+
+
+def induction_step(instr: ir.Instr, phi: ir.VReg) -> Optional[int]:
+    """The constant ``instr`` adds to ``phi``, if it is ``phi + c``, ``c + phi`` or ``phi - c``."""
+    if not isinstance(instr, ir.Binary):
+        return None
+    if instr.op == "add" and instr.lhs is phi and isinstance(instr.rhs, ir.Imm):
+        return instr.rhs.value
+    if instr.op == "add" and instr.rhs is phi and isinstance(instr.lhs, ir.Imm):
+        return instr.lhs.value
+    if instr.op == "sub" and instr.lhs is phi and isinstance(instr.rhs, ir.Imm):
+        return wrap_int(-instr.rhs.value)
+    return None
+
+
+def reduce_induction_variables(fn: ir.Function) -> bool:
+    """Replace ``i * c`` in a loop, for an induction variable ``i``, by a second induction variable. SSA only.
+
+    An induction variable is a header phi whose values from inside the loop
+    are all one ``i + step``, where the step may be reached through a chain
+    of constant additions (as in an unrolled loop). The product gets its own
+    phi, starting at ``init * c`` (computed in the preheader) and advanced by
+    ``step * c`` right after ``i + step``; a product of ``i + k`` in the
+    chain becomes that phi plus ``k * c``. Every loop is tried in each round;
+    loops are found again after a round that changed something, since an
+    inner loop's new preheader is part of the loop around it.
+    """
+    changed = False
+    while True:
+        progress = False
+        for loop in find_loops(fn):
+            progress = _reduce_loop(fn, loop) or progress
+        if not progress:
+            return changed
+        changed = True
+
+
+def _offsets(instrs: List[ir.Instr], phi: ir.VReg) -> Dict[int, int]:
+    """Vregs among ``instrs`` that are ``phi`` plus a constant, by id, with the constant."""
+    offsets = {phi.id: 0}
+    found = True
+    while found:
+        found = False
+        for instr in instrs:
+            if instr.dst is None or instr.dst.id in offsets:
+                continue
+            for base in instr.uses():
+                if isinstance(base, ir.VReg) and base.id in offsets:
+                    step = induction_step(instr, base)
+                    if step is not None:
+                        offsets[instr.dst.id] = wrap_int(offsets[base.id] + step)
+                        found = True
+                        break
+    return offsets
+
+
+def _reduce_loop(fn: ir.Function, loop: Loop) -> bool:
+    blocks = fn.block_map()
+    defs: Dict[int, Tuple[ir.Block, ir.Instr]] = {}
+    products: List[Tuple[ir.Block, ir.Binary]] = []
+    instrs: List[ir.Instr] = []
+    for block in fn.blocks:
+        if block.label not in loop.blocks:
+            continue
+        for instr in block.instrs:
+            instrs.append(instr)
+            if instr.dst is not None:
+                defs[instr.dst.id] = (block, instr)
+            if isinstance(instr, ir.Binary) and instr.op == "mul":
+                products.append((block, instr))
+    header = blocks[loop.header]
+    changed = False
+    for phi in list(header.phis()):
+        inside = {value for label, value in phi.incoming if label in loop.blocks}
+        if len(inside) != 1 or len({value for label, value in phi.incoming if label not in loop.blocks}) != 1:
+            continue
+        update = inside.pop()
+        if not isinstance(update, ir.VReg) or update.id not in defs:
+            continue
+        offsets = _offsets(instrs, phi.target)
+        step = offsets.get(update.id)
+        if not step:
+            continue
+        update_block, update_instr = defs[update.id]
+        scaled_by: Dict[int, ir.VReg] = {}
+        for block, product in products:
+            if isinstance(product.lhs, ir.VReg) and product.lhs.id in offsets and isinstance(product.rhs, ir.Imm):
+                base, factor = product.lhs, product.rhs.value
+            elif isinstance(product.rhs, ir.VReg) and product.rhs.id in offsets and isinstance(product.lhs, ir.Imm):
+                base, factor = product.rhs, product.lhs.value
+            else:
+                continue
+            if factor in (0, 1) or product not in block.instrs:
+                continue
+            scaled = scaled_by.get(factor)
+            if scaled is None:
+                scaled = scaled_by[factor] = _scale(fn, loop, phi, factor, step, update_block, update_instr)
+            offset = wrap_int(offsets[base.id] * factor)
+            block.instrs[block.instrs.index(product)] = (
+                ir.Binary(product.target, "add", scaled, ir.Imm(offset)) if offset else ir.Copy(product.target, scaled)
+            )
+            changed = True
+    return changed
+
+
+def _scale(
+    fn: ir.Function, loop: Loop, phi: ir.Phi, factor: int, step: int, update_block: ir.Block, update_instr: ir.Instr
+) -> ir.VReg:
+    """A new header phi equal to ``phi`` times ``factor``, advanced right after ``update_instr``."""
+    preheader = ensure_preheader(fn, loop)
+    header = fn.block_map()[loop.header]
+    init = next(value for label, value in phi.incoming if label not in loop.blocks)
+    if isinstance(init, ir.Imm):
+        start: ir.Operand = ir.Imm(wrap_int(init.value * factor))
+    else:
+        start = fn.new_vreg(f"{phi.target.name}.x{factor}.init")
+        preheader.instrs.insert(-1, ir.Binary(start, "mul", init, ir.Imm(factor)))
+    scaled = fn.new_vreg(f"{phi.target.name}.x{factor}")
+    advanced = fn.new_vreg(f"{phi.target.name}.x{factor}.next")
+    update_block.instrs.insert(
+        update_block.instrs.index(update_instr) + 1,
+        ir.Binary(advanced, "add", scaled, ir.Imm(wrap_int(step * factor))),
+    )
+    incoming = [(label, advanced if label in loop.blocks else start) for label, _ in phi.incoming]
+    header.instrs.insert(0, ir.Phi(scaled, incoming))
+    return scaled
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from typing import Dict, Iterator, List, Tuple
+
+from . import ir
+
+
+def _tail_calls(fn: ir.Function) -> Iterator[Tuple[ir.Block, int, ir.Call]]:
+    """Calls whose result ``fn`` returns unchanged: ``(block, index of the call, call)``.
+
+    After the call there may only be copies forwarding its result, then a
+    return of it or a jump to a block that does nothing else. Only the
+    last call of a block can qualify.
+    """
+    blocks = fn.block_map()
+    for block in fn.blocks:
+        for idx in range(len(block.instrs) - 2, -1, -1):
+            if isinstance(block.instrs[idx], ir.Call):
+                break
+        else:
+            continue
+        call = block.instrs[idx]
+        value: ir.Operand = call.target
+        instrs = block.instrs[idx + 1 :]
+        seen = {block.label}
+        while True:
+            for instr in instrs[:-1]:
+                if not (isinstance(instr, ir.Copy) and instr.src is value):
+                    break
+                value = instr.target
+            else:
+                term = instrs[-1]
+                if isinstance(term, ir.Return) and term.value is value:
+                    yield block, idx, call
+                elif isinstance(term, ir.Jump) and term.label not in seen:
+                    seen.add(term.label)
+                    instrs = blocks[term.label].instrs
+                    if not any(isinstance(instr, ir.Phi) for instr in instrs):
+                        continue
+            break
+
+
+def eliminate_tail_recursion(fn: ir.Function) -> bool:
+    """Turn calls of ``fn`` to itself in tail position into jumps back to its start. Not SSA.
+
+    The parameters are reassigned from the call's arguments (through
+    temporaries where an argument reads a parameter assigned before it),
+    and the body moves out of the entry block so it can be a loop header.
+    """
+    found = [(block, idx, call) for block, idx, call in _tail_calls(fn) if call.callee == fn.name]
+    if not found:
+        return False
+    header = fn.new_block("tailrec")
+    header.instrs = fn.entry.instrs
+    fn.entry.instrs = [ir.Jump(header.label)]
+    fn.blocks.insert(1, header)
+    params = set(fn.params)
+    for block, idx, call in found:
+        copies: List[ir.Instr] = []
+        staged: Dict[int, ir.Operand] = {}
+        for pos, (param, arg) in enumerate(zip(fn.params, call.args)):
+            if isinstance(arg, ir.VReg) and arg in params and arg is not param:
+                temp = fn.new_vreg(f"{param.name}.next")
+                copies.append(ir.Copy(temp, arg))
+                staged[pos] = temp
+        for pos, (param, arg) in enumerate(zip(fn.params, call.args)):
+            if arg is not param:
+                copies.append(ir.Copy(param, staged.get(pos, arg)))
+        block.instrs[idx:] = copies + [ir.Jump(header.label)]
+    ir.remove_unreachable(fn)
+    return True
+
+
+def mark_tail_calls(fn: ir.Function) -> int:
+    """Replace every call in tail position by a :class:`ir.TailCall`. Not SSA.
+
+    Returns the number of calls replaced.
+    """
+    found = list(_tail_calls(fn))
+    for block, idx, call in found:
+        block.instrs[idx:] = [ir.TailCall(call.callee, call.args)]
+    if found:
+        ir.remove_unreachable(fn)
+    return len(found)
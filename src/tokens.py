@@ -1,5 +1,11 @@
+from __future__ import annotations
+
+import re
+from array import array
+from bisect import bisect_right
 from dataclasses import dataclass
-from typing import Optional
+from sys import intern
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 
 
 @dataclass
@@ -24,3 +30,198 @@ KEYWORDS = {
     "string",
     "void",
 }
+
+# Integer token kinds stored in TokenBuffer. Literals and the type keywords
+# `int`/`string` get separate kinds, although both report the same Token.type.
+(
+    TK_EOF,
+    TK_INT_LIT,
+    TK_STRING_LIT,
+    TK_IDENT,
+    TK_FN,
+    TK_LET,
+    TK_IF,
+    TK_ELSE,
+    TK_WHILE,
+    TK_RETURN,
+    TK_TRUE,
+    TK_FALSE,
+    TK_INT,
+    TK_BOOL,
+    TK_STRING,
+    TK_VOID,
+    TK_EQ,
+    TK_NE,
+    TK_LE,
+    TK_GE,
+    TK_AND,
+    TK_OR,
+    TK_ARROW,
+    TK_PLUS,
+    TK_MINUS,
+    TK_STAR,
+    TK_SLASH,
+    TK_LT,
+    TK_GT,
+    TK_ASSIGN,
+    TK_LPAREN,
+    TK_RPAREN,
+    TK_LBRACE,
+    TK_RBRACE,
+    TK_COMMA,
+    TK_SEMICOLON,
+    TK_COLON,
+    TK_BANG,
+) = range(38)
+
+# Token.type name for each kind.
+TOKEN_TYPES = (
+    "EOF", "INT", "STRING", "IDENT",
+    "FN", "LET", "IF", "ELSE", "WHILE", "RETURN", "TRUE", "FALSE", "INT", "BOOL", "STRING", "VOID",
+    "==", "!=", "<=", ">=", "&&", "||", "->",
+    "PLUS", "MINUS", "STAR", "SLASH", "LT", "GT", "ASSIGN",
+    "LPAREN", "RPAREN", "LBRACE", "RBRACE", "COMMA", "SEMICOLON", "COLON", "BANG",
+)
+
+KEYWORD_KINDS: Dict[str, int] = {kw: TOKEN_TYPES.index(kw.upper(), TK_FN) for kw in KEYWORDS}
+
+OPERATOR_KINDS: Dict[str, int] = {
+    "==": TK_EQ,
+    "!=": TK_NE,
+    "<=": TK_LE,
+    ">=": TK_GE,
+    "&&": TK_AND,
+    "||": TK_OR,
+    "->": TK_ARROW,
+    "+": TK_PLUS,
+    "-": TK_MINUS,
+    "*": TK_STAR,
+    "/": TK_SLASH,
+    "<": TK_LT,
+    ">": TK_GT,
+    "=": TK_ASSIGN,
+    "(": TK_LPAREN,
+    ")": TK_RPAREN,
+    "{": TK_LBRACE,
+    "}": TK_RBRACE,
+    ",": TK_COMMA,
+    ";": TK_SEMICOLON,
+    ":": TK_COLON,
+    "!": TK_BANG,
+}
+
+
+_ESCAPE = re.compile(r"\\(.)", re.DOTALL)
+_ESCAPES = {"n": "\n", "t": "\t"}
+
+
+def decode_string(raw: str) -> str:
+    """Strip the quotes from a string literal lexeme and apply its escapes."""
+    body = raw[1:-1]
+    if "\\" not in body:
+        return body
+    return _ESCAPE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(1)), body)
+
+
+class LineIndex:
+    """Sorted newline offsets; resolves source offsets to (line, column) on demand."""
+
+    __slots__ = ("newlines",)
+
+    def __init__(self, source: str):
+        self.newlines = array("I", (m.start() for m in re.finditer("\n", source)))
+
+    def line(self, offset: int) -> int:
+        return bisect_right(self.newlines, offset - 1) + 1
+
+    def position(self, offset: int) -> Tuple[int, int]:
+        idx = bisect_right(self.newlines, offset - 1)
+        line_start = self.newlines[idx - 1] + 1 if idx else 0
+        return idx + 1, offset - line_start + 1
+
+
+class TokenBuffer(Sequence[Token]):
+    """Struct-of-arrays token stream over a source string.
+
+    Each token costs one byte of kind plus two 32-bit words (start offset and
+    length). Values, lines and columns are derived from the source when asked
+    for, so the parser only pays for the ones it actually reads. Indexing
+    still yields :class:`Token` objects for callers that want them.
+    """
+
+    __slots__ = ("source", "kinds", "starts", "lengths", "lines", "_tokens")
+
+    def __init__(self, source: str, kinds: array, starts: array, lengths: array, lines: LineIndex):
+        self.source = source
+        self.kinds = kinds
+        self.starts = starts
+        self.lengths = lengths
+        self.lines = lines
+        self._tokens: Optional[List[Token]] = None
+
+    @classmethod
+    def from_tokens(cls, tokens: Sequence[Token]) -> "TokenBuffer":
+        """Wrap a plain token list (e.g. built by hand) in the buffer interface."""
+        kinds = array("B")
+        for tok in tokens:
+            if tok.type == "INT":
+                kinds.append(TK_INT if tok.value == "int" else TK_INT_LIT)
+            elif tok.type == "STRING":
+                kinds.append(TK_STRING_LIT)
+            else:
+                kinds.append(TOKEN_TYPES.index(tok.type))
+        buf = cls("", kinds, array("I"), array("I"), LineIndex(""))
+        buf._tokens = list(tokens)
+        return buf
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if self._tokens is not None:
+            return self._tokens[idx]
+        kind = self.kinds[idx]
+        return Token(TOKEN_TYPES[kind], self.value(idx), self.line(idx), self.column(idx))
+
+    def __iter__(self) -> Iterator[Token]:
+        for idx in range(len(self.kinds)):
+            yield self[idx]
+
+    def type(self, idx: int) -> str:
+        return TOKEN_TYPES[self.kinds[idx]]
+
+    def value(self, idx: int) -> Optional[str]:
+        if self._tokens is not None:
+            return self._tokens[idx].value
+        kind = self.kinds[idx]
+        if kind == TK_EOF:
+            return None
+        start = self.starts[idx]
+        text = self.source[start : start + self.lengths[idx]]
+        if kind == TK_STRING_LIT:
+            return decode_string(text)
+        return intern(text)
+
+    def span(self, first: int, last: int) -> Optional[Tuple[int, int]]:
+        """Source offsets covering tokens ``first`` through ``last`` inclusive."""
+        if self._tokens is not None:
+            return None
+        return self.starts[first], self.starts[last] + self.lengths[last]
+
+    def line(self, idx: int) -> int:
+        if self._tokens is not None:
+            return self._tokens[idx].line
+        offset = self.starts[idx]
+        if self.kinds[idx] == TK_STRING_LIT:
+            # String literals report the line of their closing quote.
+            offset += self.lengths[idx] - 1
+        return self.lines.line(offset)
+
+    def column(self, idx: int) -> int:
+        if self._tokens is not None:
+            return self._tokens[idx].column
+        return self.lines.position(self.starts[idx])[1]
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional
 
 from . import ast
 from .errors import TypeError
@@ -24,14 +24,35 @@ BUILTINS: Dict[str, List[FunctionSig]] = {
 }
 
 
+class _Post:
+    """Work-stack marker: finish ``node`` once its children have been typed.
+
+    For calls, a marker with ``expected`` set checks one argument instead.
+    A call marker without ``sig`` picks among overloads by argument type.
+    """
+
+    __slots__ = ("node", "sig", "expected")
+
+    def __init__(self, node: ast.Expr, sig: Optional[FunctionSig] = None, expected: Optional[TypeName] = None):
+        self.node = node
+        self.sig = sig
+        self.expected = expected
+
+
 class TypeChecker:
     def __init__(self, prog: ast.Program):
         self.prog = prog
         self.funcs: Dict[str, FunctionSig] = {}
 
-    def check(self) -> None:
-        self._collect_functions()
-        for fn in self.prog.functions:
+    def check(self, only: Optional[Iterable[ast.FunctionDef]] = None) -> None:
+        """Type-check the program, or just the functions in ``only``.
+
+        Signatures are collected for the whole program on first use, since
+        any function body may call any other function.
+        """
+        if not self.funcs:
+            self._collect_functions()
+        for fn in self.prog.functions if only is None else only:
             self._check_function(fn)
 
     def _collect_functions(self) -> None:
@@ -107,35 +128,72 @@ class TypeChecker:
         raise TypeError(f"Unhandled statement {stmt}")
 
     def _check_expr(self, expr: ast.Expr, scope: Dict[str, TypeName]) -> TypeName:
-        if isinstance(expr, ast.IntLiteral):
-            expr.inferred_type = "int"
-            return "int"
-        if isinstance(expr, ast.BoolLiteral):
-            expr.inferred_type = "bool"
-            return "bool"
-        if isinstance(expr, ast.StringLiteral):
-            expr.inferred_type = "string"
-            return "string"
-        if isinstance(expr, ast.VarRef):
-            if expr.name not in scope:
-                raise TypeError(f"Unknown variable {expr.name}")
-            expr.inferred_type = scope[expr.name]
-            return expr.inferred_type
-        if isinstance(expr, ast.UnaryOp):
-            inner = self._check_expr(expr.expr, scope)
-            if expr.op == "-":
-                if inner != "int":
-                    raise TypeError("Unary - expects int")
-                expr.inferred_type = "int"
-                return "int"
-            if expr.op == "!":
-                if inner != "bool":
-                    raise TypeError("Unary ! expects bool")
-                expr.inferred_type = "bool"
-                return "bool"
+        """Type ``expr`` bottom-up with an explicit work stack.
+
+        Leaves are typed on the spot; composite nodes are pushed twice, once
+        to schedule their children and once (as ``_Post``) to combine the
+        child types left on ``types``. Visiting order matches a recursive
+        left-to-right walk, so the first error reported is unchanged.
+        """
+        types: List[TypeName] = []
+        stack: List[object] = [expr]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, _Post):
+                self._finish_expr(node, types)
+                continue
+            if isinstance(node, ast.IntLiteral):
+                node.inferred_type = "int"
+            elif isinstance(node, ast.BoolLiteral):
+                node.inferred_type = "bool"
+            elif isinstance(node, ast.StringLiteral):
+                node.inferred_type = "string"
+            elif isinstance(node, ast.VarRef):
+                if node.name not in scope:
+                    raise TypeError(f"Unknown variable {node.name}")
+                node.inferred_type = scope[node.name]
+            elif isinstance(node, ast.BinaryOp):
+                stack.append(_Post(node))
+                stack.append(node.right)
+                stack.append(node.left)
+                continue
+            elif isinstance(node, ast.UnaryOp):
+                stack.append(_Post(node))
+                stack.append(node.expr)
+                continue
+            elif isinstance(node, ast.Call):
+                sigs = self._resolve_func(node.callee, len(node.args))
+                if len(sigs) > 1:
+                    stack.append(_Post(node))
+                    stack.extend(reversed(node.args))
+                    continue
+                sig = sigs[0]
+                stack.append(_Post(node, sig))
+                # Each argument is checked against its parameter before the
+                # next argument is visited.
+                for arg_expr, expected in reversed(list(zip(node.args, sig.params))):
+                    stack.append(_Post(node, sig, expected))
+                    stack.append(arg_expr)
+                continue
+            else:
+                raise TypeError(f"Unhandled expression {node}")
+            types.append(node.inferred_type)
+        return types.pop()
+
+    def _finish_expr(self, post: "_Post", types: List[TypeName]) -> None:
+        """Pop the child types of ``post.node`` off ``types`` and push its own."""
+        expr = post.node
+        if isinstance(expr, ast.Call) and post.expected is not None:
+            if types.pop() != post.expected:
+                raise TypeError(f"Arg type mismatch in call to {expr.callee}")
+            return
+        types.append(self._combine(post, types))
+
+    def _combine(self, post: "_Post", types: List[TypeName]) -> TypeName:
+        expr = post.node
         if isinstance(expr, ast.BinaryOp):
-            left = self._check_expr(expr.left, scope)
-            right = self._check_expr(expr.right, scope)
+            right = types.pop()
+            left = types.pop()
             if expr.op in {"+", "-", "*", "/"}:
                 if left != "int" or right != "int":
                     raise TypeError("Arithmetic expects ints")
@@ -156,26 +214,44 @@ class TypeChecker:
                     raise TypeError("Logical ops expect bool")
                 expr.inferred_type = "bool"
                 return "bool"
-        if isinstance(expr, ast.Call):
-            sig = self._resolve_func(expr.callee, len(expr.args))
-            for arg_expr, expected in zip(expr.args, sig.params):
-                got = self._check_expr(arg_expr, scope)
-                if got != expected:
-                    raise TypeError(f"Arg type mismatch in call to {expr.callee}")
+        elif isinstance(expr, ast.UnaryOp):
+            inner = types.pop()
+            if expr.op == "-":
+                if inner != "int":
+                    raise TypeError("Unary - expects int")
+                expr.inferred_type = "int"
+                return "int"
+            if expr.op == "!":
+                if inner != "bool":
+                    raise TypeError("Unary ! expects bool")
+                expr.inferred_type = "bool"
+                return "bool"
+        elif isinstance(expr, ast.Call):
+            sig = post.sig or self._select_overload(expr, types)
             expr.inferred_type = sig.ret
             return sig.ret
         raise TypeError(f"Unhandled expression {expr}")
 
-    def _resolve_func(self, name: str, argc: int) -> FunctionSig:
+    def _select_overload(self, call: ast.Call, types: List[TypeName]) -> FunctionSig:
+        argc = len(call.args)
+        arg_types = types[len(types) - argc :]
+        del types[len(types) - argc :]
+        for sig in self._resolve_func(call.callee, argc):
+            if sig.params == arg_types:
+                return sig
+        raise TypeError(f"Arg type mismatch in call to {call.callee}")
+
+    def _resolve_func(self, name: str, argc: int) -> List[FunctionSig]:
+        """Candidate signatures for a call with ``argc`` arguments, builtins first."""
         if name in BUILTINS:
-            for sig in BUILTINS[name]:
-                if len(sig.params) == argc:
-                    return sig
+            sigs = [sig for sig in BUILTINS[name] if len(sig.params) == argc]
+            if sigs:
+                return sigs
         if name in self.funcs:
             sig = self.funcs[name]
             if len(sig.params) != argc:
                 raise TypeError(f"Arity mismatch for {name}")
-            return sig
+            return [sig]
         raise TypeError(f"Unknown function {name}")
 
 
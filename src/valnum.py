@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from . import ir
+
+# Operations whose operands can be swapped without changing the result.
+_COMMUTATIVE = frozenset({"add", "mul", "mulhs"})
+
+
+@dataclass
+class ValueNumberingStats:
+    # Expressions replaced by an earlier result, by operation.
+    eliminated: Counter = field(default_factory=Counter)
+
+    def add(self, other: "ValueNumberingStats") -> None:
+        self.eliminated.update(other.eliminated)
+
+    def report(self) -> str:
+        lines = [f"{'value numbering':<16}{'reused':>9}"]
+        for op in sorted(self.eliminated, key=lambda op: (-self.eliminated[op], op)):
+            lines.append(f"{op:<16}{self.eliminated[op]:>9}")
+        lines.append(f"{'total':<16}{sum(self.eliminated.values()):>9}")
+        return "\n".join(lines)
+
+    def as_dict(self) -> Dict[str, object]:
+        """Plain data for JSON output."""
+        return {"eliminated": dict(self.eliminated)}
+
+
+class _ValueTable:
+    """Value numbers of vregs and of the expressions computed so far, with undo for scoping.
+
+    Two operands with the same number hold the same value. A vreg gets a
+    new number whenever it is assigned, so an expression over its old
+    value no longer matches, and a vreg only still holds an expression's
+    value while its number is that value's.
+    """
+
+    def __init__(self) -> None:
+        self.numbers: Dict[int, int] = {}  # by vreg id
+        self.constants: Dict[int, int] = {}  # immediate value -> number
+        self.exprs: Dict[Hashable, int] = {}
+        self.holders: Dict[int, List[ir.VReg]] = {}
+        self.undo: List[Tuple[str, Hashable]] = []
+        self.count = 0
+
+    def fresh(self) -> int:
+        self.count += 1
+        return self.count
+
+    def number(self, operand: ir.Operand) -> Optional[int]:
+        if isinstance(operand, ir.Imm):
+            if operand.value not in self.constants:
+                self.constants[operand.value] = self.fresh()
+            return self.constants[operand.value]
+        if isinstance(operand, ir.VReg):
+            if operand.id not in self.numbers:
+                self.numbers[operand.id] = self.fresh()
+            return self.numbers[operand.id]
+        return None
+
+    def key(self, instr: ir.Instr) -> Optional[Hashable]:
+        """What ``instr`` computes in terms of value numbers, if it is a pure expression worth reusing.
+
+        Comparisons are left alone: recomputing one is as cheap as testing
+        a saved result, and a comparison used only by the branch after it
+        becomes a single ``cmp`` in the generated code.
+        """
+        if isinstance(instr, ir.Binary) and instr.op not in ir.COMPARISONS:
+            lhs, rhs = self.number(instr.lhs), self.number(instr.rhs)
+            if lhs is None or rhs is None:
+                return None
+            if instr.op in _COMMUTATIVE and rhs < lhs:
+                lhs, rhs = rhs, lhs
+            return instr.op, lhs, rhs
+        if isinstance(instr, ir.Unary):
+            src = self.number(instr.src)
+            return None if src is None else (instr.op, src)
+        return None
+
+    def holder(self, value: int) -> Optional[ir.VReg]:
+        """A vreg that still holds ``value``."""
+        for vreg in self.holders.get(value, ()):
+            if self.numbers.get(vreg.id) == value:
+                return vreg
+        return None
+
+    def remember(self, key: Hashable, value: int) -> None:
+        self.undo.append(("expr", key))
+        self.exprs[key] = value
+
+    def assign(self, vreg: ir.VReg, value: int) -> None:
+        self.numbers[vreg.id] = value
+        self.undo.append(("holder", value))
+        self.holders.setdefault(value, []).append(vreg)
+
+    def rewind(self, mark: int) -> None:
+        """Forget the expressions and holders recorded since ``len(self.undo)`` was ``mark``."""
+        while len(self.undo) > mark:
+            kind, item = self.undo.pop()
+            if kind == "expr":
+                del self.exprs[item]
+            else:
+                self.holders[item].pop()
+
+
+def _number_block(block: ir.Block, table: _ValueTable, stats: Optional[ValueNumberingStats]) -> bool:
+    changed = False
+    for idx, instr in enumerate(block.instrs):
+        dst = instr.dst
+        if dst is None:
+            continue
+        if isinstance(instr, ir.Copy):
+            value = table.number(instr.src)
+            table.assign(dst, value if value is not None else table.fresh())
+            continue
+        key = table.key(instr)
+        if key is None:
+            table.assign(dst, table.fresh())
+            continue
+        value = table.exprs.get(key)
+        earlier = table.holder(value) if value is not None else None
+        if earlier is not None:
+            block.instrs[idx] = ir.Copy(dst, earlier)
+            changed = True
+            if stats is not None:
+                stats.eliminated[instr.op] += 1
+        elif value is None:
+            value = table.fresh()
+            table.remember(key, value)
+        table.assign(dst, value)
+    return changed
+
+
+def number_values_locally(fn: ir.Function, stats: Optional[ValueNumberingStats] = None) -> bool:
+    """Replace each expression recomputed within a block by a copy of its earlier result.
+
+    Works in and out of SSA form: assigning a variable invalidates the
+    expressions over its old value, and an earlier result held in a
+    variable that has since been reassigned is not reused.
+    """
+    changed = False
+    for block in fn.blocks:
+        changed |= _number_block(block, _ValueTable(), stats)
+    return changed
+
+
+def number_values_globally(fn: ir.Function, stats: Optional[ValueNumberingStats] = None) -> bool:
+    """Like :func:`number_values_locally`, also reusing results from dominating blocks. SSA only.
+
+    Blocks are visited in a walk of the dominator tree, and what a block
+    computes stays available to the blocks it dominates.
+    """
+    idom = ir.dominators(fn)
+    children = ir.dominator_children(idom)
+    blocks = fn.block_map()
+    table = _ValueTable()
+    changed = False
+    work: List[Tuple[str, Optional[int]]] = [(fn.entry.label, None)]
+    while work:
+        label, mark = work.pop()
+        if mark is not None:
+            table.rewind(mark)
+            continue
+        work.append((label, len(table.undo)))
+        changed |= _number_block(blocks[label], table, stats)
+        work.extend((child, None) for child in children[label])
+    return changed
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from typing import Dict, Set
+
+from . import ir
+from .errors import IRError
+
+
+def verify(fn: ir.Function) -> None:
+    """Check the structural invariants of ``fn``; raises IRError on the first violation.
+
+    Every block ends in exactly one terminator and only jumps to blocks of
+    the function; phis come first in a block and list each predecessor
+    once; every vreg used is defined somewhere. In SSA form, each vreg is
+    also defined exactly once and its definition dominates every use.
+    """
+    if not fn.blocks:
+        raise IRError(f"{fn.name}: function has no blocks")
+    labels: Set[str] = set()
+    for block in fn.blocks:
+        if block.label in labels:
+            raise IRError(f"{fn.name}: duplicate block label {block.label}")
+        labels.add(block.label)
+
+    defs: Dict[int, str] = {param.id: fn.entry.label for param in fn.params}
+    def_count: Dict[int, int] = {param.id: 1 for param in fn.params}
+    for block in fn.blocks:
+        if block.terminator is None:
+            raise IRError(f"{fn.name}: block {block.label} does not end in a terminator")
+        seen_body = False
+        for idx, instr in enumerate(block.instrs):
+            if isinstance(instr, ir.Terminator) and idx != len(block.instrs) - 1:
+                raise IRError(f"{fn.name}: terminator in the middle of block {block.label}")
+            if isinstance(instr, ir.Phi):
+                if seen_body:
+                    raise IRError(f"{fn.name}: phi after other instructions in {block.label}")
+            else:
+                seen_body = True
+            for succ in instr.successors() if isinstance(instr, ir.Terminator) else ():
+                if succ not in labels:
+                    raise IRError(f"{fn.name}: {block.label} jumps to unknown block {succ}")
+            dst = instr.dst
+            if dst is not None:
+                defs[dst.id] = block.label
+                def_count[dst.id] = def_count.get(dst.id, 0) + 1
+    _check_phis(fn)
+    for block in fn.blocks:
+        for instr in block.instrs:
+            for value in instr.uses():
+                if isinstance(value, ir.VReg) and value.id not in defs:
+                    raise IRError(f"{fn.name}: {value} used in {block.label} but never defined")
+    if fn.ssa:
+        for vreg_id, count in def_count.items():
+            if count > 1:
+                raise IRError(f"{fn.name}: vreg #{vreg_id} assigned {count} times in SSA form")
+        _check_dominance(fn)
+
+
+def _check_phis(fn: ir.Function) -> None:
+    preds = ir.predecessors(fn)
+    for block in fn.blocks:
+        for phi in block.phis():
+            if block is fn.entry:
+                raise IRError(f"{fn.name}: phi in the entry block")
+            incoming = [label for label, _ in phi.incoming]
+            if sorted(incoming) != sorted(preds[block.label]):
+                raise IRError(
+                    f"{fn.name}: phi for {phi.dst} in {block.label} has incoming {incoming}, "
+                    f"predecessors are {preds[block.label]}"
+                )
+
+
+def _check_dominance(fn: ir.Function) -> None:
+    """Every use is dominated by its (single) definition."""
+    idom = ir.dominators(fn)
+    children = ir.dominator_children(idom)
+    # Walk the dominator tree keeping the set of vregs defined on the path.
+    available: Set[int] = {param.id for param in fn.params}
+    blocks = fn.block_map()
+    stack = [(fn.entry.label, False)]
+    while stack:
+        label, leaving = stack.pop()
+        block = blocks[label]
+        if leaving:
+            for instr in block.instrs:
+                if instr.dst is not None:
+                    available.discard(instr.dst.id)
+            continue
+        for instr in block.instrs:
+            if not isinstance(instr, ir.Phi):
+                for value in instr.uses():
+                    if isinstance(value, ir.VReg) and value.id not in available:
+                        raise IRError(f"{fn.name}: use of {value} in {label} is not dominated by its definition")
+            if instr.dst is not None:
+                available.add(instr.dst.id)
+        # Phi operands must be available at the end of their predecessor,
+        # which is checked when that predecessor is on the path.
+        for succ in block.successors():
+            for phi in blocks[succ].phis():
+                for pred, value in phi.incoming:
+                    if pred == label and isinstance(value, ir.VReg) and value.id not in available:
+                        raise IRError(
+                            f"{fn.name}: phi operand {value} from {label} is not dominated by its definition"
+                        )
+        stack.append((label, True))
+        stack.extend((child, False) for child in children[label])
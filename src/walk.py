@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from typing import Iterator, List, Set
+
+from . import ast
+
+
+def child_blocks(stmt: ast.Stmt) -> List[ast.Block]:
+    if isinstance(stmt, ast.IfStmt):
+        return [stmt.then_block] if stmt.else_block is None else [stmt.then_block, stmt.else_block]
+    if isinstance(stmt, ast.WhileStmt):
+        return [stmt.body]
+    return []
+
+
+def stmt_exprs(stmt: ast.Stmt) -> List[ast.Expr]:
+    """Expressions directly owned by ``stmt`` (not those of nested blocks)."""
+    if isinstance(stmt, (ast.LetStmt, ast.AssignStmt, ast.ExprStmt)):
+        return [stmt.expr]
+    if isinstance(stmt, ast.ReturnStmt):
+        return [] if stmt.expr is None else [stmt.expr]
+    if isinstance(stmt, (ast.IfStmt, ast.WhileStmt)):
+        return [stmt.cond]
+    return []
+
+
+def child_exprs(expr: ast.Expr) -> List[ast.Expr]:
+    if isinstance(expr, ast.BinaryOp):
+        return [expr.left, expr.right]
+    if isinstance(expr, ast.UnaryOp):
+        return [expr.expr]
+    if isinstance(expr, ast.Call):
+        return expr.args
+    return []
+
+
+def iter_stmts(block: ast.Block) -> Iterator[ast.Stmt]:
+    """Every statement in ``block`` and its nested blocks, in source order."""
+    stack = [iter(block.statements)]
+    while stack:
+        stmt = next(stack[-1], None)
+        if stmt is None:
+            stack.pop()
+            continue
+        yield stmt
+        for child in reversed(child_blocks(stmt)):
+            stack.append(iter(child.statements))
+
+
+def iter_exprs(expr: ast.Expr) -> Iterator[ast.Expr]:
+    """``expr`` and all of its subexpressions, pre-order, left to right."""
+    stack = [expr]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(child_exprs(node)))
+
+
+def iter_block_exprs(block: ast.Block) -> Iterator[ast.Expr]:
+    for stmt in iter_stmts(block):
+        for expr in stmt_exprs(stmt):
+            yield from iter_exprs(expr)
+
+
+def called_functions(fn: ast.FunctionDef) -> Set[str]:
+    """Names of every function (user or builtin) called in ``fn``'s body."""
+    return {expr.callee for expr in iter_block_exprs(fn.body) if isinstance(expr, ast.Call)}
+